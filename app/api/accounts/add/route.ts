@@ -1,6 +1,7 @@
 import { NextResponse } from 'next/server';
 import pool, { ensureSchema } from '@/lib/db';
 import { isDeviceAuthorized } from '@/lib/auth';
+import { enqueueRefresh } from '@/lib/refreshJobs';
 
 export async function POST(request: Request) {
   const { username } = await request.json();
@@ -41,6 +42,7 @@ export async function POST(request: Request) {
          WHERE username = $1`,
         [normalizedUsername]
       );
+      await enqueueRefresh(normalizedUsername, 'reactivated');
 
       return new NextResponse('Account reactivated successfully', { status: 200 });
     }
@@ -50,6 +52,7 @@ export async function POST(request: Request) {
        VALUES ($1, FALSE, NULL)`,
       [normalizedUsername]
     );
+    await enqueueRefresh(normalizedUsername, 'added');
 
     return new NextResponse('Account added successfully', { status: 201 });
   } catch (error) {
@@ -0,0 +1,119 @@
+import { NextResponse, NextRequest } from 'next/server';
+import pool, { ensureSchema } from '@/lib/db';
+
+const DEFAULT_LIMIT = 100;
+const MAX_LIMIT = 500;
+const USERNAME_PATTERN = /^[a-z0-9._]*$/;
+
+// Pages are keyset-paginated on the username copy kept on account_followers,
+// in byte order (account_followers_page_idx), so a page is an index-only range
+// scan of one account followed by a primary-key lookup per returned follower.
+export async function GET(request: NextRequest) {
+  const segments = request.nextUrl.pathname.split('/').filter(Boolean);
+  const username = segments[segments.length - 2] ?? '';
+  const normalizedUsername = username.trim().toLowerCase();
+  const params = request.nextUrl.searchParams;
+  const after = (params.get('after') ?? '').trim().toLowerCase();
+  const prefix = (params.get('prefix') ?? '').trim().toLowerCase();
+  const requestedLimit = Number.parseInt(params.get('limit') ?? '', 10);
+  const limit = Number.isNaN(requestedLimit)
+    ? DEFAULT_LIMIT
+    : Math.min(Math.max(requestedLimit, 1), MAX_LIMIT);
+
+  try {
+    if (!normalizedUsername) {
+      return new NextResponse('Username is required', { status: 400 });
+    }
+    if (!USERNAME_PATTERN.test(after) || !USERNAME_PATTERN.test(prefix)) {
+      return new NextResponse('after and prefix must be Instagram usernames', { status: 400 });
+    }
+
+    await ensureSchema();
+
+    const accountResult = await pool.query<{
+      id: number;
+      username: string;
+      followers_synced_at: string | null;
+    }>(
+      'SELECT id, username, followers_synced_at::text AS followers_synced_at FROM accounts WHERE username = $1',
+      [normalizedUsername]
+    );
+
+    if (accountResult.rows.length === 0) {
+      return new NextResponse('User data not found', { status: 404 });
+    }
+
+    const account = accountResult.rows[0];
+
+    // Usernames are ASCII, so bumping the last character bounds the prefix range.
+    const prefixEnd = prefix
+      ? prefix.slice(0, -1) + String.fromCharCode(prefix.charCodeAt(prefix.length - 1) + 1)
+      : null;
+
+    const followersResult = await pool.query<{
+      username: string;
+      full_name: string | null;
+      profile_pic_url: string | null;
+      is_private: boolean | null;
+      is_verified: boolean | null;
+      fetched_at: string;
+    }>(
+      `SELECT
+         f.username,
+         f.full_name,
+         f.profile_pic_url,
+         f.is_private,
+         f.is_verified,
+         f.updated_at::text AS fetched_at
+       FROM (
+         SELECT follower_id, username
+         FROM account_followers
+         WHERE account_id = $1
+           AND username IS NOT NULL
+           AND ($2::text IS NULL OR username COLLATE "C" > $2::text)
+           AND ($3::text IS NULL OR username COLLATE "C" >= $3::text)
+           AND ($4::text IS NULL OR username COLLATE "C" < $4::text)
+         ORDER BY username COLLATE "C" ASC
+         LIMIT $5
+       ) page
+       JOIN followers f ON f.id = page.follower_id
+       ORDER BY page.username COLLATE "C" ASC`,
+      [account.id, after || null, prefix || null, prefixEnd, limit + 1]
+    );
+
+    const hasMore = followersResult.rows.length > limit;
+    const followers = hasMore ? followersResult.rows.slice(0, limit) : followersResult.rows;
+
+    // Totals are only computed for the first page; later pages just follow the cursor.
+    let total: number | null = null;
+    let lastFetchedAt: string | null = null;
+    if (!after) {
+      const summary = prefix
+        ? await pool.query<{ total: string }>(
+            `SELECT COUNT(*) AS total
+             FROM account_followers
+             WHERE account_id = $1
+               AND username COLLATE "C" >= $2::text
+               AND username COLLATE "C" < $3::text`,
+            [account.id, prefix, prefixEnd]
+          )
+        : await pool.query<{ total: string }>(
+            'SELECT COUNT(*) AS total FROM account_followers WHERE account_id = $1',
+            [account.id]
+          );
+      total = Number(summary.rows[0]?.total ?? 0);
+      lastFetchedAt = account.followers_synced_at;
+    }
+
+    return NextResponse.json({
+      username: account.username,
+      followers,
+      nextCursor: hasMore ? followers[followers.length - 1].username : null,
+      total,
+      lastFetchedAt,
+    });
+  } catch (error) {
+    console.error('Error fetching followers:', error);
+    return new NextResponse('Internal Server Error', { status: 500 });
+  }
+}
@@ -0,0 +1,78 @@
+import { NextResponse, NextRequest } from 'next/server';
+import pool, { ensureSchema } from '@/lib/db';
+
+const INTERVALS = new Set(['day', 'week', 'month']);
+const DATE_PATTERN = /^\d{4}-\d{2}-\d{2}$/;
+
+export async function GET(request: NextRequest) {
+  const segments = request.nextUrl.pathname.split('/').filter(Boolean);
+  const username = segments[segments.length - 2] ?? '';
+  const normalizedUsername = username.trim().toLowerCase();
+  const params = request.nextUrl.searchParams;
+  const interval = params.get('interval') ?? 'day';
+  const from = params.get('from');
+  const to = params.get('to');
+
+  try {
+    if (!normalizedUsername) {
+      return new NextResponse('Username is required', { status: 400 });
+    }
+    if (!INTERVALS.has(interval)) {
+      return new NextResponse('interval must be day, week or month', { status: 400 });
+    }
+    if ((from && !DATE_PATTERN.test(from)) || (to && !DATE_PATTERN.test(to))) {
+      return new NextResponse('from and to must be YYYY-MM-DD dates', { status: 400 });
+    }
+
+    await ensureSchema();
+
+    const accountResult = await pool.query<{ id: number; username: string }>(
+      'SELECT id, username FROM accounts WHERE username = $1',
+      [normalizedUsername]
+    );
+
+    if (accountResult.rows.length === 0) {
+      return new NextResponse('User data not found', { status: 404 });
+    }
+
+    const account = accountResult.rows[0];
+
+    // Rollups are maintained by the Python updaters (scripts/rollups.py); for
+    // week and month the last day of each period carries its figures.
+    const rollupResult = await pool.query<{
+      date: string;
+      followers: number;
+      following: number | null;
+      delta_1d: number | null;
+      delta_7d: number | null;
+      delta_30d: number | null;
+      ma_7: number;
+      ma_30: number;
+      growth_7d_pct: number | null;
+      growth_30d_pct: number | null;
+    }>(
+      `SELECT date::text AS date, followers, following,
+              delta_1d, delta_7d, delta_30d, ma_7, ma_30,
+              growth_7d_pct, growth_30d_pct
+       FROM (
+         SELECT DISTINCT ON (date_trunc($2, date)) *
+         FROM follower_rollups
+         WHERE account_id = $1
+           AND ($3::date IS NULL OR date >= $3::date)
+           AND ($4::date IS NULL OR date <= $4::date)
+         ORDER BY date_trunc($2, date), date DESC
+       ) periods
+       ORDER BY date ASC`,
+      [account.id, interval, from, to]
+    );
+
+    return NextResponse.json({
+      username: account.username,
+      interval,
+      rollups: rollupResult.rows,
+    });
+  } catch (error) {
+    console.error('Error fetching rollups:', error);
+    return new NextResponse('Internal Server Error', { status: 500 });
+  }
+}
@@ -36,31 +36,9 @@ export async function GET(request: NextRequest) {
       [account.id]
     );
 
-    const followersResult = await pool.query<{
-      username: string;
-      full_name: string | null;
-      profile_pic_url: string | null;
-      is_private: boolean | null;
-      is_verified: boolean | null;
-      fetched_at: string;
-    }>(
-      `SELECT
-         follower_username AS username,
-         full_name,
-         profile_pic_url,
-         is_private,
-         is_verified,
-         fetched_at::text AS fetched_at
-       FROM account_followers
-       WHERE account_id = $1
-       ORDER BY follower_username ASC`,
-      [account.id]
-    );
-
     return NextResponse.json({
       username: account.username,
       history: historyResult.rows,
-      followers: followersResult.rows,
     });
   } catch (error) {
     console.error('Error fetching user data:', error);
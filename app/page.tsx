@@ -60,6 +60,8 @@ interface AccountData {
   username: string;
   history: FollowerData[];
   followers: FollowerDetail[];
+  followerTotal: number;
+  lastFetchedAt: string | null;
 }
 
 export default function Home() {
@@ -167,13 +169,17 @@ export default function Home() {
 
       const fetchPromises = selectedAccounts.map(async (username) => {
         try {
-          const res = await fetch(`/api/data/${username}`);
+          const [res, followersRes] = await Promise.all([
+            fetch(`/api/data/${username}`),
+            fetch(`/api/data/${username}/followers?limit=${MAX_FOLLOWERS_DISPLAY}`),
+          ]);
           if (!res.ok) {
             throw new Error(`No data file found for ${username}`);
           }
           const data = await res.json();
-          const followers: FollowerDetail[] = Array.isArray(data.followers)
-            ? data.followers.reduce((acc: FollowerDetail[], follower: Record<string, unknown>) => {
+          const followersData = followersRes.ok ? await followersRes.json() : {};
+          const followers: FollowerDetail[] = Array.isArray(followersData.followers)
+            ? followersData.followers.reduce((acc: FollowerDetail[], follower: Record<string, unknown>) => {
                 const username = String(follower.username ?? '').trim();
                 if (!username) {
                   return acc;
@@ -191,7 +197,13 @@ export default function Home() {
               }, [])
             : [];
 
-          return { username, history: data.history ?? [], followers };
+          return {
+            username,
+            history: data.history ?? [],
+            followers,
+            followerTotal: typeof followersData.total === 'number' ? followersData.total : followers.length,
+            lastFetchedAt: followersData.lastFetchedAt ?? null,
+          };
         } catch (err) {
           throw new Error(`Failed to fetch data for ${username}`);
         }
@@ -532,26 +544,16 @@ export default function Home() {
                 ) : (
                   <div className="grid gap-6 md:grid-cols-2">
                     {accountsData.map((account) => {
-                      const followerCount = account.followers.length;
-                      const lastFetchedTimestamp = account.followers.reduce<number | null>((latest, follower) => {
-                        if (!follower.fetchedAt) {
-                          return latest;
-                        }
-                        const timestamp = Date.parse(follower.fetchedAt);
-                        if (Number.isNaN(timestamp)) {
-                          return latest;
-                        }
-                        if (latest === null || timestamp > latest) {
-                          return timestamp;
-                        }
-                        return latest;
-                      }, null);
-
-                      const formattedLastFetched = lastFetchedTimestamp
+                      const followerCount = account.followerTotal;
+                      const lastFetchedTimestamp = account.lastFetchedAt
+                        ? Date.parse(account.lastFetchedAt)
+                        : Number.NaN;
+
+                      const formattedLastFetched = !Number.isNaN(lastFetchedTimestamp)
                         ? new Date(lastFetchedTimestamp).toLocaleString()
                         : 'Not synced yet';
 
-                      const visibleFollowers = account.followers.slice(0, MAX_FOLLOWERS_DISPLAY);
+                      const visibleFollowers = account.followers;
                       const hiddenFollowers = followerCount - visibleFollowers.length;
 
                       return (
@@ -0,0 +1,91 @@
+"""Compare the COPY and multi-row VALUES bulk-load paths in ``db_utils``.
+
+Usage::
+
+    python benchmarks/bulk_load.py [--sizes 10000,100000,1000000] [--repeat 3]
+
+Rows are loaded into a temporary table shaped like ``follower_staging`` so the
+benchmark never touches real data. Connection settings come from the usual
+``POSTGRES_*`` environment variables.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import psycopg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from db_connection import DB_CONFIG  # noqa: E402
+from db_utils import insert_rows  # noqa: E402
+
+COLUMNS = (
+    "account_id",
+    "follower_username",
+    "full_name",
+    "profile_pic_url",
+    "is_private",
+    "is_verified",
+)
+
+
+def generate_rows(count: int):
+    for idx in range(count):
+        yield (
+            1,
+            f"follower_{idx:08d}",
+            f"Follower Number {idx}",
+            f"https://scontent.cdninstagram.com/v/t51.2885-19/{idx}_n.jpg",
+            idx % 3 == 0,
+            idx % 97 == 0,
+        )
+
+
+def run_once(conn: psycopg.Connection, size: int, use_copy: bool) -> float:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TEMP TABLE bench_followers (
+              account_id INTEGER NOT NULL,
+              follower_username TEXT NOT NULL,
+              full_name TEXT,
+              profile_pic_url TEXT,
+              is_private BOOLEAN,
+              is_verified BOOLEAN
+            ) ON COMMIT DROP
+            """
+        )
+        started = time.perf_counter()
+        insert_rows(cur, "bench_followers", COLUMNS, generate_rows(size), use_copy=use_copy)
+        elapsed = time.perf_counter() - started
+    conn.rollback()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="emit JSON lines instead of a table")
+    args = parser.parse_args()
+
+    sizes = [int(value) for value in args.sizes.split(",") if value.strip()]
+
+    with psycopg.connect(**DB_CONFIG) as conn:
+        if not args.json:
+            print(f"{'rows':>10} {'method':>7} {'best s':>9} {'rows/s':>12}")
+        for size in sizes:
+            for method, use_copy in (("copy", True), ("values", False)):
+                best = min(run_once(conn, size, use_copy) for _ in range(max(args.repeat, 1)))
+                rate = size / best if best else float("inf")
+                if args.json:
+                    print(json.dumps({"rows": size, "method": method, "seconds": best, "rows_per_second": rate}))
+                else:
+                    print(f"{size:>10} {method:>7} {best:>9.3f} {rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
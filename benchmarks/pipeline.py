@@ -0,0 +1,365 @@
+"""End-to-end throughput, peak RSS and query counts for the updater pipeline.
+
+Usage::
+
+    python benchmarks/pipeline.py [--accounts 5] [--followers 20000] [--days 365]
+        [--stages insert_rows,replace_followers,...] [--output results.jsonl]
+        [--compare baseline.jsonl] [--threshold 0.2] [--keep]
+
+Every stage runs in its own spawned process, so ``peak_rss_mb`` is that
+stage's high-water mark rather than the benchmark's. The data comes from
+``benchmarks/synthetic.py`` and is generated outside the timed section.
+Stages that write to Postgres each get a scratch schema (``bench_<pid>``),
+migrated with ``ensure_schema`` and dropped afterwards unless ``--keep`` is
+given; connection settings come from the usual ``POSTGRES_*`` environment
+variables. JSON stages use a temporary ``DATA_DIR``.
+
+Each stage prints one JSON line with its parameters, throughput, peak RSS,
+the number of statements sent through psycopg cursors, and the git commit,
+so runs can be kept and compared across commits. ``--compare`` reads an
+earlier ``--output`` file and exits with status 1 when a stage's throughput
+dropped by more than ``--threshold`` or it issued more queries.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+
+import synthetic  # noqa: E402
+
+# Passes over every account in the append_history stages; the first one
+# creates (or, for jsonl, seeds) the log, the rest measure the steady state.
+APPEND_PASSES = 3
+
+
+class QueryCounter:
+    """Count statements issued through any ``psycopg.Cursor`` in this process."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def install(self) -> None:
+        import psycopg
+
+        counter = self
+
+        def wrap(method, per_call):
+            def counted(self, *args, **kwargs):
+                counter.count += per_call(args)
+                return method(self, *args, **kwargs)
+
+            return counted
+
+        psycopg.Cursor.execute = wrap(psycopg.Cursor.execute, lambda args: 1)
+        psycopg.Cursor.executemany = wrap(
+            psycopg.Cursor.executemany,
+            lambda args: len(args[1]) if len(args) > 1 and hasattr(args[1], "__len__") else 1,
+        )
+        psycopg.Cursor.copy = wrap(psycopg.Cursor.copy, lambda args: 1)
+
+
+class Timer:
+    def __init__(self) -> None:
+        self.seconds = 0.0
+
+    @contextlib.contextmanager
+    def measure(self):
+        started = time.perf_counter()
+        try:
+            with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+                yield
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+@contextlib.contextmanager
+def scratch_schema(keep: bool):
+    """Point every new connection of this process at a freshly migrated schema."""
+    import psycopg
+
+    from db_connection import DB_CONFIG
+
+    schema = f"bench_{os.getpid()}"
+    with psycopg.connect(**DB_CONFIG) as conn:
+        conn.execute(f"CREATE SCHEMA {schema}")
+    # libpq reads PGOPTIONS on every connect, including the pool's.
+    os.environ["PGOPTIONS"] = f"{os.getenv('PGOPTIONS', '')} -c search_path={schema}".strip()
+
+    from db_connection import close_pool
+    from migrations import ensure_schema
+
+    try:
+        with psycopg.connect(**DB_CONFIG) as conn:
+            ensure_schema(conn)
+        yield
+    finally:
+        close_pool()
+        if not keep:
+            with psycopg.connect(**DB_CONFIG) as conn:
+                conn.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+def create_accounts(count: int) -> list[tuple[int, str]]:
+    import psycopg
+
+    from db_connection import DB_CONFIG
+
+    usernames = [synthetic.account_username(idx) for idx in range(count)]
+    with psycopg.connect(**DB_CONFIG) as conn:
+        rows = conn.execute(
+            "INSERT INTO accounts (username) SELECT unnest(%s::text[]) RETURNING id, username",
+            (usernames,),
+        ).fetchall()
+    return sorted(rows, key=lambda row: row[1])
+
+
+def staging_rows(account_id: int, account: int, params: dict) -> list[tuple]:
+    return [
+        (account_id, *person)
+        for person in synthetic.followers(
+            account, params["followers"], population=population(params), seed=params["seed"]
+        )
+    ]
+
+
+def population(params: dict) -> int:
+    # Twice one audience per account: accounts share roughly half their followers.
+    return max(params["followers"] * params["accounts"] * 2 // 3, params["followers"])
+
+
+def stage_bulk_load(params: dict, timer: Timer, *, use_copy: bool) -> int:
+    import psycopg
+
+    from db_connection import DB_CONFIG
+    from db_utils import execute_values, insert_rows
+    from follower_store import FOLLOWER_COLUMNS
+
+    total = 0
+    with psycopg.connect(**DB_CONFIG) as conn:
+        for account, (account_id, _) in enumerate(create_accounts(params["accounts"])):
+            rows = staging_rows(account_id, account, params)
+            with conn.cursor() as cur, timer.measure():
+                if use_copy:
+                    insert_rows(cur, "follower_staging", FOLLOWER_COLUMNS, rows, use_copy=True)
+                else:
+                    execute_values(
+                        cur,
+                        f"INSERT INTO follower_staging ({', '.join(FOLLOWER_COLUMNS)}) VALUES %s",
+                        rows,
+                        page_size=1000,
+                    )
+                conn.commit()
+            total += len(rows)
+    return total
+
+
+def stage_replace_followers(params: dict, timer: Timer, *, churn: float = 0.0) -> int:
+    from update_followers_db import replace_followers
+
+    total = 0
+    for account, (account_id, username) in enumerate(create_accounts(params["accounts"])):
+        passes = [0.0, churn] if churn else [0.0]
+        for index, share in enumerate(passes):
+            nodes = list(
+                synthetic.followers(
+                    account,
+                    params["followers"],
+                    population=population(params),
+                    seed=params["seed"],
+                    churn=share,
+                )
+            )
+            if churn and index == 0:
+                # Initial load; only the churned re-sync is measured.
+                with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+                    replace_followers(account_id, username, nodes)
+                continue
+            with timer.measure():
+                replace_followers(account_id, username, nodes)
+            total += len(nodes)
+    return total
+
+
+def stage_upsert_history(params: dict, timer: Timer) -> int:
+    from update_followers_db import upsert_history
+
+    accounts = create_accounts(params["accounts"])
+    calls = [
+        (account_id, datetime.date.fromisoformat(entry["date"]), entry["followers"], entry["following"])
+        for account, (account_id, _) in enumerate(accounts)
+        for entry in synthetic.history(account, params["days"], seed=params["seed"])
+    ]
+    with timer.measure():
+        for call in calls:
+            upsert_history(*call)
+    return len(calls)
+
+
+def stage_import_data(params: dict, timer: Timer) -> int:
+    import import_data
+
+    synthetic.write_json_dataset(Path(import_data.DATA_DIR), params["accounts"], params["days"], seed=params["seed"])
+    with timer.measure():
+        import_data.main()
+    return params["accounts"] * params["days"]
+
+
+def stage_append_history(params: dict, timer: Timer) -> int:
+    import update_followers
+
+    usernames = synthetic.write_json_dataset(
+        update_followers.DATA_DIR, params["accounts"], params["days"], seed=params["seed"]
+    )
+    with timer.measure():
+        for _ in range(APPEND_PASSES):
+            for account, username in enumerate(usernames):
+                update_followers.append_history(username, 1000 + account, 100)
+    return len(usernames) * APPEND_PASSES
+
+
+# name -> (function, needs Postgres, environment overrides)
+STAGES = {
+    "insert_rows": (lambda params, timer: stage_bulk_load(params, timer, use_copy=True), True, {}),
+    "execute_values": (lambda params, timer: stage_bulk_load(params, timer, use_copy=False), True, {}),
+    "replace_followers": (stage_replace_followers, True, {"FOLLOWER_FULL_SYNC_DAYS": "0"}),
+    "replace_followers_churn": (
+        lambda params, timer: stage_replace_followers(params, timer, churn=0.01),
+        True,
+        {"FOLLOWER_FULL_SYNC_DAYS": "0"},
+    ),
+    "upsert_history": (stage_upsert_history, True, {}),
+    "import_data": (stage_import_data, True, {"IMPORT_WORKERS": "1"}),
+    "append_history_json": (stage_append_history, False, {"HISTORY_FORMAT": "json"}),
+    "append_history_jsonl": (stage_append_history, False, {"HISTORY_FORMAT": "jsonl"}),
+}
+
+
+def run_stage(name: str, params: dict, data_dir: str, keep: bool) -> dict:
+    """Run one stage; called in a fresh spawned process."""
+    function, needs_db, env = STAGES[name]
+    # Module-level settings of the scripts are read at import time.
+    os.environ.update(env)
+    os.environ["DATA_DIR"] = data_dir
+
+    counter = QueryCounter()
+    counter.install()
+    timer = Timer()
+    with scratch_schema(keep) if needs_db else contextlib.nullcontext():
+        rows = function(params, timer)
+
+    peak_kb = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return {
+        "stage": name,
+        "seconds": round(timer.seconds, 4),
+        "rows": rows,
+        "rows_per_second": round(rows / timer.seconds, 1) if timer.seconds else None,
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "queries": counter.count,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "-C", BASE_DIR, "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float) -> bool:
+    """Print the change against ``baseline_path``; True when any stage regressed."""
+    baseline = {}
+    with open(baseline_path, encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                record = json.loads(line)
+                baseline[(record["stage"], json.dumps(record["params"], sort_keys=True))] = record
+
+    regressed = False
+    print(f"{'stage':>24} {'rows/s':>12} {'change':>8} {'queries':>9} {'rss MB':>8}", file=sys.stderr)
+    for result in results:
+        before = baseline.get((result["stage"], json.dumps(result["params"], sort_keys=True)))
+        if before is None or not before.get("rows_per_second") or not result["rows_per_second"]:
+            print(f"{result['stage']:>24} {'(no baseline)':>12}", file=sys.stderr)
+            continue
+        change = result["rows_per_second"] / before["rows_per_second"] - 1
+        slower = change < -threshold
+        more_queries = result["queries"] > before["queries"]
+        regressed |= slower or more_queries
+        flag = " REGRESSION" if slower or more_queries else ""
+        print(
+            f"{result['stage']:>24} {result['rows_per_second']:>12.0f} {change:>+8.1%}"
+            f" {result['queries'] - before['queries']:>+9d}"
+            f" {result['peak_rss_mb'] - before['peak_rss_mb']:>+8.1f}{flag}",
+            file=sys.stderr,
+        )
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=5)
+    parser.add_argument("--followers", type=int, default=20_000, help="followers per account")
+    parser.add_argument("--days", type=int, default=365, help="days of history per account")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of: " + ", ".join(STAGES))
+    parser.add_argument("--output", help="append the JSON lines to this file as well")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier --output file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="tolerated throughput drop (default 0.2)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schemas for inspection")
+    args = parser.parse_args()
+
+    stages = [name.strip() for name in args.stages.split(",") if name.strip()]
+    unknown = [name for name in stages if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    params = {"accounts": args.accounts, "followers": args.followers, "days": args.days, "seed": args.seed}
+    context = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    }
+
+    results = []
+    for name in stages:
+        with tempfile.TemporaryDirectory(prefix="bench-data-") as data_dir:
+            # A fresh interpreter per stage keeps peak RSS and imported settings separate.
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(run_stage, name, params, data_dir, args.keep).result()
+        result = {"stage": name, "params": params, **result, **context}
+        results.append(result)
+        line = json.dumps(result)
+        print(line, flush=True)
+        if args.output:
+            with open(args.output, "a", encoding="utf-8") as handle:
+                handle.write(line + "\n")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Deterministic synthetic accounts, followers and history for the benchmarks.
+
+Followers are drawn from one shared population, so tracked accounts overlap
+the way real audiences do. Person ``i`` always gets the same attributes for a
+given seed, without keeping the population in memory. Usernames and display
+names follow the shapes seen in real follower lists: ``first.last``,
+``first_last``, digit suffixes, and the occasional underscore-wrapped handle.
+About one in seven display names is empty, and a few carry accents or emoji.
+Profile picture URLs carry the long signed query strings Instagram returns.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import random
+from collections.abc import Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+FIRST_NAMES = (
+    "ana", "joao", "maria", "pedro", "lucas", "julia", "gabriel", "beatriz", "rafael", "larissa",
+    "mateus", "camila", "bruno", "fernanda", "gustavo", "amanda", "felipe", "leticia", "thiago", "mariana",
+    "james", "emma", "olivia", "liam", "noah", "sophia", "mia", "ethan", "ava", "lucia",
+    "diego", "valentina", "carlos", "isabela", "vinicius", "bianca", "rodrigo", "yasmin", "caio", "luana",
+)
+LAST_NAMES = (
+    "silva", "santos", "oliveira", "souza", "rodrigues", "ferreira", "alves", "pereira", "lima", "gomes",
+    "costa", "ribeiro", "martins", "carvalho", "almeida", "lopes", "soares", "fernandes", "vieira", "barbosa",
+    "smith", "johnson", "brown", "garcia", "miller", "davis", "martinez", "lopez", "wilson", "anderson",
+)
+WORDS = (
+    "art", "photo", "travel", "fit", "food", "music", "design", "studio", "official", "store",
+    "life", "daily", "world", "style", "beauty", "tattoo", "surf", "coffee", "vibes", "club",
+)
+ACCENTED = {"joao": "João", "lucia": "Lúcia", "isabela": "Isabela", "leticia": "Letícia", "caio": "Caio"}
+EMOJI = ("✨", "🌸", "⚡", "🇧🇷", "📷", "🌊")
+
+MASK64 = (1 << 64) - 1
+
+
+class SyntheticFollower(NamedTuple):
+    """Attribute-compatible with the Instaloader ``Profile`` fields the updaters read."""
+
+    username: str
+    full_name: str
+    profile_pic_url: str
+    is_private: bool
+    is_verified: bool
+    userid: int
+
+
+def _mix(value: int) -> int:
+    """splitmix64: cheap, well-distributed bits for person ``value``."""
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+def person(index: int, seed: int = 0) -> SyntheticFollower:
+    bits = _mix(index * 1_000_003 + seed)
+    first = FIRST_NAMES[bits % len(FIRST_NAMES)]
+    last = LAST_NAMES[(bits >> 8) % len(LAST_NAMES)]
+    word = WORDS[(bits >> 16) % len(WORDS)]
+    number = (bits >> 24) % 10_000
+    shape = (bits >> 40) % 100
+
+    # The index suffix keeps usernames unique across the population.
+    if shape < 30:
+        handle = f"{first}.{last}"
+    elif shape < 50:
+        handle = f"{first}_{last}"
+    elif shape < 70:
+        handle = f"{first}{last}{number % 100:02d}"
+    elif shape < 85:
+        handle = f"{first}.{word}"
+    elif shape < 95:
+        handle = f"{word}{first}"
+    else:
+        handle = f"_{first}_{last}_"
+    username = f"{handle}{index:x}"[:30]
+
+    name_shape = (bits >> 48) % 100
+    display_first = ACCENTED.get(first, first.capitalize())
+    if name_shape < 14:
+        full_name = ""
+    elif name_shape < 24:
+        full_name = display_first
+    elif name_shape < 29:
+        full_name = f"{display_first} {last.capitalize()} {EMOJI[(bits >> 56) % len(EMOJI)]}"
+    else:
+        full_name = f"{display_first} {last.capitalize()}"
+
+    # An odd multiplier is a bijection modulo 2**36, so IDs never collide.
+    userid = 1_000_000_000 + (index * 0x9E3779B1) % (1 << 36)
+    profile_pic_url = (
+        f"https://scontent-gru2-1.cdninstagram.com/v/t51.2885-19/{userid}_{bits % 10**17}_n.jpg"
+        f"?stp=dst-jpg_s150x150&_nc_ht=scontent-gru2-1.cdninstagram.com&_nc_ohc={bits >> 20:x}"
+        f"&oh=00_{bits:016x}{_mix(bits):016x}&oe={(bits >> 32) & 0xFFFFFFFF:08X}"
+    )
+    return SyntheticFollower(
+        username=username,
+        full_name=full_name,
+        profile_pic_url=profile_pic_url,
+        is_private=(bits >> 4) % 100 < 40,
+        is_verified=(bits >> 12) % 1000 < 5,
+        userid=userid,
+    )
+
+
+def account_username(index: int) -> str:
+    return f"bench_account_{index:04d}"
+
+
+def follower_indices(account: int, count: int, *, population: int, seed: int = 0, churn: float = 0.0) -> list[int]:
+    """Population indices of ``account``'s followers; ``churn`` replaces that share of them."""
+    rng = random.Random(seed * 7919 + account)
+    indices = rng.sample(range(population), count)
+    if churn > 0:
+        replaced = int(count * churn)
+        fresh = population + account * count
+        indices = indices[replaced:] + list(range(fresh, fresh + replaced))
+    return indices
+
+
+def followers(account: int, count: int, *, population: int, seed: int = 0, churn: float = 0.0) -> Iterator[SyntheticFollower]:
+    for index in follower_indices(account, count, population=population, seed=seed, churn=churn):
+        yield person(index, seed)
+
+
+def history(account: int, days: int, *, seed: int = 0, end: datetime.date | None = None) -> list[dict[str, object]]:
+    """Daily follower/following counts as a random walk ending on ``end`` (default: yesterday)."""
+    rng = random.Random(seed * 104729 + account)
+    end = end or datetime.date.today() - datetime.timedelta(days=1)
+    followers_count = rng.randint(500, 200_000)
+    following = rng.randint(50, 3_000)
+    entries = []
+    for offset in range(days - 1, -1, -1):
+        followers_count = max(0, followers_count + int(rng.gauss(followers_count * 0.001, followers_count * 0.004 + 3)))
+        following = max(0, following + rng.randint(-3, 3))
+        entries.append(
+            {
+                "date": (end - datetime.timedelta(days=offset)).isoformat(),
+                "followers": followers_count,
+                "following": following,
+            }
+        )
+    return entries
+
+
+def write_json_dataset(directory: Path, accounts: int, days: int, *, seed: int = 0) -> list[str]:
+    """Populate ``directory`` like ``public/data``: ``accounts.json`` plus one history file per account."""
+    directory.mkdir(parents=True, exist_ok=True)
+    usernames = [account_username(idx) for idx in range(accounts)]
+    (directory / "accounts.json").write_text(json.dumps(usernames, indent=2), encoding="utf-8")
+    for idx, username in enumerate(usernames):
+        payload = {"username": username, "history": history(idx, days, seed=seed)}
+        (directory / f"{username}.json").write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+    return usernames
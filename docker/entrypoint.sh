@@ -38,7 +38,14 @@ PYTHON
   sleep 2
 done
 
-echo "Ensuring database schema and importing legacy JSON data (if any)..."
+# The API only checks the schema version, so it cannot serve without this step.
+echo "Applying database schema migrations..."
+if ! "$PYTHON_BIN" /app/scripts/migrations.py; then
+  echo "ERROR: Database schema migration failed" >&2
+  exit 1
+fi
+
+echo "Importing legacy JSON data (if any)..."
 if ! "$PYTHON_BIN" /app/scripts/import_data.py; then
   echo "WARNING: Initial data import failed. Continuing startup." >&2
 fi
@@ -46,6 +53,16 @@ fi
 # Start cron in the background so scheduled jobs run.
 cron
 
+# Optionally keep the updater daemon working through the refresh job queue.
+if [ "${UPDATER_DAEMON:-0}" = "1" ]; then
+  "$PYTHON_BIN" /app/scripts/updater_daemon.py >> /var/log/cron.log 2>&1 &
+fi
+
+# Optionally keep a pre-warmed worker for update_one.py refreshes.
+if [ "${REFRESH_WORKER:-0}" = "1" ]; then
+  "$PYTHON_BIN" /app/scripts/refresh_worker.py serve >> /var/log/cron.log 2>&1 &
+fi
+
 # Stream cron output to container logs for observability.
 tail -f /var/log/cron.log &
 
@@ -0,0 +1,27 @@
+import pool from './db';
+
+// Same statement as enqueue_jobs() in scripts/refresh_jobs.py: a queued job for
+// the account absorbs the new request instead of adding a duplicate.
+export async function enqueueRefresh(username: string, reason: string): Promise<void> {
+  try {
+    await pool.query(
+      `WITH job AS (
+         INSERT INTO refresh_jobs (account_id, mode, priority, reason)
+         SELECT id, 'followers', 'Infinity'::float8, $2
+         FROM accounts
+         WHERE username = $1
+         ON CONFLICT (account_id) WHERE status = 'queued'
+         DO UPDATE SET priority = GREATEST(refresh_jobs.priority, EXCLUDED.priority),
+                       mode = 'followers',
+                       run_after = LEAST(refresh_jobs.run_after, EXCLUDED.run_after),
+                       requests = refresh_jobs.requests + 1
+         RETURNING id
+       )
+       SELECT pg_notify('refresh_jobs', '') FROM job`,
+      [username, reason]
+    );
+  } catch (error) {
+    // The account itself is stored; without a job it waits for the nightly sweep.
+    console.error('Error enqueueing refresh job:', error);
+  }
+}
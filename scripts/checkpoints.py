@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import datetime
+import os
+
+from instaloader import FrozenNodeIterator, NodeIterator
+from psycopg.types.json import Jsonb
+
+FOLLOWER_CHECKPOINT_MAX_AGE = datetime.timedelta(
+    hours=float(os.getenv("FOLLOWER_CHECKPOINT_MAX_AGE_HOURS", "72"))
+)
+
+
+def load_checkpoint(cursor, account_id: int) -> FrozenNodeIterator | None:
+    """Return the saved follower pagination state of ``account_id``, if still fresh.
+
+    Expired checkpoints are deleted so the next fetch starts from page one.
+    """
+    cursor.execute(
+        """
+        SELECT state, saved_at < NOW() - %s AS expired
+        FROM follower_checkpoints
+        WHERE account_id = %s
+        """,
+        (FOLLOWER_CHECKPOINT_MAX_AGE, account_id),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    state, expired = row
+    if expired:
+        clear_checkpoint(cursor, account_id)
+        return None
+
+    try:
+        return FrozenNodeIterator(**state)
+    except TypeError:
+        clear_checkpoint(cursor, account_id)
+        return None
+
+
+def save_checkpoint(cursor, account_id: int, iterator: NodeIterator) -> None:
+    cursor.execute(
+        """
+        INSERT INTO follower_checkpoints (account_id, state, total_index, saved_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (account_id)
+        DO UPDATE SET state = EXCLUDED.state,
+                      total_index = EXCLUDED.total_index,
+                      saved_at = EXCLUDED.saved_at
+        """,
+        (account_id, Jsonb(iterator.freeze()._asdict()), iterator.total_index),
+    )
+
+
+def clear_checkpoint(cursor, account_id: int) -> None:
+    cursor.execute(
+        "DELETE FROM follower_checkpoints WHERE account_id = %s",
+        (account_id,),
+    )
+
+
+__all__ = [
+    "FOLLOWER_CHECKPOINT_MAX_AGE",
+    "clear_checkpoint",
+    "load_checkpoint",
+    "save_checkpoint",
+]
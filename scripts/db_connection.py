@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import psycopg
+from psycopg_pool import ConnectionPool
+
+DB_CONFIG = {
+    "host": os.getenv("POSTGRES_HOST", "postgres"),
+    "port": int(os.getenv("POSTGRES_PORT", "5432")),
+    "user": os.getenv("POSTGRES_USER", "devuser"),
+    "password": os.getenv("POSTGRES_PASSWORD", "devpass"),
+    "dbname": os.getenv("POSTGRES_DB", "insta-followers"),
+}
+
+DB_POOL_MAX_SIZE = max(int(os.getenv("DB_POOL_MAX_SIZE", "4")), 1)
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_checkouts = 0
+_wait_total = 0.0
+_wait_max = 0.0
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, opening it on first use.
+
+    Every checkout is validated with a cheap round trip, so connections that
+    the server or a firewall dropped during long idle periods (e.g. the sleeps
+    between accounts) are replaced transparently.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            print(
+                "Connecting to Postgres with host={host} port={port} db={dbname}".format(
+                    **DB_CONFIG
+                )
+            )
+            _pool = ConnectionPool(
+                kwargs=dict(DB_CONFIG),
+                min_size=1,
+                max_size=DB_POOL_MAX_SIZE,
+                max_idle=DB_POOL_MAX_IDLE,
+                timeout=DB_POOL_TIMEOUT,
+                check=ConnectionPool.check_connection,
+                name="insta-followers",
+                open=True,
+            )
+        return _pool
+
+
+def reserve_connections(count: int) -> None:
+    """Grow the pool so that ``count`` connections can be checked out at once."""
+    pool = get_pool()
+    if pool.max_size < count:
+        pool.resize(pool.min_size, count)
+
+
+@contextmanager
+def connection() -> Iterator[psycopg.Connection]:
+    """Check a connection out of the pool.
+
+    Like ``with psycopg.connect(...)``, the transaction is committed when the
+    block exits normally and rolled back on error; the connection itself is
+    returned to the pool instead of being closed.
+    """
+    global _checkouts, _wait_total, _wait_max
+    started = time.perf_counter()
+    with get_pool().connection() as conn:
+        waited = time.perf_counter() - started
+        with _stats_lock:
+            _checkouts += 1
+            _wait_total += waited
+            _wait_max = max(_wait_max, waited)
+        yield conn
+
+
+def checkout_stats() -> dict[str, float]:
+    """Checkout wait-time metrics, merged with the pool's own counters."""
+    with _stats_lock:
+        stats: dict[str, float] = {
+            "checkouts": _checkouts,
+            "checkout_wait_total_ms": round(_wait_total * 1000, 3),
+            "checkout_wait_max_ms": round(_wait_max * 1000, 3),
+            "checkout_wait_avg_ms": round(_wait_total * 1000 / _checkouts, 3) if _checkouts else 0.0,
+        }
+    if _pool is not None:
+        stats.update(_pool.get_stats())
+    return stats
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+__all__ = [
+    "DB_CONFIG",
+    "checkout_stats",
+    "close_pool",
+    "connection",
+    "get_pool",
+    "reserve_connections",
+]
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
-from collections.abc import Sequence
+import os
+from collections.abc import Iterable, Sequence
+from itertools import islice
 from typing import Any
 
+BULK_LOAD_METHOD = os.getenv("BULK_LOAD_METHOD", "copy").strip().lower()
+
 
 def execute_values(
     cursor,
@@ -38,3 +42,70 @@ def execute_values(
         for row in chunk:
             params.extend(row)
         cursor.execute(head + values_clause + tail, params)
+
+
+def copy_rows(
+    cursor,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+) -> int:
+    """Stream ``rows`` into ``table`` with ``COPY ... FROM STDIN``.
+
+    ``rows`` may be any iterable, including a generator, so callers never need
+    to materialise the full argument list. Returns the number of rows written.
+    """
+    if not columns:
+        raise ValueError("COPY requires at least one column")
+
+    width = len(columns)
+    statement = "COPY {table} ({columns}) FROM STDIN".format(
+        table=table,
+        columns=", ".join(columns),
+    )
+
+    count = 0
+    with cursor.copy(statement) as copy:
+        for row in rows:
+            if len(row) != width:
+                raise ValueError("All rows must have the same length as the column list")
+            copy.write_row(row)
+            count += 1
+    return count
+
+
+def insert_rows(
+    cursor,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    *,
+    use_copy: bool | None = None,
+    page_size: int = 1000,
+) -> int:
+    """Bulk insert ``rows`` via COPY, or via multi-row VALUES when ``use_copy`` is off.
+
+    ``use_copy`` defaults to the ``BULK_LOAD_METHOD`` environment variable
+    (``copy`` or ``values``). The VALUES path is kept as a fallback for
+    connections where COPY is not available (e.g. statement poolers); it
+    consumes ``rows`` one page at a time.
+    """
+    if use_copy is None:
+        use_copy = BULK_LOAD_METHOD != "values"
+
+    if use_copy:
+        return copy_rows(cursor, table, columns, rows)
+
+    sql = "INSERT INTO {table} ({columns}) VALUES %s".format(
+        table=table,
+        columns=", ".join(columns),
+    )
+    iterator = iter(rows)
+    count = 0
+    while True:
+        chunk = list(islice(iterator, page_size))
+        if not chunk:
+            break
+        execute_values(cursor, sql, chunk, page_size=page_size)
+        count += len(chunk)
+    return count
@@ -0,0 +1,579 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Callable, Iterable, Sequence
+from typing import Any, NamedTuple
+
+import psycopg
+from instaloader import NodeIterator
+from instaloader.exceptions import InvalidArgumentException
+
+from checkpoints import clear_checkpoint, load_checkpoint, save_checkpoint
+from db_utils import insert_rows
+from run_metrics import run_metrics
+from snapshots import record_snapshot
+
+FOLLOWER_SYNC_MODE = os.getenv("FOLLOWER_SYNC_MODE", "merge").strip().lower()
+FOLLOWER_CHUNK_SIZE = max(int(os.getenv("FOLLOWER_CHUNK_SIZE", "1000")), 1)
+FOLLOWER_FULL_SYNC_DAYS = float(os.getenv("FOLLOWER_FULL_SYNC_DAYS", "7"))
+FOLLOWER_KNOWN_STOP_RUN = max(int(os.getenv("FOLLOWER_KNOWN_STOP_RUN", "50")), 1)
+
+FOLLOWER_COLUMNS = (
+    "account_id",
+    "follower_username",
+    "full_name",
+    "profile_pic_url",
+    "is_private",
+    "is_verified",
+    "ig_user_id",
+)
+
+
+class FollowerRecord(NamedTuple):
+    """Compact, tuple-backed view of one follower as stored in the database."""
+
+    username: str
+    full_name: str | None
+    profile_pic_url: str | None
+    is_private: bool | None
+    is_verified: bool | None
+    user_id: int | None = None
+
+    @classmethod
+    def from_profile(cls, profile) -> "FollowerRecord":  # noqa: ANN001
+        return cls(
+            profile.username,
+            profile.full_name,
+            profile.profile_pic_url,
+            profile.is_private,
+            profile.is_verified,
+            profile.userid,
+        )
+
+
+class SyncResult(NamedTuple):
+    gained: int
+    lost: int
+    changed: int
+    mode: str
+
+
+class FollowerWriter:
+    """Flush followers to ``follower_staging`` in fixed-size, committed chunks.
+
+    Only one chunk is held in memory at a time. Nothing touches
+    ``account_followers`` until :meth:`apply` is called with the complete list,
+    so an interrupted fetch never publishes a partial follower set.
+
+    When fed from an Instaloader ``NodeIterator`` via :meth:`write_from`, the
+    iterator state is checkpointed together with every chunk, and a later run
+    resumes from it instead of starting at page one.
+    """
+
+    def __init__(self, conn, account_id: int, *, chunk_size: int = FOLLOWER_CHUNK_SIZE) -> None:  # noqa: ANN001
+        self.conn = conn
+        self.account_id = account_id
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.resumed = False
+        self._buffer: list[FollowerRecord] = []
+        self._nodes: NodeIterator | None = None
+
+    def reset(self) -> None:
+        with self.conn.cursor() as cur:
+            clear_staged_followers(cur, self.account_id)
+            clear_checkpoint(cur, self.account_id)
+        self.conn.commit()
+        self._buffer.clear()
+        self.count = 0
+        self.resumed = False
+
+    def resume(self, nodes: NodeIterator) -> bool:
+        """Thaw ``nodes`` from the saved checkpoint; start afresh if there is none."""
+        self._nodes = nodes
+        with self.conn.cursor() as cur:
+            frozen = load_checkpoint(cur, self.account_id)
+        self.conn.commit()
+
+        if frozen is not None:
+            try:
+                nodes.thaw(frozen)
+            except InvalidArgumentException:
+                frozen = None
+
+        if frozen is None:
+            self.reset()
+            return False
+
+        self._buffer.clear()
+        self.count = frozen.total_index
+        self.resumed = True
+        return True
+
+    def write_from(
+        self,
+        nodes: Iterable[Any],
+        *,
+        progress: Callable[[int], None] | None = None,
+    ) -> int:
+        """Consume follower profiles from ``nodes`` and stage them chunk by chunk.
+
+        On any interruption the pending chunk and the iterator position are
+        persisted before the exception propagates.
+        """
+        if not isinstance(nodes, NodeIterator):
+            self.reset()
+        elif self._nodes is not nodes:
+            self.resume(nodes)
+
+        try:
+            for node in nodes:
+                self.add(FollowerRecord.from_profile(node))
+                if progress is not None and self.count % 200 == 0:
+                    progress(self.count)
+        except BaseException:
+            try:
+                self.conn.rollback()
+                self.flush(force_checkpoint=True)
+            except Exception as exc:  # noqa: BLE001
+                print(f"WARNING: Could not save follower checkpoint: {exc}")
+            raise
+        return self.count
+
+    def write_new_from(
+        self,
+        nodes: Iterable[Any],
+        *,
+        known_run: int = FOLLOWER_KNOWN_STOP_RUN,
+        progress: Callable[[int], None] | None = None,
+    ) -> int:
+        """Stage followers until ``known_run`` consecutive ones are already stored.
+
+        Instagram lists followers roughly newest-first, so on a quiet day the
+        fetch stops after the first page or two instead of walking the whole
+        list. Unfollows are not detected; see :func:`needs_full_sync`.
+        """
+        self.reset()
+        self._nodes = None
+
+        run = 0
+        batch: list[FollowerRecord] = []
+        for node in nodes:
+            batch.append(FollowerRecord.from_profile(node))
+            if len(batch) < known_run:
+                continue
+            run = self._stage_batch(batch, run, progress)
+            batch = []
+            if run >= known_run:
+                break
+        else:
+            if batch:
+                self._stage_batch(batch, run, progress)
+        return self.count
+
+    def _stage_batch(
+        self,
+        batch: list[FollowerRecord],
+        run: int,
+        progress: Callable[[int], None] | None,
+    ) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT f.username
+                FROM followers f
+                JOIN account_followers af ON af.follower_id = f.id
+                WHERE af.account_id = %s
+                  AND f.username = ANY(%s)
+                """,
+                (self.account_id, [record.username for record in batch]),
+            )
+            known = {row[0] for row in cur.fetchall()}
+        for record in batch:
+            run = run + 1 if record.username in known else 0
+            self.add(record)
+            if progress is not None and self.count % 200 == 0:
+                progress(self.count)
+        return run
+
+    def add(self, record: FollowerRecord) -> None:
+        self._buffer.append(record)
+        self.count += 1
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self, *, force_checkpoint: bool = False) -> None:
+        if not self._buffer and not force_checkpoint:
+            return
+        with run_metrics().phase("db_write"):
+            with self.conn.cursor() as cur:
+                if self._buffer:
+                    stage_followers(cur, self.account_id, self._buffer)
+                if self._nodes is not None:
+                    save_checkpoint(cur, self.account_id, self._nodes)
+            self.conn.commit()
+        self._buffer.clear()
+
+    def apply(self, *, mode: str | None = None, complete: bool = True) -> SyncResult:
+        self.flush()
+        with run_metrics().phase("db_write"):
+            with self.conn.cursor() as cur:
+                result = apply_staged_followers(cur, self.account_id, mode=mode, complete=complete)
+                clear_checkpoint(cur, self.account_id)
+            self.conn.commit()
+        self._nodes = None
+        return result
+
+
+def stage_followers(cursor, account_id: int, rows: Iterable[Sequence[Any]]) -> int:
+    return insert_rows(
+        cursor,
+        "follower_staging",
+        FOLLOWER_COLUMNS,
+        ((account_id, *row) for row in rows),
+    )
+
+
+def clear_staged_followers(cursor, account_id: int) -> None:
+    cursor.execute(
+        "DELETE FROM follower_staging WHERE account_id = %s",
+        (account_id,),
+    )
+
+
+def sync_followers(
+    cursor,
+    account_id: int,
+    rows: Iterable[Sequence[Any]],
+    *,
+    mode: str | None = None,
+) -> SyncResult:
+    """Bring ``account_followers`` for ``account_id`` in line with ``rows``.
+
+    ``rows`` yields ``(follower_username, full_name, profile_pic_url,
+    is_private, is_verified, ig_user_id)`` tuples (e.g. :class:`FollowerRecord`).
+    """
+    clear_staged_followers(cursor, account_id)
+    stage_followers(cursor, account_id, rows)
+    return apply_staged_followers(cursor, account_id, mode=mode)
+
+
+def apply_staged_followers(
+    cursor,
+    account_id: int,
+    *,
+    mode: str | None = None,
+    complete: bool = True,
+) -> SyncResult:
+    """Publish the staged follower list of ``account_id`` and clear the stage.
+
+    Staged followers are first interned into the ``followers`` dimension
+    (see :func:`_intern_staged`); ``account_followers`` links accounts to
+    ``followers.id`` and keeps a copy of the username for paging, which the
+    ``followers_rename`` trigger updates on renames. In ``merge`` mode (the
+    default) only the difference is applied, with every gained or lost
+    follower written to ``follower_events``. ``replace`` keeps
+    the old DELETE + reinsert path. When ``complete`` is false the stage holds
+    only the newest followers from an incremental fetch: they are upserted,
+    nothing is deleted and the full-sync timestamp is left alone.
+    """
+    mode = mode or FOLLOWER_SYNC_MODE
+    if complete and mode not in ("merge", "replace"):
+        raise ValueError(f"Unknown follower sync mode '{mode}'")
+
+    changed = _intern_staged(cursor, account_id)
+    if not complete:
+        result = _merge_from_stage(cursor, account_id, changed, delete_missing=False)
+    elif mode == "replace":
+        result = _replace_from_stage(cursor, account_id, changed)
+    else:
+        result = _merge_from_stage(cursor, account_id, changed)
+    cursor.execute(
+        """
+        UPDATE accounts
+        SET followers_synced_at = NOW(),
+            followers_full_sync_at = CASE WHEN %s THEN NOW() ELSE followers_full_sync_at END
+        WHERE id = %s
+        """,
+        (complete, account_id),
+    )
+    clear_staged_followers(cursor, account_id)
+    return result
+
+
+def needs_full_sync(cursor, account_id: int) -> bool:
+    """Whether the next follower fetch must walk the whole list.
+
+    A full pass is required for accounts without stored followers, to finish
+    an interrupted full pass, and every ``FOLLOWER_FULL_SYNC_DAYS`` to pick up
+    unfollows. Setting ``FOLLOWER_FULL_SYNC_DAYS=0`` disables incremental mode.
+    """
+    if FOLLOWER_FULL_SYNC_DAYS <= 0:
+        return True
+    cursor.execute(
+        """
+        SELECT a.followers_full_sync_at IS NULL
+               OR a.followers_full_sync_at < NOW() - make_interval(secs => %s)
+               OR EXISTS (SELECT 1 FROM follower_checkpoints c WHERE c.account_id = a.id)
+               OR NOT EXISTS (SELECT 1 FROM account_followers af WHERE af.account_id = a.id)
+        FROM accounts a
+        WHERE a.id = %s
+        """,
+        (FOLLOWER_FULL_SYNC_DAYS * 86400, account_id),
+    )
+    row = cursor.fetchone()
+    return row is None or bool(row[0])
+
+
+def refresh_followers(
+    conn,  # noqa: ANN001
+    account_id: int,
+    username: str,
+    nodes: Iterable[Any],
+) -> tuple[int, SyncResult]:
+    """Fetch and publish the followers of one account, incrementally when allowed."""
+    writer = FollowerWriter(conn, account_id)
+    with conn.cursor() as cur:
+        full = needs_full_sync(cur, account_id)
+    conn.commit()
+
+    def progress(count: int) -> None:
+        print(f"Fetched {count} followers so far for {username}")
+
+    if full:
+        if isinstance(nodes, NodeIterator) and writer.resume(nodes):
+            print(f"Resuming follower fetch for {username} after {writer.count} followers.")
+        writer.write_from(nodes, progress=progress)
+    else:
+        print(
+            f"Incremental follower fetch for {username}"
+            f" (stops after {FOLLOWER_KNOWN_STOP_RUN} known followers)."
+        )
+        writer.write_new_from(nodes, progress=progress)
+    result = writer.apply(complete=full)
+
+    # The published list is already committed; a failed snapshot only costs
+    # that day's entry in the follower set history.
+    try:
+        with run_metrics().phase("db_write"), conn.cursor() as cur:
+            count, added, removed = record_snapshot(cur, account_id)
+        conn.commit()
+        print(f"Recorded follower snapshot for {username}: {count} followers (+{added}/-{removed}).")
+    except psycopg.Error as exc:
+        conn.rollback()
+        print(f"WARNING: Could not record follower snapshot for {username}: {exc}")
+    return writer.count, result
+
+
+def _intern_staged(cursor, account_id: int) -> int:
+    """Resolve the staged followers to ``followers.id`` in bulk.
+
+    Followers are keyed by their Instagram user ID, so renames update the
+    existing row; a username taken over by another user is released from its
+    previous holder. Rows staged without a user ID (checkpoints from older
+    versions) and followers imported before user IDs were recorded fall back
+    to the username. Fills the ``staged_follower_ids`` temp table and returns
+    how many known followers changed profile data.
+    """
+    cursor.execute("DROP TABLE IF EXISTS incoming_followers, staged_follower_ids")
+    cursor.execute(
+        """
+        CREATE TEMP TABLE incoming_followers ON COMMIT DROP AS
+        SELECT DISTINCT ON (follower_username)
+               ig_user_id, follower_username, full_name, profile_pic_url, is_private, is_verified
+        FROM follower_staging
+        WHERE account_id = %s
+        ORDER BY follower_username, ig_user_id IS NULL
+        """,
+        (account_id,),
+    )
+    # A follower renamed mid-fetch shows up under both names; keep one.
+    cursor.execute(
+        """
+        DELETE FROM incoming_followers a
+        USING incoming_followers b
+        WHERE a.ig_user_id = b.ig_user_id
+          AND a.follower_username < b.follower_username
+        """
+    )
+    cursor.execute(
+        """
+        UPDATE followers f
+        SET ig_user_id = i.ig_user_id
+        FROM incoming_followers i
+        WHERE f.username = i.follower_username
+          AND f.ig_user_id IS NULL
+          AND i.ig_user_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM followers x WHERE x.ig_user_id = i.ig_user_id)
+        """
+    )
+    cursor.execute(
+        """
+        UPDATE followers f
+        SET username = NULL,
+            updated_at = NOW()
+        FROM incoming_followers i
+        WHERE f.username = i.follower_username
+          AND i.ig_user_id IS NOT NULL
+          AND f.ig_user_id IS DISTINCT FROM i.ig_user_id
+        """
+    )
+
+    # Instagram signs profile picture URLs per request, so only the path takes
+    # part in change detection; otherwise every row would be rewritten daily.
+    changed = 0
+    for key, source in (
+        ("ig_user_id", "WHERE ig_user_id IS NOT NULL"),
+        ("username", "WHERE ig_user_id IS NULL"),
+    ):
+        cursor.execute(
+            f"""
+            WITH upserted AS (
+              INSERT INTO followers (ig_user_id, username, full_name, profile_pic_url, is_private, is_verified)
+              SELECT ig_user_id, follower_username, full_name, profile_pic_url, is_private, is_verified
+              FROM incoming_followers
+              {source}
+              ON CONFLICT ({key}) DO UPDATE
+              SET username = EXCLUDED.username,
+                  full_name = EXCLUDED.full_name,
+                  profile_pic_url = EXCLUDED.profile_pic_url,
+                  is_private = EXCLUDED.is_private,
+                  is_verified = EXCLUDED.is_verified,
+                  updated_at = NOW()
+              WHERE (
+                  followers.username,
+                  followers.full_name,
+                  split_part(followers.profile_pic_url, '?', 1),
+                  followers.is_private,
+                  followers.is_verified
+              ) IS DISTINCT FROM (
+                  EXCLUDED.username,
+                  EXCLUDED.full_name,
+                  split_part(EXCLUDED.profile_pic_url, '?', 1),
+                  EXCLUDED.is_private,
+                  EXCLUDED.is_verified
+              )
+              RETURNING (xmax = 0) AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+            """
+        )
+        changed += cursor.fetchone()[0]
+
+    cursor.execute(
+        """
+        CREATE TEMP TABLE staged_follower_ids ON COMMIT DROP AS
+        SELECT f.id AS follower_id, f.username
+        FROM incoming_followers i
+        JOIN followers f ON f.ig_user_id = i.ig_user_id
+        UNION
+        SELECT f.id, f.username
+        FROM incoming_followers i
+        JOIN followers f ON f.username = i.follower_username
+        WHERE i.ig_user_id IS NULL
+        """
+    )
+    cursor.execute("ANALYZE staged_follower_ids")
+    return changed
+
+
+def _merge_from_stage(cursor, account_id: int, changed: int, *, delete_missing: bool = True) -> SyncResult:
+    # The first sync of an account has nothing to diff against, so it seeds the
+    # table without flooding follower_events with one "gained" row per follower.
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM account_followers WHERE account_id = %s)",
+        (account_id,),
+    )
+    record_events = bool(cursor.fetchone()[0])
+
+    lost = 0
+    if delete_missing:
+        lost = _delete_missing(cursor, account_id)
+
+    cursor.execute(
+        """
+        WITH gained AS (
+          INSERT INTO account_followers (account_id, follower_id, username)
+          SELECT %s, follower_id, username
+          FROM staged_follower_ids
+          ON CONFLICT DO NOTHING
+          RETURNING follower_id
+        ),
+        logged AS (
+          INSERT INTO follower_events (account_id, follower_id, event)
+          SELECT %s, follower_id, 'gained'
+          FROM gained
+          WHERE %s
+          RETURNING 1
+        )
+        SELECT COUNT(*) FROM gained
+        """,
+        (account_id, account_id, record_events),
+    )
+    gained = cursor.fetchone()[0]
+    return SyncResult(
+        gained=gained,
+        lost=lost,
+        changed=changed,
+        mode="merge" if delete_missing else "incremental",
+    )
+
+
+def _delete_missing(cursor, account_id: int) -> int:
+    cursor.execute(
+        """
+        WITH lost AS (
+          DELETE FROM account_followers af
+          WHERE af.account_id = %s
+            AND NOT EXISTS (
+              SELECT 1 FROM staged_follower_ids s
+              WHERE s.follower_id = af.follower_id
+            )
+          RETURNING af.follower_id
+        ),
+        logged AS (
+          INSERT INTO follower_events (account_id, follower_id, event)
+          SELECT %s, follower_id, 'lost' FROM lost
+          RETURNING 1
+        )
+        SELECT COUNT(*) FROM lost
+        """,
+        (account_id, account_id),
+    )
+    return cursor.fetchone()[0]
+
+
+def _replace_from_stage(cursor, account_id: int, changed: int) -> SyncResult:
+    cursor.execute(
+        "DELETE FROM account_followers WHERE account_id = %s",
+        (account_id,),
+    )
+    lost = cursor.rowcount
+    cursor.execute(
+        """
+        INSERT INTO account_followers (account_id, follower_id, username)
+        SELECT %s, follower_id, username
+        FROM staged_follower_ids
+        """,
+        (account_id,),
+    )
+    gained = cursor.rowcount
+    return SyncResult(gained=gained, lost=lost, changed=changed, mode="replace")
+
+
+__all__ = [
+    "FOLLOWER_CHUNK_SIZE",
+    "FOLLOWER_COLUMNS",
+    "FOLLOWER_FULL_SYNC_DAYS",
+    "FOLLOWER_KNOWN_STOP_RUN",
+    "FOLLOWER_SYNC_MODE",
+    "FollowerRecord",
+    "FollowerWriter",
+    "SyncResult",
+    "apply_staged_followers",
+    "needs_full_sync",
+    "refresh_followers",
+    "clear_staged_followers",
+    "stage_followers",
+    "sync_followers",
+]
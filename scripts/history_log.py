@@ -0,0 +1,250 @@
+"""Append-only follower history logs for the JSON snapshot mode.
+
+Each account gets ``public/data/history/<username>.jsonl`` with one compact
+JSON object per line, plus a tiny ``<username>.idx.json`` that records the
+date and byte offset of the last line and the log size. A daily update
+therefore costs one appended (or, for a same-day re-run, one rewritten)
+line instead of re-serialising the whole history, and git diffs stay one
+line long. Readers take the last line for each date, so an older date may
+simply be appended again; ``compact`` folds such duplicates away.
+
+The index is replaced atomically (temp file + rename). Log lines are written
+with a single ``write`` at the end of the file; if a crash tears the final
+line, the index no longer matches the log size and the next writer rebuilds
+it from the last complete line, dropping the torn tail.
+
+Usage::
+
+    python scripts/history_log.py compact [username ...]
+    python scripts/history_log.py export [username ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = Path(os.getenv("DATA_DIR", str(BASE_DIR / "public" / "data")))
+HISTORY_DIR = DATA_DIR / "history"
+# "json" rewrites public/data/<username>.json; "jsonl" appends to the log.
+HISTORY_FORMAT = os.getenv("HISTORY_FORMAT", "json").strip().lower()
+
+LOG_SUFFIX = ".jsonl"
+INDEX_SUFFIX = ".idx.json"
+# Bytes read from the end of a log when its index has to be rebuilt.
+TAIL_CHUNK = 4096
+
+
+def log_path(username: str, directory: Path = HISTORY_DIR) -> Path:
+    return directory / f"{username}{LOG_SUFFIX}"
+
+
+def index_path(username: str, directory: Path = HISTORY_DIR) -> Path:
+    return directory / f"{username}{INDEX_SUFFIX}"
+
+
+def logged_usernames(directory: Path = HISTORY_DIR) -> list[str]:
+    return sorted(path.name[: -len(LOG_SUFFIX)] for path in directory.glob(f"*{LOG_SUFFIX}"))
+
+
+def encode_entry(date: str, followers: int, following: int | None) -> bytes:
+    entry = {"date": date, "followers": followers, "following": following}
+    return (json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def parse_log(content: bytes) -> list[dict[str, Any]]:
+    """Entries of a log, one per date (the last line wins), sorted by date."""
+    by_date: dict[str, dict[str, Any]] = {}
+    for line in content.splitlines():
+        try:
+            entry = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue  # a torn final line
+        if isinstance(entry, dict) and isinstance(entry.get("date"), str):
+            by_date[entry["date"]] = entry
+    return [by_date[date] for date in sorted(by_date)]
+
+
+def read_entries(username: str, directory: Path = HISTORY_DIR) -> list[dict[str, Any]]:
+    path = log_path(username, directory)
+    if not path.exists():
+        return []
+    return parse_log(path.read_bytes())
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _save_index(username: str, directory: Path, last_date: str | None, last_offset: int, size: int) -> None:
+    payload = {"last_date": last_date, "last_offset": last_offset, "size": size}
+    _write_atomic(index_path(username, directory), json.dumps(payload).encode("utf-8"))
+
+
+def _rebuild_index(username: str, directory: Path) -> dict[str, Any]:
+    """Recover the index from the log tail, truncating a torn final line."""
+    path = log_path(username, directory)
+    last_date: str | None = None
+    last_offset = 0
+    end = 0
+    if path.exists():
+        with path.open("r+b") as handle:
+            size = handle.seek(0, os.SEEK_END)
+            window = TAIL_CHUNK
+            while True:
+                start = max(size - window, 0)
+                handle.seek(start)
+                tail = handle.read()
+                line_end = tail.rfind(b"\n")
+                line_start = tail.rfind(b"\n", 0, max(line_end, 0)) + 1
+                if start > 0 and line_start == 0:
+                    window *= 2
+                    continue
+                break
+            if line_end >= 0:
+                end = start + line_end + 1
+                last_offset = start + line_start
+                try:
+                    last_date = json.loads(tail[line_start:line_end]).get("date")
+                except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                    last_date = None
+            if end != size:
+                print(f"WARNING: Dropping torn final line of {path}")
+                handle.truncate(end)
+    _save_index(username, directory, last_date, last_offset, end)
+    return {"last_date": last_date, "last_offset": last_offset, "size": end}
+
+
+def _load_index(username: str, directory: Path) -> dict[str, Any]:
+    path = log_path(username, directory)
+    size = path.stat().st_size if path.exists() else 0
+    try:
+        index = json.loads(index_path(username, directory).read_text(encoding="utf-8"))
+        if isinstance(index, dict) and index.get("size") == size:
+            return index
+    except (OSError, json.JSONDecodeError):
+        pass
+    return _rebuild_index(username, directory)
+
+
+def seed_from_json(username: str, json_file: Path, directory: Path = HISTORY_DIR) -> int:
+    """Start ``username``'s log from a legacy ``<username>.json`` snapshot."""
+    try:
+        with json_file.open("r", encoding="utf-8") as handle:
+            history = json.load(handle).get("history", [])
+    except (json.JSONDecodeError, OSError, AttributeError) as exc:
+        print(f"WARNING: Could not seed history log from {json_file}: {exc}")
+        return 0
+    entries = [
+        entry
+        for entry in history
+        if isinstance(entry, dict) and isinstance(entry.get("date"), str) and entry.get("followers") is not None
+    ]
+    _rewrite(username, directory, entries)
+    return len(entries)
+
+
+def _rewrite(username: str, directory: Path, entries: list[dict[str, Any]]) -> None:
+    entries = sorted(entries, key=lambda entry: entry["date"])
+    lines = [encode_entry(entry["date"], entry["followers"], entry.get("following")) for entry in entries]
+    _write_atomic(log_path(username, directory), b"".join(lines))
+    size = sum(len(line) for line in lines)
+    last_offset = size - len(lines[-1]) if lines else 0
+    _save_index(username, directory, entries[-1]["date"] if entries else None, last_offset, size)
+
+
+def upsert_entry(
+    username: str,
+    date: str,
+    followers: int,
+    following: int | None,
+    *,
+    directory: Path = HISTORY_DIR,
+    seed_from: Path | None = None,
+) -> None:
+    """Record ``username``'s counts for ``date`` in O(1).
+
+    A same-day re-run rewrites the final line in place; any other date is
+    appended. ``seed_from`` names a legacy JSON snapshot used to start the log
+    the first time the account is written in this format.
+    """
+    path = log_path(username, directory)
+    if not path.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        if seed_from is not None and seed_from.exists():
+            seeded = seed_from_json(username, seed_from, directory)
+            print(f"Seeded {path.name} with {seeded} entries from {seed_from.name}")
+        else:
+            path.touch()
+
+    index = _load_index(username, directory)
+    line = encode_entry(date, followers, following)
+    offset = index["last_offset"] if index.get("last_date") == date else index["size"]
+    with path.open("r+b") as handle:
+        handle.seek(offset)
+        handle.write(line)
+        handle.truncate()
+    _save_index(username, directory, date, offset, offset + len(line))
+
+
+def compact(username: str, directory: Path = HISTORY_DIR) -> int:
+    """Rewrite the log with one line per date, sorted; returns the entry count."""
+    entries = read_entries(username, directory)
+    _rewrite(username, directory, entries)
+    return len(entries)
+
+
+def export_json(username: str, directory: Path = HISTORY_DIR, target_dir: Path = DATA_DIR) -> Path:
+    """Regenerate the legacy ``<username>.json`` snapshot from the log."""
+    payload = {"username": username, "history": read_entries(username, directory)}
+    target = target_dir / f"{username}.json"
+    _write_atomic(target, json.dumps(payload, indent=2, ensure_ascii=False).encode("utf-8"))
+    return target
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain append-only follower history logs.")
+    parser.add_argument("command", choices=("compact", "export"))
+    parser.add_argument("usernames", nargs="*", help="defaults to every logged account")
+    args = parser.parse_args()
+
+    for username in args.usernames or logged_usernames():
+        username = username.strip().lower()
+        if not log_path(username).exists():
+            print(f"WARNING: No history log for {username}.")
+            continue
+        if args.command == "compact":
+            print(f"Compacted {username}: {compact(username)} entries.")
+        else:
+            print(f"Exported {username} to {export_json(username)}.")
+
+
+__all__ = [
+    "HISTORY_DIR",
+    "HISTORY_FORMAT",
+    "compact",
+    "export_json",
+    "logged_usernames",
+    "parse_log",
+    "read_entries",
+    "upsert_entry",
+]
+
+
+if __name__ == "__main__":
+    main()
+
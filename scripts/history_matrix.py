@@ -0,0 +1,279 @@
+"""Memory-mapped date x account matrix of follower history.
+
+``follower_history`` is mirrored into two dense ``int32`` matrices
+(``followers`` and ``following``), one row per calendar day since the first
+recorded date and one column per account, with ``-1`` marking days without a
+snapshot. They live in raw ``.i32`` files under ``HISTORY_MATRIX_DIR`` next
+to a ``meta.json`` describing the layout, so analytics across every account
+map the files and run vectorised NumPy operations instead of issuing one
+query per account.
+
+The updater calls :func:`refresh` after each run. It only reads rows
+inserted or updated since the last refresh (by ``follower_history.updated_at``,
+which a trigger keeps current), so backfills of old days are picked up as
+well, and it re-reads every account's username to follow renames.
+Capacity is over-allocated in both dimensions; when it runs out the files
+are rewritten under a new generation and ``meta.json`` is swapped atomically,
+so readers never see a half-grown matrix.
+
+Usage::
+
+    python scripts/history_matrix.py [--rebuild] [--rank DAYS]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+HISTORY_MATRIX_DIR = Path(os.getenv("HISTORY_MATRIX_DIR", str(BASE_DIR / ".history_matrix")))
+
+MISSING = -1
+SERIES = ("followers", "following")
+META_FILE = "meta.json"
+# Headroom added whenever a dimension has to grow.
+DAY_HEADROOM = 366
+ACCOUNT_HEADROOM = 64
+
+
+def _data_file(directory: Path, name: str, generation: int) -> Path:
+    return directory / f"{name}.{generation}.i32"
+
+
+def _load_meta(directory: Path) -> dict[str, Any] | None:
+    try:
+        return json.loads((directory / META_FILE).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _save_meta(directory: Path, meta: dict[str, Any]) -> None:
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{META_FILE}.", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        json.dump(meta, handle, indent=2)
+    os.replace(tmp_path, directory / META_FILE)
+
+
+class HistoryMatrix:
+    """Read (or, for :func:`refresh`, write) access to the mapped matrices."""
+
+    def __init__(self, directory: Path, meta: dict[str, Any], mode: str = "r") -> None:
+        self.directory = directory
+        self.meta = meta
+        shape = (meta["capacity_days"], meta["capacity_accounts"])
+        self._arrays = {
+            name: np.memmap(_data_file(directory, name, meta["generation"]), dtype=np.int32, mode=mode, shape=shape)
+            for name in SERIES
+        }
+        self._columns = {username: idx for idx, (_, username) in enumerate(meta["accounts"])}
+
+    @classmethod
+    def open(cls, directory: Path = HISTORY_MATRIX_DIR) -> HistoryMatrix | None:
+        meta = _load_meta(directory)
+        return cls(directory, meta) if meta else None
+
+    @property
+    def start_date(self) -> datetime.date:
+        return datetime.date.fromisoformat(self.meta["start_date"])
+
+    @property
+    def usernames(self) -> list[str]:
+        return [username for _, username in self.meta["accounts"]]
+
+    @property
+    def dates(self) -> np.ndarray:
+        start = np.datetime64(self.meta["start_date"], "D")
+        return start + np.arange(self.meta["days"])
+
+    def matrix(self, name: str = "followers") -> np.ndarray:
+        """The ``days x accounts`` view of ``name``; ``-1`` marks missing days."""
+        return self._arrays[name][: self.meta["days"], : len(self.meta["accounts"])]
+
+    def series(self, username: str, name: str = "followers") -> np.ndarray:
+        return self.matrix(name)[:, self._columns[username]]
+
+    def filled(self, name: str = "followers") -> np.ndarray:
+        """``float64`` copy with gaps forward-filled and ``NaN`` before the first snapshot."""
+        data = self.matrix(name)
+        valid = data != MISSING
+        rows = np.where(valid, np.arange(data.shape[0])[:, None], 0)
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        result = np.take_along_axis(np.asarray(data), rows, axis=0).astype(np.float64)
+        result[result == MISSING] = np.nan
+        return result
+
+    def growth(self, days: int, name: str = "followers") -> np.ndarray:
+        """Per-account change over the last ``days`` days (``NaN`` without data)."""
+        filled = self.filled(name)
+        if filled.shape[0] == 0:
+            return np.full(filled.shape[1], np.nan)
+        return filled[-1] - filled[max(filled.shape[0] - 1 - days, 0)]
+
+    def ranking(self, days: int, name: str = "followers") -> list[tuple[str, float]]:
+        growth = self.growth(days, name)
+        order = np.argsort(np.where(np.isnan(growth), -np.inf, growth))[::-1]
+        return [(self.usernames[idx], float(growth[idx])) for idx in order if not np.isnan(growth[idx])]
+
+    def gaps(self) -> dict[str, int]:
+        """Missing days between each account's first and last snapshot."""
+        valid = self.matrix() != MISSING
+        seen = valid.any(axis=0)
+        first = np.argmax(valid, axis=0)
+        last = valid.shape[0] - 1 - np.argmax(valid[::-1], axis=0)
+        missing = (last - first + 1) - valid.sum(axis=0)
+        return {username: int(missing[idx]) for idx, username in enumerate(self.usernames) if seen[idx] and missing[idx]}
+
+    def flush(self) -> None:
+        for array in self._arrays.values():
+            array.flush()
+
+
+def _allocate(directory: Path, meta: dict[str, Any], previous: HistoryMatrix | None) -> HistoryMatrix:
+    """Create a new generation with ``meta``'s capacity, copying ``previous``."""
+    shape = (meta["capacity_days"], meta["capacity_accounts"])
+    for name in SERIES:
+        array = np.memmap(_data_file(directory, name, meta["generation"]), dtype=np.int32, mode="w+", shape=shape)
+        array[:] = MISSING
+        if previous is not None:
+            old = previous.matrix(name)
+            array[: old.shape[0], : old.shape[1]] = old
+        array.flush()
+        del array
+    return HistoryMatrix(directory, meta, mode="r+")
+
+
+def refresh(conn, directory: Path = HISTORY_MATRIX_DIR, *, rebuild: bool = False) -> tuple[int, bool]:  # noqa: ANN001
+    """Apply new ``follower_history`` rows; returns ``(rows applied, full rebuild)``."""
+    directory.mkdir(parents=True, exist_ok=True)
+    meta = None if rebuild else _load_meta(directory)
+    if meta is not None and "changed_since" not in meta:
+        # Written before follower_history tracked updates.
+        meta = None
+
+    query = """
+        SELECT h.account_id, a.username, h.date, h.followers, COALESCE(h.following, -1)
+        FROM follower_history h
+        JOIN accounts a ON a.id = h.account_id
+    """
+    params: tuple = ()
+    if meta is not None:
+        query += " WHERE h.updated_at >= %s"
+        params = (datetime.datetime.fromisoformat(meta["changed_since"]),)
+
+    with conn.cursor() as cur:
+        # A row written by a transaction that is still open is not visible
+        # yet, but its updated_at is no older than that transaction's start.
+        cur.execute(
+            """
+            SELECT LEAST(NOW(), MIN(xact_start))
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+            """
+        )
+        changed_since = cur.fetchone()[0]
+        cur.execute(query, params)
+        rows = cur.fetchall()
+        cur.execute("SELECT id, username FROM accounts")
+        usernames = dict(cur.fetchall())
+
+    if meta is not None and rows and min(row[2] for row in rows) < datetime.date.fromisoformat(meta["start_date"]):
+        # Backfilled history before the first column day: lay the matrix out again.
+        return refresh(conn, directory, rebuild=True)
+
+    full = meta is None
+    if not rows and full:
+        return 0, full
+
+    previous = None if full else HistoryMatrix(directory, meta, mode="r+")
+    if full:
+        start = min(row[2] for row in rows)
+        meta = {
+            "generation": (_load_meta(directory) or {}).get("generation", 0) + 1,
+            "start_date": start.isoformat(),
+            "days": 0,
+            "accounts": [],
+            "capacity_days": 0,
+            "capacity_accounts": 0,
+        }
+
+    # Renamed accounts keep their column under the new name.
+    meta["accounts"] = [[account_id, usernames.get(account_id, username)] for account_id, username in meta["accounts"]]
+    columns = {account_id: idx for idx, (account_id, _) in enumerate(meta["accounts"])}
+    for account_id, username, *_ in rows:
+        if account_id not in columns:
+            columns[account_id] = len(meta["accounts"])
+            meta["accounts"].append([account_id, username])
+
+    start = datetime.date.fromisoformat(meta["start_date"])
+    days = max([meta["days"]] + [(row[2] - start).days + 1 for row in rows])
+    meta["days"] = days
+
+    old_generation = previous.meta["generation"] if previous is not None else None
+    if full or days > meta["capacity_days"] or len(meta["accounts"]) > meta["capacity_accounts"]:
+        meta["capacity_days"] = max(meta["capacity_days"], days + DAY_HEADROOM)
+        meta["capacity_accounts"] = max(meta["capacity_accounts"], len(meta["accounts"]) + ACCOUNT_HEADROOM)
+        if previous is not None:
+            meta["generation"] += 1
+        matrix = _allocate(directory, meta, previous)
+    else:
+        matrix = previous
+
+    if rows:
+        day_idx = np.fromiter(((row[2] - start).days for row in rows), dtype=np.int64, count=len(rows))
+        col_idx = np.fromiter((columns[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+        matrix._arrays["followers"][day_idx, col_idx] = np.fromiter((row[3] for row in rows), dtype=np.int32, count=len(rows))
+        matrix._arrays["following"][day_idx, col_idx] = np.fromiter((row[4] for row in rows), dtype=np.int32, count=len(rows))
+    matrix.flush()
+
+    meta["changed_since"] = changed_since.isoformat()
+
+    meta["synced_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    _save_meta(directory, meta)
+
+    if old_generation is not None and old_generation != meta["generation"]:
+        for name in SERIES:
+            _data_file(directory, name, old_generation).unlink(missing_ok=True)
+    if full:
+        for path in directory.glob("*.i32"):
+            if not path.name.endswith(f".{meta['generation']}.i32"):
+                path.unlink(missing_ok=True)
+    return len(rows), full
+
+
+__all__ = ["HISTORY_MATRIX_DIR", "MISSING", "HistoryMatrix", "refresh"]
+
+
+def main() -> None:
+    from db_connection import close_pool, connection
+    from migrations import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Refresh the memory-mapped follower history matrix.")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild from scratch instead of incrementally")
+    parser.add_argument("--rank", type=int, metavar="DAYS", help="print accounts ranked by growth over DAYS")
+    args = parser.parse_args()
+
+    try:
+        with connection() as conn:
+            ensure_schema(conn)
+            applied, full = refresh(conn, rebuild=args.rebuild)
+    finally:
+        close_pool()
+    print(f"History matrix {'rebuilt' if full else 'refreshed'} with {applied} rows in {HISTORY_MATRIX_DIR}.")
+
+    if args.rank:
+        matrix = HistoryMatrix.open()
+        if matrix is not None:
+            for username, change in matrix.ranking(args.rank):
+                print(f"{username:>30} {change:+.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,197 +1,272 @@
 import datetime
+import hashlib
 import json
+import multiprocessing
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
+from typing import NamedTuple
 
 import psycopg
+from psycopg_pool import PoolTimeout
+
+from db_connection import close_pool, connection
+from db_utils import insert_rows
+from history_log import HISTORY_DIR, LOG_SUFFIX, parse_log
+from migrations import ensure_schema
+from rollups import refresh_rollups
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "public", "data")
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, "public", "data"))
 ACCOUNTS_FILE = os.path.join(DATA_DIR, "accounts.json")
+IMPORT_WORKERS = max(int(os.getenv("IMPORT_WORKERS", str(os.cpu_count() or 1))), 1)
+
+HISTORY_COLUMNS = ("username", "date", "followers", "following")
+
+
+class DataFile(NamedTuple):
+    path: str  # relative to DATA_DIR, the key of import_manifest
+    size: int
+    mtime_ns: int
+
+
+class ParsedFile(NamedTuple):
+    file: DataFile
+    sha256: str | None  # None when the file could not be read
+    usernames: list[str]
+    history: list[tuple[str, datetime.date, int, int | None]]
+    warnings: list[str]
+    failed: bool = False  # unreadable or not valid JSON; nothing was imported
 
-DB_CONFIG = {
-    "host": os.getenv("POSTGRES_HOST", "postgres"),
-    "port": int(os.getenv("POSTGRES_PORT", "5432")),
-    "user": os.getenv("POSTGRES_USER", "devuser"),
-    "password": os.getenv("POSTGRES_PASSWORD", "devpass"),
-    "dbname": os.getenv("POSTGRES_DB", "insta-followers"),
-}
-
-SCHEMA_STATEMENTS = (
-    """
-    CREATE TABLE IF NOT EXISTS accounts (
-      id SERIAL PRIMARY KEY,
-      username TEXT NOT NULL UNIQUE,
-      created_at TIMESTAMPTZ DEFAULT NOW(),
-      is_deleted BOOLEAN NOT NULL DEFAULT FALSE,
-      deleted_at TIMESTAMPTZ
-    )
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS follower_history (
-      id BIGSERIAL PRIMARY KEY,
-      account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
-      date DATE NOT NULL,
-      followers INTEGER NOT NULL,
-      following INTEGER,
-      created_at TIMESTAMPTZ DEFAULT NOW(),
-      CONSTRAINT follower_history_unique UNIQUE(account_id, date)
-    )
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS account_followers (
-      id BIGSERIAL PRIMARY KEY,
-      account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
-      follower_username TEXT NOT NULL,
-      full_name TEXT,
-      profile_pic_url TEXT,
-      is_private BOOLEAN,
-      is_verified BOOLEAN,
-      fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-      CONSTRAINT account_followers_unique UNIQUE(account_id, follower_username)
-    )
-    """,
-    """
-    CREATE INDEX IF NOT EXISTS account_followers_account_id_idx
-      ON account_followers (account_id)
-    """,
-    """
-    ALTER TABLE accounts
-    ADD COLUMN IF NOT EXISTS is_deleted BOOLEAN NOT NULL DEFAULT FALSE
-    """,
-    """
-    ALTER TABLE accounts
-    ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ
-    """,
-    """
-    CREATE INDEX IF NOT EXISTS accounts_is_deleted_idx
-    ON accounts (is_deleted, COALESCE(deleted_at, '1970-01-01'::timestamptz), username)
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS admin_devices (
-      id SERIAL PRIMARY KEY,
-      device_uuid TEXT NOT NULL UNIQUE,
-      label TEXT,
-      created_at TIMESTAMPTZ DEFAULT NOW()
-    )
-    """,
-)
 
+def parse_accounts(data: object) -> list[str]:
+    usernames: list[str] = []
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, str):
+                usernames.append(item.strip().lower())
+            elif isinstance(item, dict) and item.get("username"):
+                usernames.append(str(item["username"]).strip().lower())
+    return [username for username in usernames if username]
 
-def ensure_schema(conn: psycopg.Connection):
-    with conn.cursor() as cur:
-        for statement in SCHEMA_STATEMENTS:
-            cur.execute(statement)
-    conn.commit()
 
+def parse_history(
+    path: str, data: object, warnings: list[str]
+) -> tuple[str | None, list[tuple[str, datetime.date, int, int | None]]]:
+    if not isinstance(data, dict):
+        return None, []
+    username = str(data.get("username") or os.path.splitext(os.path.basename(path))[0]).strip().lower()
+    entries = data.get("history", [])
+    if not username or not isinstance(entries, list):
+        return None, []
 
-def load_accounts() -> set[str]:
-    usernames: set[str] = set()
-    if os.path.exists(ACCOUNTS_FILE):
+    # Later entries for the same date win, as they did with row-by-row upserts.
+    by_date: dict[datetime.date, tuple[str, datetime.date, int, int | None]] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        date_value = entry.get("date")
+        followers = entry.get("followers")
+        following = entry.get("following")
         try:
-            with open(ACCOUNTS_FILE, "r", encoding="utf-8") as file:
-                data = json.load(file)
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, str):
-                        usernames.add(item.strip().lower())
-                    elif isinstance(item, dict) and item.get("username"):
-                        usernames.add(str(item["username"]).strip().lower())
-        except (json.JSONDecodeError, OSError) as exc:
-            print(f"WARNING: Failed to parse {ACCOUNTS_FILE}: {exc}")
-    return usernames
-
-
-def load_history() -> dict[str, list[dict]]:
-    history: dict[str, list[dict]] = {}
-    for path in glob(os.path.join(DATA_DIR, "*.json")):
-        if os.path.basename(path) == "accounts.json":
+            parsed_date = datetime.date.fromisoformat(date_value)
+        except (TypeError, ValueError):
+            warnings.append(f"WARNING: Skipping invalid date '{date_value}' for {username}.")
+            continue
+        if followers is None:
+            warnings.append(
+                f"WARNING: Skipping entry without followers count for {username} on {date_value}."
+            )
             continue
         try:
-            with open(path, "r", encoding="utf-8") as file:
-                data = json.load(file)
-            username = str(data.get("username") or os.path.splitext(os.path.basename(path))[0]).strip().lower()
-            if not username:
-                continue
-            entries = data.get("history", [])
-            if not isinstance(entries, list):
-                continue
-            history[username] = entries
-        except (json.JSONDecodeError, OSError) as exc:
-            print(f"WARNING: Failed to parse {path}: {exc}")
-    return history
+            by_date[parsed_date] = (
+                username,
+                parsed_date,
+                int(followers),
+                int(following) if following is not None else None,
+            )
+        except (TypeError, ValueError):
+            warnings.append(f"WARNING: Skipping non-numeric counts for {username} on {date_value}.")
+    return username, list(by_date.values())
 
 
-def main():
-    usernames = load_accounts()
-    history_data = load_history()
+def parse_file(file: DataFile) -> ParsedFile:
+    """Hash and parse one data file; runs in a worker process."""
+    path = os.path.join(DATA_DIR, file.path)
+    warnings: list[str] = []
+    try:
+        with open(path, "rb") as handle:
+            content = handle.read()
+    except OSError as exc:
+        return ParsedFile(file, None, [], [], [f"WARNING: Failed to read {path}: {exc}"], failed=True)
+
+    sha256 = hashlib.sha256(content).hexdigest()
+    if path.endswith(LOG_SUFFIX):
+        data = {"username": os.path.basename(path)[: -len(LOG_SUFFIX)], "history": parse_log(content)}
+        username, history = parse_history(path, data, warnings)
+        return ParsedFile(file, sha256, [username] if username else [], history, warnings)
+
+    try:
+        data = json.loads(content)
+    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+        # Still recorded in the manifest, so it is not re-parsed until it changes.
+        return ParsedFile(file, sha256, [], [], [f"WARNING: Failed to parse {path}: {exc}"], failed=True)
+
+    if path == ACCOUNTS_FILE:
+        return ParsedFile(file, sha256, parse_accounts(data), [], warnings)
+
+    username, history = parse_history(path, data, warnings)
+    return ParsedFile(file, sha256, [username] if username else [], history, warnings)
 
-    usernames.update(history_data.keys())
 
-    if not usernames:
-        print("No accounts found in JSON files. Nothing to import.")
-        return
+def scan_data_files() -> list[DataFile]:
+    """Legacy snapshots first, then history logs, so log entries win on overlap."""
+    files: list[DataFile] = []
+    paths = sorted(glob(os.path.join(DATA_DIR, "*.json")))
+    paths += sorted(glob(os.path.join(str(HISTORY_DIR), f"*{LOG_SUFFIX}")))
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError as exc:
+            print(f"WARNING: Could not stat {path}: {exc}")
+            continue
+        files.append(DataFile(os.path.relpath(path, DATA_DIR), stat.st_size, stat.st_mtime_ns))
+    return files
+
+
+def parse_files(files: list[DataFile]) -> list[ParsedFile]:
+    workers = min(IMPORT_WORKERS, len(files))
+    if workers <= 1:
+        return [parse_file(file) for file in files]
+    # Spawned rather than forked workers: the parent already holds the
+    # connection pool and its background threads.
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(parse_file, files, chunksize=max(len(files) // (workers * 4), 1)))
+
+
+def load_manifest(cursor) -> dict[str, tuple[int, int, str]]:
+    cursor.execute("SELECT path, size, mtime_ns, sha256 FROM import_manifest")
+    return {path: (size, mtime_ns, sha256) for path, size, mtime_ns, sha256 in cursor.fetchall()}
+
+
+def record_manifest(cursor, parsed: list[ParsedFile]) -> None:
+    cursor.executemany(
+        """
+        INSERT INTO import_manifest (path, size, mtime_ns, sha256, imported_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON CONFLICT (path)
+        DO UPDATE SET size = EXCLUDED.size,
+                      mtime_ns = EXCLUDED.mtime_ns,
+                      sha256 = EXCLUDED.sha256,
+                      imported_at = EXCLUDED.imported_at
+        """,
+        [(item.file.path, item.file.size, item.file.mtime_ns, item.sha256) for item in parsed],
+    )
+
 
+def import_parsed(cursor, parsed: list[ParsedFile]) -> tuple[int, int]:
+    """Upsert the accounts and history of ``parsed``; returns ``(accounts, history rows)``."""
+    usernames = sorted({username for item in parsed for username in item.usernames})
+    history: dict[tuple[str, datetime.date], tuple] = {}
+    for item in parsed:
+        for row in item.history:
+            history[(row[0], row[1])] = row
+
+    if usernames:
+        cursor.execute(
+            """
+            INSERT INTO accounts (username, is_deleted, deleted_at)
+            SELECT username, FALSE, NULL
+            FROM unnest(%s::text[]) AS username
+            ON CONFLICT (username) DO UPDATE
+            SET username = EXCLUDED.username,
+                is_deleted = FALSE,
+                deleted_at = NULL
+            """,
+            (usernames,),
+        )
+
+    if history:
+        cursor.execute(
+            """
+            CREATE TEMP TABLE import_history (
+              username TEXT NOT NULL,
+              date DATE NOT NULL,
+              followers INTEGER NOT NULL,
+              following INTEGER
+            ) ON COMMIT DROP
+            """
+        )
+        insert_rows(cursor, "import_history", HISTORY_COLUMNS, history.values())
+        cursor.execute(
+            """
+            INSERT INTO follower_history (account_id, date, followers, following)
+            SELECT a.id, h.date, h.followers, h.following
+            FROM import_history h
+            JOIN accounts a ON a.username = h.username
+            ON CONFLICT (account_id, date)
+            DO UPDATE SET followers = EXCLUDED.followers,
+                          following = EXCLUDED.following
+            WHERE (follower_history.followers, follower_history.following)
+                  IS DISTINCT FROM (EXCLUDED.followers, EXCLUDED.following)
+            """
+        )
+        refresh_rollups(cursor)
+    return len(usernames), len(history)
+
+
+def main():
     try:
-        with psycopg.connect(**DB_CONFIG) as conn:
+        with connection() as conn:
+            # Migrate even when there is nothing to import; the API relies on it.
             ensure_schema(conn)
+            files = scan_data_files()
+            if not files:
+                print("No accounts found in JSON files. Nothing to import.")
+                return
             with conn.cursor() as cur:
-                account_ids: dict[str, int] = {}
-                for username in sorted(usernames):
-                    cur.execute(
-                        """
-                        INSERT INTO accounts (username, is_deleted, deleted_at)
-                        VALUES (%s, FALSE, NULL)
-                        ON CONFLICT (username) DO UPDATE
-                        SET username = EXCLUDED.username,
-                            is_deleted = FALSE,
-                            deleted_at = NULL
-                        RETURNING id
-                        """,
-                        (username,),
-                    )
-                    account_id = cur.fetchone()[0]
-                    account_ids[username] = account_id
-
-                for username, entries in history_data.items():
-                    account_id = account_ids.get(username)
-                    if account_id is None:
-                        print(f"WARNING: Skipping history for {username}; account was not created.")
-                        continue
-                    for entry in entries:
-                        date_value = entry.get("date")
-                        followers = entry.get("followers")
-                        following = entry.get("following")
-                        try:
-                            parsed_date = datetime.date.fromisoformat(date_value)
-                        except (TypeError, ValueError):
-                            print(
-                                f"WARNING: Skipping invalid date '{date_value}' for {username}."
-                            )
-                            continue
-                        if followers is None:
-                            print(
-                                f"WARNING: Skipping entry without followers count for {username} on {date_value}."
-                            )
-                            continue
-                        cur.execute(
-                            """
-                            INSERT INTO follower_history (account_id, date, followers, following)
-                            VALUES (%s, %s, %s, %s)
-                            ON CONFLICT (account_id, date)
-                            DO UPDATE SET followers = EXCLUDED.followers,
-                                          following = EXCLUDED.following
-                            """,
-                            (account_id, parsed_date, followers, following),
-                        )
+                manifest = load_manifest(cur)
+                # Size and mtime are enough to skip a file without reading it.
+                candidates = [
+                    file
+                    for file in files
+                    if manifest.get(file.path, (None, None, None))[:2] != (file.size, file.mtime_ns)
+                ]
+                if not candidates:
+                    print(f"All {len(files)} data files are unchanged since the last import.")
+                    return
+
+                parsed = parse_files(candidates)
+                for item in parsed:
+                    for warning in item.warnings:
+                        print(warning)
+                readable = [item for item in parsed if item.sha256 is not None]
+                # Touched but identical files only get their manifest entry refreshed.
+                changed = [
+                    item
+                    for item in readable
+                    if not item.failed and manifest.get(item.file.path, (None, None, None))[2] != item.sha256
+                ]
+                failed = sum(item.failed for item in parsed)
+
+                accounts, rows = import_parsed(cur, changed)
+                record_manifest(cur, readable)
             conn.commit()
-        print("Import completed successfully.")
-    except psycopg.OperationalError as exc:
+        print(
+            f"Import completed successfully: {len(changed)} of {len(files)} data files changed,"
+            f" {accounts} accounts and {rows} history entries upserted"
+            + (f", {failed} files could not be read or parsed." if failed else ".")
+        )
+    except (psycopg.OperationalError, PoolTimeout) as exc:
         print(f"ERROR: Could not connect to database: {exc}")
         sys.exit(1)
     except Exception as exc:  # noqa: BLE001
         print(f"ERROR: Failed to import data: {exc}")
         sys.exit(1)
+    finally:
+        close_pool()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import NamedTuple
+
+import instaloader
+
+from rate_limiter import AdaptiveRateController
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INSTAGRAM_USERNAME = os.getenv("INSTAGRAM_USERNAME", "cristianofagundes")
+SESSION_FILE = os.getenv(
+    "INSTAGRAM_SESSION_FILE",
+    os.path.join(BASE_DIR, "instagram.session"),
+)
+SESSION_ID = os.getenv("INSTAGRAM_SESSION_ID")
+# Comma-separated "<instagram username>=<session file>" pairs, one per worker.
+INSTAGRAM_SESSIONS = os.getenv("INSTAGRAM_SESSIONS", "")
+
+
+class SessionConfig(NamedTuple):
+    username: str
+    session_file: str | None
+    session_id: str | None = None
+
+
+def configured_sessions() -> list[SessionConfig]:
+    """Sessions available to the updater, in worker order.
+
+    ``INSTAGRAM_SESSIONS`` lists one session per worker; without it the single
+    session from ``INSTAGRAM_SESSION_ID`` / ``INSTAGRAM_SESSION_FILE`` is used.
+    """
+    sessions: list[SessionConfig] = []
+    for entry in INSTAGRAM_SESSIONS.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        username, separator, path = entry.partition("=")
+        if not separator or not username.strip() or not path.strip():
+            print(f"WARNING: Ignoring malformed INSTAGRAM_SESSIONS entry '{entry}'.")
+            continue
+        sessions.append(SessionConfig(username.strip(), path.strip()))
+
+    if not sessions:
+        sessions.append(SessionConfig(INSTAGRAM_USERNAME, SESSION_FILE, SESSION_ID))
+    return sessions
+
+
+def create_loader(session: SessionConfig | None = None) -> instaloader.Instaloader:
+    """Build an Instaloader with its own rate controller and load ``session``.
+
+    The adaptive rate controller persists its learned delays per session
+    username, so each session resumes at its own last known safe pace.
+    """
+    session = session or configured_sessions()[0]
+    loader = instaloader.Instaloader(
+        quiet=False,
+        user_agent=None,
+        dirname_pattern=None,
+        filename_pattern=None,
+        download_video_thumbnails=False,
+        download_geotags=False,
+        download_comments=False,
+        save_metadata=False,
+        compress_json=False,
+        post_metadata_txt_pattern=None,
+        max_connection_attempts=1,
+        rate_controller=lambda ctx: AdaptiveRateController(ctx, state_key=session.username),
+    )
+
+    if not load_session(loader, session):
+        print("Session credentials not provided. Using anonymous access.")
+        print("WARNING: Anonymous access has much stricter rate limits.")
+    return loader
+
+
+def rate_controller(loader: instaloader.Instaloader) -> AdaptiveRateController:
+    # Instaloader has no public accessor for the controller it instantiated.
+    return loader.context._rate_controller  # noqa: SLF001
+
+
+def load_session(loader: instaloader.Instaloader, session: SessionConfig) -> bool:
+    if session.session_id:
+        loader.context.session.cookies.set(
+            "sessionid",
+            session.session_id,
+            domain=".instagram.com",
+            path="/",
+        )
+        print("Session loaded from INSTAGRAM_SESSION_ID environment variable.")
+        return True
+
+    if not session.session_file or not os.path.exists(session.session_file):
+        return False
+
+    try:
+        loader.load_session_from_file(session.username, session.session_file)
+        print(f"Session for {session.username} loaded successfully from session file.")
+        return True
+    except FileNotFoundError:
+        return False
+    except Exception as exc:  # noqa: BLE001
+        print(f"WARNING: Failed to load session file as Instaloader session: {exc}")
+
+    # Try reading as JSON with a sessionid field
+    try:
+        with open(session.session_file, "r", encoding="utf-8") as file:
+            content = file.read().strip()
+            try:
+                data = json.loads(content)
+                session_value = data.get("sessionid")
+            except json.JSONDecodeError:
+                session_value = content if content else None
+        if session_value:
+            loader.context.session.cookies.set(
+                "sessionid",
+                session_value,
+                domain=".instagram.com",
+                path="/",
+            )
+            print("Session loaded from session file using raw sessionid.")
+            return True
+    except OSError as exc:
+        print(f"WARNING: Could not read session file: {exc}")
+
+    return False
+
+
+__all__ = ["SessionConfig", "configured_sessions", "create_loader", "load_session", "rate_controller"]
@@ -0,0 +1,540 @@
+from __future__ import annotations
+
+import psycopg
+from psycopg import errors
+
+# Serializes migrations between concurrently starting Python processes. The
+# API (lib/db.ts) only checks the version and refuses to serve an older schema.
+SCHEMA_LOCK_ID = 80215001
+
+# Append-only: never edit a released migration, add a new version instead.
+MIGRATIONS: tuple[tuple[int, str, tuple[str, ...]], ...] = (
+    (
+        1,
+        "baseline schema",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS accounts (
+              id SERIAL PRIMARY KEY,
+              username TEXT NOT NULL UNIQUE,
+              created_at TIMESTAMPTZ DEFAULT NOW(),
+              is_deleted BOOLEAN NOT NULL DEFAULT FALSE,
+              deleted_at TIMESTAMPTZ
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS follower_history (
+              id BIGSERIAL PRIMARY KEY,
+              account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+              date DATE NOT NULL,
+              followers INTEGER NOT NULL,
+              following INTEGER,
+              created_at TIMESTAMPTZ DEFAULT NOW(),
+              CONSTRAINT follower_history_unique UNIQUE(account_id, date)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS account_followers (
+              id BIGSERIAL PRIMARY KEY,
+              account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+              follower_username TEXT NOT NULL,
+              full_name TEXT,
+              profile_pic_url TEXT,
+              is_private BOOLEAN,
+              is_verified BOOLEAN,
+              fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              CONSTRAINT account_followers_unique UNIQUE(account_id, follower_username)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS account_followers_account_id_idx
+              ON account_followers (account_id)
+            """,
+            """
+            ALTER TABLE accounts
+            ADD COLUMN IF NOT EXISTS is_deleted BOOLEAN NOT NULL DEFAULT FALSE
+            """,
+            """
+            ALTER TABLE accounts
+            ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS accounts_is_deleted_idx
+            ON accounts (is_deleted, COALESCE(deleted_at, '1970-01-01'::timestamptz), username)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS admin_devices (
+              id SERIAL PRIMARY KEY,
+              device_uuid TEXT NOT NULL UNIQUE,
+              label TEXT,
+              created_at TIMESTAMPTZ DEFAULT NOW()
+            )
+            """,
+        ),
+    ),
+    (
+        2,
+        "follower events log",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS follower_events (
+              id BIGSERIAL PRIMARY KEY,
+              account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+              follower_username TEXT NOT NULL,
+              event TEXT NOT NULL CHECK (event IN ('gained', 'lost')),
+              occurred_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS follower_events_account_occurred_idx
+              ON follower_events (account_id, occurred_at)
+            """,
+        ),
+    ),
+    (
+        3,
+        "follower staging table",
+        (
+            """
+            CREATE UNLOGGED TABLE IF NOT EXISTS follower_staging (
+              account_id INTEGER NOT NULL,
+              follower_username TEXT NOT NULL,
+              full_name TEXT,
+              profile_pic_url TEXT,
+              is_private BOOLEAN,
+              is_verified BOOLEAN
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS follower_staging_account_username_idx
+              ON follower_staging (account_id, follower_username)
+            """,
+        ),
+    ),
+    (
+        4,
+        "follower pagination checkpoints",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS follower_checkpoints (
+              account_id INTEGER PRIMARY KEY REFERENCES accounts(id) ON DELETE CASCADE,
+              state JSONB NOT NULL,
+              total_index INTEGER NOT NULL DEFAULT 0,
+              saved_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """,
+        ),
+    ),
+    (
+        5,
+        "follower full-sync timestamp",
+        (
+            """
+            ALTER TABLE accounts
+            ADD COLUMN IF NOT EXISTS followers_full_sync_at TIMESTAMPTZ
+            """,
+        ),
+    ),
+    (
+        6,
+        "legacy JSON import manifest",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS import_manifest (
+              path TEXT PRIMARY KEY,
+              size BIGINT NOT NULL,
+              mtime_ns BIGINT NOT NULL,
+              sha256 TEXT NOT NULL,
+              imported_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """,
+        ),
+    ),
+    (
+        7,
+        "follower growth rollups",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS follower_rollups (
+              account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+              date DATE NOT NULL,
+              followers INTEGER NOT NULL,
+              following INTEGER,
+              delta_1d INTEGER,
+              delta_7d INTEGER,
+              delta_30d INTEGER,
+              ma_7 DOUBLE PRECISION NOT NULL,
+              ma_30 DOUBLE PRECISION NOT NULL,
+              growth_7d_pct DOUBLE PRECISION,
+              growth_30d_pct DOUBLE PRECISION,
+              computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              PRIMARY KEY (account_id, date)
+            )
+            """,
+        ),
+    ),
+    (
+        8,
+        "covering index for follower pages",
+        (
+            # Byte-order collation keeps username prefixes contiguous, so
+            # prefix filters are plain range scans on this index.
+            """
+            CREATE INDEX IF NOT EXISTS account_followers_page_idx
+              ON account_followers (account_id, follower_username COLLATE "C")
+              INCLUDE (full_name, profile_pic_url, is_private, is_verified, fetched_at)
+            """,
+            # Redundant with the leading column of account_followers_unique.
+            "DROP INDEX IF EXISTS account_followers_account_id_idx",
+        ),
+    ),
+    (
+        9,
+        "compressed daily follower snapshots",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS followers (
+              id BIGSERIAL PRIMARY KEY,
+              username TEXT NOT NULL UNIQUE,
+              first_seen_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS follower_snapshots (
+              account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+              date DATE NOT NULL,
+              is_keyframe BOOLEAN NOT NULL,
+              follower_count INTEGER NOT NULL,
+              added_count INTEGER NOT NULL,
+              removed_count INTEGER NOT NULL,
+              payload BYTEA NOT NULL,
+              created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              PRIMARY KEY (account_id, date)
+            )
+            """,
+        ),
+    ),
+    (
+        10,
+        "follower churn and retention cohorts",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS follower_churn_daily (
+              account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+              date DATE NOT NULL,
+              followers INTEGER NOT NULL,
+              gained INTEGER NOT NULL,
+              lost INTEGER NOT NULL,
+              PRIMARY KEY (account_id, date)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS follower_retention (
+              account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+              cohort_week DATE NOT NULL,
+              week_offset INTEGER NOT NULL,
+              cohort_size INTEGER NOT NULL,
+              retained INTEGER NOT NULL,
+              PRIMARY KEY (account_id, cohort_week, week_offset)
+            )
+            """,
+        ),
+    ),
+    (
+        11,
+        "normalized follower dimension and edge table",
+        (
+            # A username can be released when another Instagram user takes it
+            # over, so it is no longer mandatory; UNIQUE still allows NULLs.
+            "ALTER TABLE followers ALTER COLUMN username DROP NOT NULL",
+            """
+            ALTER TABLE followers
+              ADD COLUMN IF NOT EXISTS ig_user_id BIGINT UNIQUE,
+              ADD COLUMN IF NOT EXISTS full_name TEXT,
+              ADD COLUMN IF NOT EXISTS profile_pic_url TEXT,
+              ADD COLUMN IF NOT EXISTS is_private BOOLEAN,
+              ADD COLUMN IF NOT EXISTS is_verified BOOLEAN,
+              ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS followers_username_c_idx
+              ON followers (username COLLATE "C")
+            """,
+            """
+            INSERT INTO followers (username, full_name, profile_pic_url, is_private, is_verified, updated_at)
+            SELECT DISTINCT ON (follower_username)
+                   follower_username, full_name, profile_pic_url, is_private, is_verified, fetched_at
+            FROM account_followers
+            ORDER BY follower_username, fetched_at DESC
+            ON CONFLICT (username) DO UPDATE
+            SET full_name = EXCLUDED.full_name,
+                profile_pic_url = EXCLUDED.profile_pic_url,
+                is_private = EXCLUDED.is_private,
+                is_verified = EXCLUDED.is_verified,
+                updated_at = EXCLUDED.updated_at
+            """,
+            """
+            INSERT INTO followers (username)
+            SELECT DISTINCT follower_username FROM follower_events
+            ON CONFLICT (username) DO NOTHING
+            """,
+            "ALTER TABLE accounts ADD COLUMN IF NOT EXISTS followers_synced_at TIMESTAMPTZ",
+            """
+            UPDATE accounts a
+            SET followers_synced_at = latest.fetched_at
+            FROM (
+              SELECT account_id, MAX(fetched_at) AS fetched_at
+              FROM account_followers
+              GROUP BY account_id
+            ) latest
+            WHERE latest.account_id = a.id
+            """,
+            """
+            CREATE TABLE account_follower_edges (
+              account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+              follower_id BIGINT NOT NULL REFERENCES followers(id),
+              PRIMARY KEY (account_id, follower_id)
+            )
+            """,
+            """
+            INSERT INTO account_follower_edges (account_id, follower_id)
+            SELECT af.account_id, f.id
+            FROM account_followers af
+            JOIN followers f ON f.username = af.follower_username
+            """,
+            "DROP TABLE account_followers",
+            "ALTER TABLE account_follower_edges RENAME TO account_followers",
+            "ALTER TABLE account_followers RENAME CONSTRAINT account_follower_edges_pkey TO account_followers_pkey",
+            # Overlap queries ("which tracked accounts does this person follow").
+            """
+            CREATE INDEX IF NOT EXISTS account_followers_follower_idx
+              ON account_followers (follower_id)
+            """,
+            "ALTER TABLE follower_events ADD COLUMN IF NOT EXISTS follower_id BIGINT REFERENCES followers(id)",
+            """
+            UPDATE follower_events e
+            SET follower_id = f.id
+            FROM followers f
+            WHERE f.username = e.follower_username
+            """,
+            "ALTER TABLE follower_events ALTER COLUMN follower_id SET NOT NULL",
+            "ALTER TABLE follower_events DROP COLUMN follower_username",
+            "ALTER TABLE follower_staging ADD COLUMN IF NOT EXISTS ig_user_id BIGINT",
+        ),
+    ),
+    (
+        12,
+        "refresh job queue",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS refresh_jobs (
+              id BIGSERIAL PRIMARY KEY,
+              account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+              mode TEXT NOT NULL DEFAULT 'followers' CHECK (mode IN ('followers', 'counts')),
+              reason TEXT NOT NULL,
+              priority DOUBLE PRECISION NOT NULL DEFAULT 0,
+              status TEXT NOT NULL DEFAULT 'queued'
+                CHECK (status IN ('queued', 'running', 'done', 'failed')),
+              requests INTEGER NOT NULL DEFAULT 1,
+              attempts INTEGER NOT NULL DEFAULT 0,
+              run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              enqueued_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              started_at TIMESTAMPTZ,
+              finished_at TIMESTAMPTZ,
+              claimed_by TEXT,
+              error TEXT
+            )
+            """,
+            # At most one queued job per account; enqueueing again coalesces into it.
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS refresh_jobs_queued_account_idx
+              ON refresh_jobs (account_id) WHERE status = 'queued'
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS refresh_jobs_claim_idx
+              ON refresh_jobs (priority DESC, enqueued_at) WHERE status = 'queued'
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS refresh_jobs_running_idx
+              ON refresh_jobs (account_id) WHERE status = 'running'
+            """,
+        ),
+    ),
+    (
+        13,
+        "7- and 30-day moving averages over 7 and 30 days",
+        (
+            # Version 7 averaged 8 and 31 days; the refresh only rewrites
+            # changed rows, so recompute the stored averages once here.
+            """
+            UPDATE follower_rollups r
+            SET ma_7 = m.ma_7, ma_30 = m.ma_30
+            FROM (
+              SELECT
+                account_id,
+                date,
+                AVG(followers) OVER (
+                  PARTITION BY account_id ORDER BY date
+                  RANGE BETWEEN INTERVAL '6 days' PRECEDING AND CURRENT ROW
+                ) AS ma_7,
+                AVG(followers) OVER (
+                  PARTITION BY account_id ORDER BY date
+                  RANGE BETWEEN INTERVAL '29 days' PRECEDING AND CURRENT ROW
+                ) AS ma_30
+              FROM follower_history
+            ) m
+            WHERE r.account_id = m.account_id AND r.date = m.date
+            """,
+        ),
+    ),
+    (
+        14,
+        "per-account follower page index",
+        (
+            # Version 11 dropped account_followers_page_idx along with the
+            # username column. Keep a copy of followers.username on every edge
+            # so a page is again an index-only range scan of one account.
+            "ALTER TABLE account_followers ADD COLUMN IF NOT EXISTS username TEXT",
+            """
+            UPDATE account_followers af
+            SET username = f.username
+            FROM followers f
+            WHERE f.id = af.follower_id
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS account_followers_page_idx
+              ON account_followers (account_id, username COLLATE "C")
+              INCLUDE (follower_id)
+            """,
+            # Renames and released usernames reach the edges of every account
+            # that shares the follower, not only the one being synced.
+            """
+            CREATE OR REPLACE FUNCTION account_followers_rename() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+              UPDATE account_followers SET username = NEW.username WHERE follower_id = NEW.id;
+              RETURN NULL;
+            END
+            $$
+            """,
+            """
+            CREATE TRIGGER followers_rename
+              AFTER UPDATE OF username ON followers
+              FOR EACH ROW
+              WHEN (OLD.username IS DISTINCT FROM NEW.username)
+              EXECUTE FUNCTION account_followers_rename()
+            """,
+        ),
+    ),
+    (
+        15,
+        "follower history change tracking",
+        (
+            # Rows that predate this version all get the migration time, so
+            # the next incremental reader simply re-reads them once.
+            """
+            ALTER TABLE follower_history
+              ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS follower_history_updated_at_idx
+              ON follower_history (updated_at)
+            """,
+            # Set here rather than in every upsert, so backfills and manual
+            # corrections are tracked as well.
+            """
+            CREATE OR REPLACE FUNCTION follower_history_touch() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+              NEW.updated_at := NOW();
+              RETURN NEW;
+            END
+            $$
+            """,
+            """
+            CREATE TRIGGER follower_history_touch
+              BEFORE UPDATE ON follower_history
+              FOR EACH ROW
+              EXECUTE FUNCTION follower_history_touch()
+            """,
+        ),
+    ),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn: psycopg.Connection) -> int:
+    """Return the applied schema version, or 0 for an unmanaged database."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            version = cur.fetchone()[0]
+    except errors.UndefinedTable:
+        conn.rollback()
+        return 0
+    conn.commit()
+    return version
+
+
+def ensure_schema(conn: psycopg.Connection) -> None:
+    """Bring the database up to :data:`LATEST_VERSION`.
+
+    When the schema is already current this costs a single version query and
+    takes no locks. Otherwise pending migrations run in one transaction under
+    a Postgres advisory lock, so concurrent starters (entrypoint, cron, daemons)
+    wait for each other instead of racing on the same DDL.
+    """
+    if schema_version(conn) >= LATEST_VERSION:
+        return
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+              version INTEGER PRIMARY KEY,
+              description TEXT NOT NULL,
+              applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        current = cur.fetchone()[0]
+        for version, description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            print(f"Applying schema migration {version}: {description}")
+            for statement in statements:
+                cur.execute(statement)
+            cur.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (version, description),
+            )
+    conn.commit()
+
+
+__all__ = ["LATEST_VERSION", "MIGRATIONS", "SCHEMA_LOCK_ID", "ensure_schema", "schema_version"]
+
+
+def main() -> None:
+    """Apply pending migrations; exits non-zero when the database is unreachable."""
+    import sys
+
+    from psycopg_pool import PoolTimeout
+
+    from db_connection import close_pool, connection
+
+    try:
+        with connection() as conn:
+            ensure_schema(conn)
+            print(f"Database schema is at version {schema_version(conn)}.")
+    except (psycopg.Error, PoolTimeout) as exc:
+        print(f"ERROR: Could not migrate the database schema: {exc}")
+        sys.exit(1)
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Fit an updater run into the time left before ``RUN_DEADLINE``.
+
+The scheduler (``scripts/scheduler.py``) orders accounts by priority and
+estimates their Instagram request cost. The planner turns that into time.
+A refresh costs its estimated requests times the account's seconds per
+request, taken from recent runs in ``RUN_METRICS_DIR/runs.jsonl``, plus the
+cooldown before the next account. Each account then gets one of three modes:
+
+* ``followers``: counts plus the follower list (incremental or full, as the
+  follower store decides)
+* ``counts``: only the profile counts for ``follower_history``
+* deferred: not refreshed in this run
+
+Every account first gets a count-only slot in priority order while time
+remains. Accounts are then upgraded to ``followers`` in the same order when
+the extra time fits, so one huge list cannot crowd out the daily counts of
+everyone else. The plan is rebuilt whenever a worker asks for its next
+account. Rebuilds use the time actually left and a correction factor learned
+from how far this run's accounts strayed from their estimates. A slow night
+therefore downgrades later accounts, and a fast one lets deferred accounts
+back in.
+
+Without a deadline every selected account is refreshed with followers, as
+before.
+
+Usage::
+
+    python scripts/planner.py [--deadline 07:30] [--workers 1]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import threading
+import time
+from collections import defaultdict
+
+from run_metrics import RUN_METRICS_DIR, RUN_METRICS_LOG
+
+RUN_DEADLINE = os.getenv("RUN_DEADLINE", "").strip()
+
+FOLLOWERS = "followers"
+COUNTS = "counts"
+
+# Used until runs.jsonl has observations: the adaptive controller's base
+# delay plus average jitter and latency, and the mean of the 90-180 s cooldown.
+DEFAULT_SECONDS_PER_REQUEST = 12.0
+DEFAULT_COOLDOWN_SECONDS = 135.0
+# Requests of a count-only refresh (the profile lookup), as in estimate_requests.
+PROFILE_REQUESTS = 1
+# Recent observations per account kept from the metrics log.
+HISTORY_SAMPLES = 5
+# Weight of the latest actual/estimated ratio in the correction factor.
+CORRECTION_ALPHA = 0.3
+CORRECTION_BOUNDS = (0.25, 4.0)
+
+
+def parse_deadline(value: str, now: datetime.datetime | None = None) -> datetime.datetime | None:
+    """``HH:MM`` (UTC, the next such time) or an ISO-8601 timestamp; ``None`` when empty or invalid."""
+    if not value:
+        return None
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    try:
+        clock = datetime.time.fromisoformat(value)
+    except ValueError:
+        clock = None
+    if clock is not None and len(value) <= 8:
+        deadline = datetime.datetime.combine(now.date(), clock, datetime.timezone.utc)
+        return deadline if deadline > now else deadline + datetime.timedelta(days=1)
+    try:
+        deadline = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        print(f"WARNING: Ignoring invalid RUN_DEADLINE value '{value}'.")
+        return None
+    return deadline if deadline.tzinfo else deadline.replace(tzinfo=datetime.timezone.utc)
+
+
+class CostModel:
+    """Seconds per request and per cooldown, learned from the run metrics log."""
+
+    def __init__(
+        self,
+        per_account: dict[str, float] | None = None,
+        seconds_per_request: float = DEFAULT_SECONDS_PER_REQUEST,
+        cooldown: float = DEFAULT_COOLDOWN_SECONDS,
+    ) -> None:
+        self.per_account = per_account or {}
+        self.seconds_per_request = seconds_per_request
+        self.cooldown = cooldown
+
+    @classmethod
+    def load(cls, path: str = os.path.join(RUN_METRICS_DIR, RUN_METRICS_LOG)) -> "CostModel":
+        samples: dict[str, list[float]] = defaultdict(list)
+        cooldowns: list[float] = []
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if not isinstance(record, dict) or record.get("type") != "account":
+                        continue
+                    phases = record.get("phases") or {}
+                    if phases.get("cooldown"):
+                        cooldowns.append(float(phases["cooldown"]))
+                    requests = sum((record.get("requests") or {}).values())
+                    if record.get("outcome") != "ok" or requests <= 0:
+                        continue
+                    busy = float(record["seconds"]) - float(phases.get("cooldown", 0)) - float(phases.get("backoff", 0))
+                    samples[record["username"]].append(max(busy, 0.0) / requests)
+        except FileNotFoundError:
+            return cls()
+        except (OSError, KeyError, TypeError, ValueError) as exc:
+            print(f"WARNING: Ignoring unreadable run metrics {path}: {exc}")
+            return cls()
+
+        per_account = {
+            username: statistics.median(values[-HISTORY_SAMPLES:]) for username, values in samples.items()
+        }
+        return cls(
+            per_account,
+            statistics.median(per_account.values()) if per_account else DEFAULT_SECONDS_PER_REQUEST,
+            statistics.median(cooldowns[-50:]) if cooldowns else DEFAULT_COOLDOWN_SECONDS,
+        )
+
+    def seconds(self, account: dict[str, object], mode: str) -> float:
+        """Expected time of one refresh of ``account`` in ``mode``, without the cooldown."""
+        requests = account["estimated_requests"] if mode == FOLLOWERS else PROFILE_REQUESTS
+        return requests * self.per_account.get(str(account["username"]), self.seconds_per_request)
+
+
+class RunPlanner:
+    """Hand out accounts with their refresh mode, re-planning against the deadline.
+
+    ``accounts`` must already be in priority order (as returned by
+    ``plan_run``). Safe to share between worker threads.
+    """
+
+    def __init__(
+        self,
+        accounts: list[dict[str, object]],
+        *,
+        deadline: datetime.datetime | None = None,
+        workers: int = 1,
+        costs: CostModel | None = None,
+    ) -> None:
+        self.pending = list(accounts)
+        self.deadline = deadline
+        self.workers = max(workers, 1)
+        self.costs = costs or CostModel()
+        self.correction = 1.0
+        # username -> (start, estimated seconds) of accounts being refreshed
+        self.in_flight: dict[str, tuple[float, float]] = {}
+        self.done: list[tuple[dict[str, object], str]] = []
+        self._lock = threading.Lock()
+        self._last_modes: dict[str, str] = {}
+
+    def estimate(self, account: dict[str, object], mode: str) -> float:
+        return self.costs.seconds(account, mode) * self.correction
+
+    def capacity(self, now: float | None = None) -> float:
+        """Worker-seconds left before the deadline, minus what in-flight accounts still need."""
+        if self.deadline is None:
+            return float("inf")
+        now = time.time() if now is None else now
+        left = self.workers * (self.deadline.timestamp() - now)
+        for started, estimate in self.in_flight.values():
+            left -= max(estimate - (now - started), 0.0)
+        return max(left, 0.0)
+
+    def plan(self, now: float | None = None) -> tuple[list[tuple[dict[str, object], str]], list[dict[str, object]]]:
+        """``([(account, mode), ...], deferred)`` for the accounts not started yet."""
+        capacity = self.capacity(now)
+        if capacity == float("inf"):
+            return [(account, FOLLOWERS) for account in self.pending], []
+
+        cooldown = self.costs.cooldown
+        planned: list[list] = []
+        deferred: list[dict[str, object]] = []
+        used = 0.0
+        for account in self.pending:
+            cost = self.estimate(account, COUNTS) + cooldown
+            if used + cost <= capacity:
+                planned.append([account, COUNTS])
+                used += cost
+            else:
+                deferred.append(account)
+        for entry in planned:
+            extra = self.estimate(entry[0], FOLLOWERS) - self.estimate(entry[0], COUNTS)
+            if used + extra <= capacity:
+                entry[1] = FOLLOWERS
+                used += extra
+        return [(account, mode) for account, mode in planned], deferred
+
+    def next(self) -> tuple[dict[str, object], str] | None:
+        """The most urgent account that still fits, with its mode; ``None`` when done."""
+        with self._lock:
+            now = time.time()
+            planned, deferred = self.plan(now)
+            self._log_changes(planned, deferred)
+            if not planned:
+                return None
+            account, mode = planned[0]
+            self.pending.remove(account)
+            self.in_flight[str(account["username"])] = (now, self.estimate(account, mode))
+            return account, mode
+
+    def finish(self, account: dict[str, object], mode: str) -> None:
+        """Record the actual time of ``account`` and fold it into the correction factor."""
+        with self._lock:
+            started, estimate = self.in_flight.pop(str(account["username"]), (time.time(), 0.0))
+            self.done.append((account, mode))
+            if estimate <= 0:
+                return
+            ratio = (time.time() - started) / (estimate / self.correction)
+            low, high = CORRECTION_BOUNDS
+            self.correction = min(high, max(low, (1 - CORRECTION_ALPHA) * self.correction + CORRECTION_ALPHA * ratio))
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return bool(self.plan()[0])
+
+    def deferred(self) -> list[dict[str, object]]:
+        """Accounts left over at the end of the run."""
+        with self._lock:
+            return list(self.pending)
+
+    def describe(self, now: float | None = None) -> str:
+        planned, deferred = self.plan(now)
+        followers = sum(1 for _, mode in planned if mode == FOLLOWERS)
+        estimate = sum(self.estimate(account, mode) + self.costs.cooldown for account, mode in planned)
+        text = (
+            f"{followers} with followers, {len(planned) - followers} count-only,"
+            f" {len(deferred)} deferred (~{estimate / 3600 / self.workers:.1f} h estimated"
+        )
+        if self.deadline is not None:
+            left = (self.deadline.timestamp() - (time.time() if now is None else now)) / 3600
+            text += f", {left:.1f} h to {self.deadline.isoformat(timespec='minutes')}"
+        return text + f", correction x{self.correction:.2f})"
+
+    def _log_changes(self, planned: list[tuple[dict[str, object], str]], deferred: list[dict[str, object]]) -> None:
+        modes = {str(account["username"]): mode for account, mode in planned}
+        modes.update((str(account["username"]), "deferred") for account in deferred)
+        changes = [
+            f"{username} {self._last_modes[username]} -> {mode}"
+            for username, mode in modes.items()
+            if username in self._last_modes and self._last_modes[username] != mode
+        ]
+        if changes:
+            print(f"Re-planned for RUN_DEADLINE (correction x{self.correction:.2f}): " + ", ".join(changes))
+        self._last_modes = modes
+
+
+__all__ = [
+    "COUNTS",
+    "FOLLOWERS",
+    "RUN_DEADLINE",
+    "CostModel",
+    "RunPlanner",
+    "parse_deadline",
+]
+
+
+def main() -> None:
+    from db_connection import close_pool, connection
+    from migrations import ensure_schema
+    from scheduler import fetch_candidates, plan_run
+
+    parser = argparse.ArgumentParser(description="Preview how the next run fits its deadline.")
+    parser.add_argument("--deadline", default=RUN_DEADLINE, help="HH:MM UTC or ISO-8601 (default: RUN_DEADLINE)")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        with connection() as conn:
+            ensure_schema(conn)
+            accounts = fetch_candidates(conn)
+    finally:
+        close_pool()
+
+    selected, _ = plan_run(accounts)
+    planner = RunPlanner(
+        selected,
+        deadline=parse_deadline(args.deadline),
+        workers=args.workers,
+        costs=CostModel.load(),
+    )
+    planned, deferred = planner.plan()
+    for account, mode in planned:
+        print(f"{account['username']:<32} {mode:<10} ~{planner.estimate(account, mode) / 60:8.1f} min")
+    for account in deferred:
+        print(f"{account['username']:<32} {'deferred':<10}")
+    print(planner.describe())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 from __future__ import annotations
 
+import json
+import os
 import random
+import re
+import threading
 import time
 from typing import Iterable
 
 from instaloader.instaloadercontext import InstaloaderContext, RateController
 
+from request_budget import shared_budget
+from run_metrics import run_metrics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RATE_STATE_DIR = os.getenv("RATE_STATE_DIR", os.path.join(BASE_DIR, ".rate_state"))
+
 
 class GentleRateController(RateController):
     def __init__(
@@ -22,27 +32,189 @@ class GentleRateController(RateController):
         self.jitter = jitter
         self.cooldown_codes = set(cooldown_codes)
         self.cooldown_factor = cooldown_factor
+        # The query type of the latest request, blamed for errors raised by it.
+        self.last_query_type: str | None = None
 
     def _sleep(self, seconds: float, reason: str) -> None:
         extra = random.uniform(0, self.jitter)
         total = seconds + extra
-        self._ctx.log(f"{reason}; sleeping for {total:.2f} seconds")
-        time.sleep(total)
+        self._context.log(f"{reason}; sleeping for {total:.2f} seconds")
+        with run_metrics().phase("throttle"):
+            time.sleep(total)
+
+    def _throttle(self, seconds: float, reason: str) -> None:
+        self._sleep(seconds, reason)
+        # The per-process delay paces this loader; the shared budget caps the
+        # combined rate of every updater process on the host.
+        with run_metrics().phase("throttle"):
+            waited = shared_budget().acquire()
+        if waited > 0:
+            self._context.log(f"Waited {waited:.2f} seconds for the shared request budget")
+
+    def _count_request(self, query_type: str) -> None:
+        self.last_query_type = query_type
+        run_metrics().record_request(query_type)
 
     def wait_before_query(self, query_type: str) -> None:  # noqa: D401
-        self._sleep(self.base_delay, f"Throttling before {query_type}")
+        self._count_request(query_type)
+        self._throttle(self.base_delay, f"Throttling before {query_type}")
 
     def sleep(self, seconds: float) -> None:  # noqa: D401
         self._sleep(seconds, "Backing off per Instaloader request")
 
     def handle_status_code(self, status_code: int, query_type: str) -> None:
         if status_code in self.cooldown_codes:
+            run_metrics().record_failure(query_type, status_code)
             self._sleep(self.base_delay * self.cooldown_factor, f"HTTP {status_code} on {query_type}")
         else:
             super().handle_status_code(status_code, query_type)
 
-    def handle_429(self, response, query_type: str) -> None:  # noqa: ANN001
+    def handle_429(self, query_type: str) -> None:
+        run_metrics().record_failure(query_type, 429)
         self._sleep(self.base_delay * self.cooldown_factor * 1.5, f"HTTP 429 on {query_type}")
 
 
-__all__ = ["GentleRateController"]
+class AdaptiveRateController(GentleRateController):
+    """AIMD pacing per ``query_type``, persisted between runs.
+
+    Every request that is not followed by a failure shrinks that query type's
+    delay by ``decrease_step`` seconds (down to ``min_delay``); a 401/403/429
+    multiplies it by ``increase_factor`` (up to ``max_delay``). The learned
+    delays are stored under ``RATE_STATE_DIR`` keyed by ``state_key`` (one file
+    per Instagram session), so the next run starts at the last safe pace.
+    """
+
+    SAVE_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        ctx: InstaloaderContext,
+        *,
+        state_key: str = "default",
+        state_dir: str | None = RATE_STATE_DIR,
+        min_delay: float = 2.0,
+        max_delay: float = 300.0,
+        decrease_step: float = 0.5,
+        increase_factor: float = 2.0,
+        **kwargs,
+    ) -> None:
+        super().__init__(ctx, **kwargs)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.decrease_step = decrease_step
+        self.increase_factor = increase_factor
+        self.state_path = (
+            os.path.join(state_dir, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', state_key)}.json")
+            if state_dir
+            else None
+        )
+        self.delays: dict[str, float] = {}
+        self._in_flight: set[str] = set()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._load_state()
+
+    def delay_for(self, query_type: str) -> float:
+        return self.delays.get(query_type, self.base_delay)
+
+    def wait_before_query(self, query_type: str) -> None:  # noqa: D401
+        self._count_request(query_type)
+        with self._lock:
+            # Reaching the next query of this type means the previous one did not fail.
+            if query_type in self._in_flight:
+                self._adjust(query_type, success=True)
+            self._in_flight.add(query_type)
+            delay = self.delay_for(query_type)
+        self._throttle(delay, f"Throttling before {query_type} (adaptive delay {delay:.2f}s)")
+        self._maybe_save()
+
+    def handle_status_code(self, status_code: int, query_type: str) -> None:
+        if status_code in self.cooldown_codes:
+            run_metrics().record_failure(query_type, status_code)
+            self.record_failure(query_type)
+            self._sleep(self.delay_for(query_type) * self.cooldown_factor, f"HTTP {status_code} on {query_type}")
+        else:
+            super().handle_status_code(status_code, query_type)
+
+    def handle_429(self, query_type: str) -> None:
+        run_metrics().record_failure(query_type, 429)
+        self.record_failure(query_type)
+        self._sleep(self.delay_for(query_type) * self.cooldown_factor, f"HTTP 429 on {query_type}")
+
+    def record_failure(self, query_type: str | None = None) -> None:
+        """Back off ``query_type``, or every in-flight query type when unknown."""
+        with self._lock:
+            targets = [query_type] if query_type else sorted(self._in_flight)
+            for target in targets:
+                self._adjust(target, success=False)
+                self._in_flight.discard(target)
+        self.save_state()
+
+    def _adjust(self, query_type: str, *, success: bool) -> None:
+        current = self.delay_for(query_type)
+        if success:
+            updated = max(self.min_delay, current - self.decrease_step)
+        else:
+            updated = min(self.max_delay, max(current, self.min_delay) * self.increase_factor)
+            self._context.log(f"Raising delay for {query_type} from {current:.2f}s to {updated:.2f}s")
+        if updated != current:
+            self.delays[query_type] = updated
+            self._dirty = True
+
+    def _load_state(self) -> None:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+            self.delays = {
+                str(key): min(self.max_delay, max(self.min_delay, float(value)))
+                for key, value in data.get("delays", {}).items()
+            }
+        except (OSError, ValueError, AttributeError) as exc:
+            print(f"WARNING: Ignoring unreadable rate state {self.state_path}: {exc}")
+
+    def _maybe_save(self) -> None:
+        if self._dirty and time.monotonic() - self._saved_at >= self.SAVE_INTERVAL:
+            self.save_state()
+
+    def save_state(self) -> None:
+        if not self.state_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {"delays": dict(self.delays), "updated_at": time.time()}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(payload, handle, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.state_path)
+        except OSError as exc:
+            print(f"WARNING: Could not persist rate state to {self.state_path}: {exc}")
+
+
+STATUS_CODE_PATTERN = re.compile(r"\b(401|403|429)\b")
+
+
+def report_failure(controller: RateController, exc: BaseException) -> None:
+    """Feed an Instaloader error into ``controller`` when it signals throttling.
+
+    Instaloader only calls :meth:`RateController.handle_429` for retried 429s;
+    401/403 responses and final attempts surface as exceptions instead. The
+    failure is counted in the run metrics against the controller's latest
+    query type.
+    """
+    match = STATUS_CODE_PATTERN.search(str(exc))
+    if match is None:
+        return
+    run_metrics().record_failure(getattr(controller, "last_query_type", None) or "unknown", int(match.group(1)))
+    if isinstance(controller, AdaptiveRateController):
+        controller.record_failure()
+
+
+__all__ = ["AdaptiveRateController", "GentleRateController", "report_failure"]
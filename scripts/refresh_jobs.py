@@ -0,0 +1,251 @@
+"""Postgres-backed queue of account refresh jobs.
+
+``refresh_jobs`` holds one row per requested refresh. Producers are the
+nightly sweep (``update_followers_db.py --enqueue``), ``/api/accounts/add``
+for new and reactivated accounts, and the command line below. Enqueueing an
+account that already has a queued job coalesces into that job. The job keeps
+the higher priority, the earlier ``run_after``, and ``followers`` over
+``counts``, and its ``requests`` counter goes up by one.
+
+Every enqueue sends ``NOTIFY refresh_jobs``, so an idle
+``updater_daemon.py`` wakes up at once. Workers claim the most urgent due
+job with ``FOR UPDATE SKIP LOCKED``, so concurrent workers never take the
+same job. An account whose previous job is still running is skipped.
+
+Usage::
+
+    python scripts/refresh_jobs.py enqueue <username> [--mode counts]
+    python scripts/refresh_jobs.py status
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from psycopg.rows import dict_row
+
+CHANNEL = "refresh_jobs"
+MODES = ("followers", "counts")
+# Finished jobs are pruned after this many days.
+JOB_RETENTION_DAYS = 30
+
+
+class Job(NamedTuple):
+    id: int
+    mode: str
+    reason: str
+    attempts: int
+    account: dict[str, object]  # the accounts row: id, username, is_deleted
+
+
+def enqueue_jobs(
+    cursor,
+    jobs: Iterable[tuple[int, str, float]],
+    *,
+    reason: str,
+    delay_seconds: float = 0.0,
+) -> int:
+    """Queue ``(account_id, mode, priority)`` jobs; returns the number inserted or coalesced."""
+    rows = [(account_id, mode, priority) for account_id, mode, priority in jobs]
+    for _, mode, _ in rows:
+        if mode not in MODES:
+            raise ValueError(f"Unknown refresh mode '{mode}'")
+    if not rows:
+        return 0
+    cursor.execute(
+        """
+        INSERT INTO refresh_jobs (account_id, mode, priority, reason, run_after)
+        SELECT account_id, mode, priority, %s, NOW() + make_interval(secs => %s)
+        FROM unnest(%s::int[], %s::text[], %s::float8[]) AS j(account_id, mode, priority)
+        ON CONFLICT (account_id) WHERE status = 'queued'
+        DO UPDATE SET priority = GREATEST(refresh_jobs.priority, EXCLUDED.priority),
+                      mode = CASE WHEN 'followers' IN (refresh_jobs.mode, EXCLUDED.mode)
+                                  THEN 'followers' ELSE 'counts' END,
+                      run_after = LEAST(refresh_jobs.run_after, EXCLUDED.run_after),
+                      requests = refresh_jobs.requests + 1
+        """,
+        (
+            reason,
+            delay_seconds,
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            # Never-refreshed accounts score infinity in the scheduler.
+            [float(row[2]) for row in rows],
+        ),
+    )
+    queued = cursor.rowcount
+    cursor.execute("SELECT pg_notify(%s, '')", (CHANNEL,))
+    return queued
+
+
+def claim_job(cursor, worker: str) -> Job | None:
+    """Mark the most urgent due job as running for ``worker`` and return it."""
+    cursor.execute(
+        """
+        UPDATE refresh_jobs j
+        SET status = 'running', started_at = NOW(), attempts = j.attempts + 1, claimed_by = %s
+        WHERE j.id = (
+          SELECT q.id
+          FROM refresh_jobs q
+          WHERE q.status = 'queued'
+            AND q.run_after <= NOW()
+            AND NOT EXISTS (
+              SELECT 1 FROM refresh_jobs r
+              WHERE r.account_id = q.account_id AND r.status = 'running'
+            )
+          ORDER BY q.priority DESC, q.enqueued_at
+          LIMIT 1
+          FOR UPDATE SKIP LOCKED
+        )
+        RETURNING j.id, j.mode, j.reason, j.attempts, j.account_id
+        """,
+        (worker,),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    job_id, mode, reason, attempts, account_id = row
+    with cursor.connection.cursor(row_factory=dict_row) as accounts:
+        accounts.execute("SELECT id, username, is_deleted FROM accounts WHERE id = %s", (account_id,))
+        account = accounts.fetchone()
+    return Job(job_id, mode, reason, attempts, account)
+
+
+def finish_job(cursor, job_id: int, *, error: str | None = None, retry_after: float | None = None) -> str:
+    """Close a claimed job; returns its new status.
+
+    A failed job is queued again after ``retry_after`` seconds when given,
+    unless another job for the account is already queued. In that case it is
+    marked failed, since the queued job covers it.
+    """
+    if error is not None and retry_after is not None:
+        cursor.execute(
+            """
+            UPDATE refresh_jobs j
+            SET status = 'queued', run_after = NOW() + make_interval(secs => %s), error = %s
+            WHERE j.id = %s
+              AND NOT EXISTS (
+                SELECT 1 FROM refresh_jobs q WHERE q.account_id = j.account_id AND q.status = 'queued'
+              )
+            """,
+            (retry_after, error, job_id),
+        )
+        if cursor.rowcount:
+            cursor.execute("SELECT pg_notify(%s, '')", (CHANNEL,))
+            return "queued"
+    status = "done" if error is None else "failed"
+    cursor.execute(
+        "UPDATE refresh_jobs SET status = %s, finished_at = NOW(), error = %s WHERE id = %s",
+        (status, error, job_id),
+    )
+    return status
+
+
+def requeue_stale(cursor, max_age_seconds: float | None = None) -> int:
+    """Release jobs left running by a worker that died; returns how many were released.
+
+    ``None`` releases every running job, which is right when the caller owns
+    the queue and has no job of its own in progress (a daemon at startup).
+    Otherwise only jobs running longer than ``max_age_seconds`` are released.
+    Jobs whose account has been queued again in the meantime are closed as
+    failed instead.
+    """
+    error = "worker stopped while the job was running"
+    params = {"error": error, "max_age": max_age_seconds}
+    cursor.execute(
+        """
+        UPDATE refresh_jobs j
+        SET status = 'failed', finished_at = NOW(), error = %(error)s
+        WHERE j.status = 'running'
+          AND (%(max_age)s::float8 IS NULL OR j.started_at < NOW() - make_interval(secs => %(max_age)s))
+          AND EXISTS (
+            SELECT 1 FROM refresh_jobs q WHERE q.account_id = j.account_id AND q.status = 'queued'
+          )
+        """,
+        params,
+    )
+    released = cursor.rowcount
+    cursor.execute(
+        """
+        UPDATE refresh_jobs
+        SET status = 'queued', error = %(error)s
+        WHERE status = 'running'
+          AND (%(max_age)s::float8 IS NULL OR started_at < NOW() - make_interval(secs => %(max_age)s))
+        """,
+        params,
+    )
+    return released + cursor.rowcount
+
+
+def prune_jobs(cursor, days: float = JOB_RETENTION_DAYS) -> int:
+    cursor.execute(
+        """
+        DELETE FROM refresh_jobs
+        WHERE status IN ('done', 'failed')
+          AND finished_at < NOW() - make_interval(days => %s)
+        """,
+        (int(days),),
+    )
+    return cursor.rowcount
+
+
+def queue_counts(cursor) -> dict[str, int]:
+    cursor.execute("SELECT status, COUNT(*) FROM refresh_jobs GROUP BY status")
+    return {status: count for status, count in cursor.fetchall()}
+
+
+__all__ = [
+    "CHANNEL",
+    "MODES",
+    "Job",
+    "claim_job",
+    "enqueue_jobs",
+    "finish_job",
+    "prune_jobs",
+    "queue_counts",
+    "requeue_stale",
+]
+
+
+def main() -> None:
+    from db_connection import close_pool, connection
+    from migrations import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Inspect or feed the refresh job queue.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="queue refreshes for accounts")
+    enqueue.add_argument("usernames", nargs="+")
+    enqueue.add_argument("--mode", choices=MODES, default="followers")
+    enqueue.add_argument("--priority", type=float, default=float("inf"), help="default: ahead of the sweep")
+    commands.add_parser("status", help="print job counts per status")
+    args = parser.parse_args()
+
+    try:
+        with connection() as conn:
+            ensure_schema(conn)
+            with conn.cursor() as cur:
+                if args.command == "enqueue":
+                    usernames = [name.strip().lower() for name in args.usernames]
+                    cur.execute("SELECT id, username FROM accounts WHERE username = ANY(%s)", (usernames,))
+                    found = {username: account_id for account_id, username in cur.fetchall()}
+                    for username in usernames:
+                        if username not in found:
+                            print(f"WARNING: Unknown account {username}; add it first.")
+                    queued = enqueue_jobs(
+                        cur,
+                        ((account_id, args.mode, args.priority) for account_id in found.values()),
+                        reason="manual",
+                    )
+                    print(f"Queued {queued} refresh jobs.")
+                else:
+                    for status, count in sorted(queue_counts(cur).items()):
+                        print(f"{status}: {count}")
+            conn.commit()
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
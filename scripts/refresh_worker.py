@@ -0,0 +1,252 @@
+"""Pre-warmed worker for on-demand single-account refreshes.
+
+``serve`` imports Instaloader and psycopg once, loads the Instagram session,
+checks the schema and opens the connection pool. It then listens on the Unix
+socket ``REFRESH_WORKER_SOCKET`` and runs :func:`update_one.refresh_account`
+for every request. A refresh therefore costs only its Instagram round trips
+and database writes. Requests are handled one at a time on the single
+loader, so its rate controller paces them like one updater process.
+
+A client sends one JSON line ``{"username": "..."}`` and reads JSON lines
+back: ``{"log": "..."}`` for every line the refresh prints, including the
+follower progress and the rate controller's warnings, then either
+``{"ok": true, "followers": ..., ...}`` or ``{"error": "..."}``. The client
+side (``refresh`` and ``update_one.py``) needs only the standard library, so
+it starts in a fraction of the time of a cold ``update_one.py`` run.
+
+The socket is created with mode 0600, so only the worker's user can submit
+refreshes. SIGTERM or SIGINT lets the refresh in progress finish, then the
+worker exits.
+
+Usage::
+
+    python scripts/refresh_worker.py serve
+    python scripts/refresh_worker.py refresh <username>
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from collections.abc import Callable
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Any, TextIO
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REFRESH_WORKER_SOCKET = os.getenv("REFRESH_WORKER_SOCKET", os.path.join(BASE_DIR, ".refresh_worker.sock"))
+# How long a client waits for the worker to accept before refreshing by itself.
+CONNECT_TIMEOUT_SECONDS = 2.0
+
+
+def request_refresh(
+    username: str,
+    path: str = REFRESH_WORKER_SOCKET,
+    *,
+    log: Callable[[str], None] = print,
+) -> dict[str, Any] | None:
+    """Have the worker refresh ``username``, relaying its log; ``None`` when no worker is listening."""
+    if not os.path.exists(path):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(CONNECT_TIMEOUT_SECONDS)
+        try:
+            client.connect(path)
+        except OSError:
+            return None
+        # A queued request waits for the refresh ahead of it, however long that takes.
+        client.settimeout(None)
+        client.sendall(json.dumps({"username": username}).encode("utf-8") + b"\n")
+        with client.makefile("r", encoding="utf-8") as replies:
+            for line in replies:
+                reply = json.loads(line)
+                if "log" in reply:
+                    log(reply["log"])
+                else:
+                    return reply
+        return {"error": "The refresh worker closed the connection before finishing."}
+    finally:
+        client.close()
+
+
+class _LineRelay(io.TextIOBase):
+    """Echo everything written to ``echo`` and send each complete line to the client."""
+
+    def __init__(self, send: Callable[[dict[str, Any]], None], echo: TextIO) -> None:
+        self.send = send
+        self.echo = echo
+        self._partial = ""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self.echo.write(text)
+        *lines, self._partial = (self._partial + text).split("\n")
+        for line in lines:
+            self.send({"log": line})
+        return len(text)
+
+    def flush(self) -> None:
+        self.echo.flush()
+        if self._partial:
+            self.send({"log": self._partial})
+            self._partial = ""
+
+
+class _RefreshHandler(socketserver.StreamRequestHandler):
+    server: "RefreshWorker"
+
+    def handle(self) -> None:
+        from update_one import RefreshError, refresh_account
+
+        self._connected = True
+        try:
+            request = json.loads(self.rfile.readline())
+            username = str(request["username"])
+        except (ValueError, KeyError, TypeError):
+            self._send({"error": 'Expected one JSON line {"username": "..."}.'})
+            return
+
+        # Requests are served one at a time, so everything printed meanwhile
+        # (follower_store, the rate controller, Instaloader) belongs to this one.
+        stdout, stderr = _LineRelay(self._send, sys.stdout), _LineRelay(self._send, sys.stderr)
+        try:
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                try:
+                    result = refresh_account(self.server.loader, username)
+                finally:
+                    stdout.flush()
+                    stderr.flush()
+        except RefreshError as exc:
+            print(f"ERROR: {exc}")
+            self._send({"error": str(exc)})
+            return
+        self._send(
+            {
+                "ok": True,
+                "username": result.username,
+                "followers": result.followers,
+                "following": result.following,
+                "stored": result.stored,
+                "sync": result.sync_result._asdict() if result.sync_result else None,
+            }
+        )
+
+    def _send(self, message: dict[str, Any]) -> None:
+        # A client that hung up does not abort its refresh; the result is still written.
+        if not self._connected:
+            return
+        try:
+            self.wfile.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+        except OSError:
+            self._connected = False
+
+
+class RefreshWorker(socketserver.UnixStreamServer):
+    """Serve refreshes one at a time with a single long-lived loader."""
+
+    def __init__(self, path: str, loader) -> None:
+        self.path = path
+        self.loader = loader
+        _remove_stale_socket(path)
+        # Create the socket as 0600 so no other user can connect, not even
+        # between bind() and a later chmod().
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, _RefreshHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_socket(path: str) -> None:
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    print(f"ERROR: A refresh worker is already listening on {path}")
+    sys.exit(1)
+
+
+def serve(path: str = REFRESH_WORKER_SOCKET) -> None:
+    import psycopg
+    from psycopg_pool import PoolTimeout
+
+    from db_connection import close_pool, connection
+    from instagram_session import create_loader, rate_controller
+    from migrations import ensure_schema
+
+    try:
+        with connection() as conn:
+            ensure_schema(conn)
+    except (psycopg.OperationalError, PoolTimeout) as exc:
+        print(f"ERROR: Could not connect to database: {exc}")
+        sys.exit(1)
+
+    loader = create_loader()
+    server = RefreshWorker(path, loader)
+
+    def stop(*_: object) -> None:
+        print("Stopping after the refresh in progress...")
+        # shutdown() blocks until serve_forever returns, so call it off the main thread.
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Refresh worker listening on {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        rate_controller(loader).save_state()
+        close_pool()
+    print("Refresh worker stopped.")
+
+
+__all__ = ["REFRESH_WORKER_SOCKET", "RefreshWorker", "request_refresh", "serve"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-warmed worker for single-account refreshes.")
+    parser.add_argument("--socket", default=REFRESH_WORKER_SOCKET, help="default: REFRESH_WORKER_SOCKET")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve", help="load the session and wait for refresh requests")
+    refresh = commands.add_parser("refresh", help="ask the running worker to refresh an account")
+    refresh.add_argument("username")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.socket)
+        return
+    reply = request_refresh(args.username.strip().lower(), args.socket)
+    if reply is None:
+        print(f"ERROR: No refresh worker is listening on {args.socket}; run update_one.py instead.")
+        sys.exit(1)
+    if "error" in reply:
+        print(f"ERROR: {reply['error']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
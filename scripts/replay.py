@@ -0,0 +1,445 @@
+"""Record and replay Instagram traffic for offline runs of the updaters.
+
+``record`` runs an updater against live Instagram and stores what it saw in
+a fixture directory:
+
+* ``profiles/<username>.json``: the profile node, in Instaloader's legacy
+  GraphQL shape.
+* ``followers/<user id>.jsonl``: the account's follower nodes, one per line,
+  in the order Instagram listed them.
+
+``replay`` runs an updater with every HTTP request answered from those
+fixtures instead of the network. The profile page, ``web_profile_info`` and
+the GraphQL profile and follower queries are served; anything else gets a
+404. Follower lists are re-paged on the fly, so the page size can differ from
+the recording. Their cursors are plain offsets: a run that resumes from a
+``follower_checkpoints`` row saved by a live run gets a 400 for that
+account, so replay against a database without checkpoints. Optional
+per-request latency and randomly injected 429s exercise the rate
+controller, and ``--time-scale`` shrinks every
+``time.sleep`` (controller delays, cooldowns, injected latency) so a long run
+can be benchmarked in minutes. ``synth`` writes fixtures for made-up
+accounts, for runs that need no recording at all.
+
+The shim sits below Instaloader at ``requests.Session.send``, so
+``get_json``, the rate controller and the updaters run unmodified. Only the
+wire is replaced. Replay runs default ``RATE_STATE_DIR`` to a temporary
+directory so they never touch the real rate state or request budget, and
+load a dummy logged-in session named ``replay`` in place of any configured
+one.
+
+Usage::
+
+    python scripts/replay.py record --dir fixtures/ig -- scripts/update_one.py <username>
+    python scripts/replay.py replay --dir fixtures/ig [--page-size 50] [--latency-ms 300]
+        [--error-rate 0.02] [--time-scale 0] -- scripts/update_followers_db.py
+    python scripts/replay.py synth --dir fixtures/ig --accounts 5 --followers 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pickle
+import random
+import re
+import runpy
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+FOLLOWERS_QUERY_HASH = "37479f2b8209594dde7facb0d904896a"
+PROFILE_PAGE = re.compile(r"^/([A-Za-z0-9._]+)/$")
+WEB_PROFILE_INFO_PATH = "/api/v1/users/web_profile_info/"
+GRAPHQL_PATH = "/graphql/query"
+
+
+class FixtureStore:
+    """Profiles and follower lists recorded from (or served as) Instagram."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._profiles: dict[str, dict[str, Any]] | None = None
+        self._followers: dict[str, list[dict[str, Any]]] = {}
+
+    def _profile_dir(self) -> Path:
+        return self.directory / "profiles"
+
+    def _followers_file(self, user_id: str) -> Path:
+        return self.directory / "followers" / f"{user_id}.jsonl"
+
+    def profiles(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            if self._profiles is None:
+                self._profiles = {}
+                for path in sorted(self._profile_dir().glob("*.json")):
+                    node = json.loads(path.read_text(encoding="utf-8"))
+                    self._profiles[node["username"].lower()] = node
+            return self._profiles
+
+    def profile(self, username: str) -> dict[str, Any] | None:
+        return self.profiles().get(username.lower())
+
+    def profile_by_id(self, user_id: str) -> dict[str, Any] | None:
+        return next((node for node in self.profiles().values() if str(node["id"]) == str(user_id)), None)
+
+    def save_profile(self, node: dict[str, Any]) -> None:
+        path = self._profile_dir() / f"{node['username'].lower()}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(node, ensure_ascii=False, indent=2), encoding="utf-8")
+        with self._lock:
+            if self._profiles is not None:
+                self._profiles[node["username"].lower()] = node
+
+    def followers(self, user_id: str) -> list[dict[str, Any]]:
+        with self._lock:
+            if user_id not in self._followers:
+                path = self._followers_file(user_id)
+                nodes = []
+                if path.exists():
+                    with path.open(encoding="utf-8") as handle:
+                        nodes = [json.loads(line) for line in handle if line.strip()]
+                self._followers[user_id] = nodes
+            return self._followers[user_id]
+
+    def append_followers(self, user_id: str, nodes: list[dict[str, Any]], *, first_page: bool) -> None:
+        path = self._followers_file(user_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, path.open("w" if first_page else "a", encoding="utf-8") as handle:
+            for node in nodes:
+                handle.write(json.dumps(node, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._followers.pop(user_id, None)
+
+
+def _profile_node(user: dict[str, Any]) -> dict[str, Any]:
+    """Legacy-shaped profile node from any of the profile responses."""
+    from instaloader import Profile
+
+    node = Profile._normalize_profile_data(user)  # noqa: SLF001 - same normalisation Instaloader applies
+    node["id"] = str(node.get("id") or node.get("pk"))
+    return node
+
+
+def _query(request: requests.PreparedRequest) -> tuple[str, str, dict[str, str]]:
+    parts = urlsplit(request.url or "")
+    params = dict(parse_qsl(parts.query))
+    if request.body and request.method == "POST":
+        body = request.body.decode() if isinstance(request.body, bytes) else str(request.body)
+        params.update(parse_qsl(body))
+    return parts.hostname or "", parts.path, params
+
+
+def _response(request: requests.PreparedRequest, status: int, body: str, content_type: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.reason = requests.status_codes._codes.get(status, ("",))[0].replace("_", " ").upper()  # noqa: SLF001
+    response.headers = CaseInsensitiveDict({"Content-Type": content_type})
+    response._content = body.encode("utf-8")  # noqa: SLF001
+    response.encoding = "utf-8"
+    response.url = request.url or ""
+    response.request = request
+    return response
+
+
+def _json_response(request: requests.PreparedRequest, payload: dict[str, Any], status: int = 200) -> requests.Response:
+    return _response(request, status, json.dumps(payload, ensure_ascii=False), "application/json; charset=utf-8")
+
+
+class Recorder:
+    """Pass requests through to Instagram and keep what the updaters need."""
+
+    def __init__(self, store: FixtureStore) -> None:
+        self.store = store
+        self.stats: Counter[str] = Counter()
+
+    def __call__(self, send, session, request, **kwargs) -> requests.Response:  # noqa: ANN001
+        response = send(session, request, **kwargs)
+        self.stats["requests"] += 1
+        if response.status_code != 200:
+            self.stats[f"http_{response.status_code}"] += 1
+            return response
+        try:
+            self._capture(request, response)
+        except (ValueError, KeyError, TypeError) as exc:
+            print(f"WARNING: Could not record response for {request.url}: {exc}")
+        return response
+
+    def _capture(self, request: requests.PreparedRequest, response: requests.Response) -> None:
+        host, path, params = _query(request)
+        if host == "www.instagram.com" and PROFILE_PAGE.match(path) and "text/html" in response.headers.get("Content-Type", ""):
+            from instaloader.instaloadercontext import _embedded_query_data  # same parser as get_page_data
+
+            user: dict[str, Any] = {}
+            for script in re.finditer(r'<script type="application/json"[^>]*>(.*?)</script>', response.text, re.DOTALL):
+                try:
+                    for data in _embedded_query_data(json.loads(script.group(1))):
+                        user.update(data.get("xig_user_by_username") or {})
+                except json.JSONDecodeError:
+                    continue
+            if user.get("pk"):
+                user.pop("polaris_ordered_timeline_connection", None)
+                self.store.save_profile(_profile_node(user))
+                self.stats["profiles"] += 1
+            return
+
+        if path == WEB_PROFILE_INFO_PATH or (path == GRAPHQL_PATH and "doc_id" in params):
+            user = (response.json().get("data") or {}).get("user")
+            if isinstance(user, dict) and user.get("username"):
+                self.store.save_profile(_profile_node(user))
+                self.stats["profiles"] += 1
+            return
+
+        if path == GRAPHQL_PATH and params.get("query_hash") == FOLLOWERS_QUERY_HASH:
+            variables = json.loads(params["variables"])
+            edges = response.json()["data"]["user"]["edge_followed_by"]["edges"]
+            self.store.append_followers(
+                str(variables["id"]),
+                [edge["node"] for edge in edges],
+                first_page=variables.get("after") is None,
+            )
+            self.stats["follower_pages"] += 1
+
+
+class Replayer:
+    """Answer Instaloader's requests from a :class:`FixtureStore`."""
+
+    def __init__(
+        self,
+        store: FixtureStore,
+        *,
+        page_size: int = 0,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        self.store = store
+        self.page_size = page_size
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats: Counter[str] = Counter()
+
+    def __call__(self, send, session, request, **kwargs) -> requests.Response:  # noqa: ANN001, ARG002
+        if self.latency:
+            time.sleep(self.latency)
+        host, path, params = _query(request)
+        is_api = path in (GRAPHQL_PATH, WEB_PROFILE_INFO_PATH)
+        with self._lock:
+            self.stats["requests"] += 1
+            inject = is_api and self.error_rate > 0 and self._random.random() < self.error_rate
+            if inject:
+                self.stats["injected_429"] += 1
+        if inject:
+            return _json_response(request, {"message": "Please wait a few minutes before you try again.", "status": "fail"}, 429)
+
+        response = self._serve(request, host, path, params)
+        if response.status_code != 200:
+            with self._lock:
+                self.stats[f"http_{response.status_code}"] += 1
+        return response
+
+    def _serve(self, request: requests.PreparedRequest, host: str, path: str, params: dict[str, str]) -> requests.Response:
+        not_found = _json_response(request, {"message": "not recorded", "status": "fail"}, 404)
+
+        page = PROFILE_PAGE.match(path)
+        if host == "www.instagram.com" and page:
+            node = self.store.profile(page.group(1))
+            if node is None:
+                return _response(request, 404, "<html></html>", "text/html; charset=utf-8")
+            embedded = {"require": [["ScheduledServerJS", {"__bbox": {"result": {"data": {"xig_user_by_username": dict(node, pk=node["id"])}}}}]]}
+            body = f'<html><body><script type="application/json">{json.dumps(embedded, ensure_ascii=False)}</script></body></html>'
+            return _response(request, 200, body, "text/html; charset=utf-8")
+
+        if path == WEB_PROFILE_INFO_PATH:
+            node = self.store.profile(params.get("username", ""))
+            return _json_response(request, {"data": {"user": node}, "status": "ok"}) if node else not_found
+
+        if path == GRAPHQL_PATH and "doc_id" in params:
+            variables = json.loads(params.get("variables") or "{}")
+            node = self.store.profile_by_id(str(variables.get("id", "")))
+            return _json_response(request, {"data": {"user": node}, "status": "ok"}) if node else not_found
+
+        if path == GRAPHQL_PATH and params.get("query_hash") == FOLLOWERS_QUERY_HASH:
+            variables = json.loads(params["variables"])
+            followers = self.store.followers(str(variables["id"]))
+            try:
+                start = int(variables.get("after") or 0)
+            except ValueError:
+                # An Instagram cursor, e.g. from a checkpoint left by a live run.
+                return _json_response(request, {"message": "unknown cursor", "status": "fail"}, 400)
+            size = self.page_size or int(variables.get("first") or 12)
+            end = min(start + size, len(followers))
+            with self._lock:
+                self.stats["follower_pages"] += 1
+            connection = {
+                "count": len(followers),
+                "page_info": {"has_next_page": end < len(followers), "end_cursor": str(end) if end < len(followers) else None},
+                "edges": [{"node": node} for node in followers[start:end]],
+            }
+            return _json_response(request, {"data": {"user": {"edge_followed_by": connection}}, "status": "ok"})
+
+        return not_found
+
+
+_installed: list[Any] = []
+
+
+def install(handler, *, time_scale: float = 1.0) -> None:  # noqa: ANN001
+    """Route every ``requests`` call through ``handler`` and scale ``time.sleep``.
+
+    Process-wide and permanent; meant for a process that exists to record or
+    replay.
+    """
+    if _installed:
+        raise RuntimeError("An Instagram record/replay handler is already installed")
+    original_send = requests.Session.send
+    original_sleep = time.sleep
+    slept = [0.0]
+
+    def send(session, request, **kwargs):  # noqa: ANN001, ANN202
+        return handler(original_send, session, request, **kwargs)
+
+    def sleep(seconds: float) -> None:
+        slept[0] += seconds
+        if time_scale > 0:
+            original_sleep(seconds * time_scale)
+
+    requests.Session.send = send
+    time.sleep = sleep
+    _installed.append((handler, slept))
+
+
+def summary() -> dict[str, Any]:
+    """Counters of the installed handler plus the requested sleep time."""
+    if not _installed:
+        return {}
+    handler, slept = _installed[0]
+    return {**handler.stats, "requested_sleep_seconds": round(slept[0], 3)}
+
+
+def synthesize(store: FixtureStore, accounts: int, followers: int, *, seed: int = 0) -> list[str]:
+    """Write fixtures for ``accounts`` made-up profiles with ``followers`` each."""
+    rng = random.Random(seed)
+    usernames = []
+    for idx in range(accounts):
+        user_id = str(10_000_000 + idx)
+        username = f"synthetic_account_{idx:03d}"
+        store.save_profile(
+            _profile_node(
+                {
+                    "id": user_id,
+                    "username": username,
+                    "full_name": f"Synthetic Account {idx}",
+                    "is_private": False,
+                    "is_verified": idx % 5 == 0,
+                    "profile_pic_url": f"https://scontent.cdninstagram.com/v/{user_id}.jpg",
+                    "edge_followed_by": {"count": followers},
+                    "edge_follow": {"count": rng.randint(50, 2000)},
+                }
+            )
+        )
+        # Followers overlap across accounts like a real audience would.
+        population = max(followers * accounts // 2, followers)
+        ids = rng.sample(range(1, population + 1), followers)
+        store.append_followers(
+            user_id,
+            [
+                {
+                    "id": str(100_000_000 + follower),
+                    "username": f"follower_{follower:08d}",
+                    "full_name": f"Follower {follower}",
+                    "profile_pic_url": f"https://scontent.cdninstagram.com/v/f{follower}.jpg?stp=dst-jpg",
+                    "is_private": follower % 3 == 0,
+                    "is_verified": follower % 997 == 0,
+                }
+                for follower in ids
+            ],
+            first_page=True,
+        )
+        usernames.append(username)
+    return usernames
+
+
+__all__ = ["FixtureStore", "Recorder", "Replayer", "install", "summary", "synthesize"]
+
+
+def _use_replay_session(scratch: Path) -> None:
+    """Point the updaters at a dummy logged-in session; follower lists require login."""
+    session_file = scratch / "replay.session"
+    with session_file.open("wb") as handle:
+        pickle.dump({"sessionid": "replay", "csrftoken": "replay"}, handle)
+    os.environ["INSTAGRAM_USERNAME"] = "replay"
+    os.environ["INSTAGRAM_SESSION_FILE"] = str(session_file)
+    os.environ.pop("INSTAGRAM_SESSION_ID", None)
+    os.environ.pop("INSTAGRAM_SESSIONS", None)
+
+
+def _run_script(argv: list[str]) -> None:
+    if not argv:
+        raise SystemExit("Missing the script to run after '--'")
+    script = os.path.abspath(argv[0])
+    sys.argv = [script, *argv[1:]]
+    sys.path.insert(0, os.path.dirname(script))
+    try:
+        runpy.run_path(script, run_name="__main__")
+    finally:
+        print(f"Replay summary: {json.dumps(summary(), sort_keys=True)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Record or replay Instagram traffic for the updaters.",
+        epilog="record and replay run the script given after '--'.",
+    )
+    parser.add_argument("command", choices=("record", "replay", "synth"))
+    parser.add_argument("--dir", type=Path, required=True, help="fixture directory")
+    parser.add_argument("--page-size", type=int, default=0, help="followers per page (default: what the client asks for)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every replayed request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of API requests answered with a 429")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier for every time.sleep (0 skips sleeping)")
+    parser.add_argument("--accounts", type=int, default=3, help="synth: number of accounts")
+    parser.add_argument("--followers", type=int, default=1000, help="synth: followers per account")
+    argv = sys.argv[1:]
+    split = argv.index("--") if "--" in argv else len(argv)
+    args = parser.parse_args(argv[:split])
+    script = argv[split + 1 :]
+    store = FixtureStore(args.dir)
+
+    if args.command == "synth":
+        for username in synthesize(store, args.accounts, args.followers, seed=args.seed or 0):
+            print(username)
+        return
+
+    if args.command == "record":
+        install(Recorder(store), time_scale=args.time_scale)
+    else:
+        scratch = Path(tempfile.mkdtemp(prefix="instagram-replay-"))
+        os.environ.setdefault("RATE_STATE_DIR", str(scratch / "rate_state"))
+        _use_replay_session(scratch)
+        install(
+            Replayer(
+                store,
+                page_size=args.page_size,
+                latency_ms=args.latency_ms,
+                error_rate=args.error_rate,
+                seed=args.seed,
+            ),
+            time_scale=args.time_scale,
+        )
+    _run_script(script)
+
+
+if __name__ == "__main__":
+    main()
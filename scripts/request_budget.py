@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Combined Instagram request ceiling shared by every updater process on this host.
+INSTAGRAM_REQUESTS_PER_MINUTE = float(os.getenv("INSTAGRAM_REQUESTS_PER_MINUTE", "6"))
+INSTAGRAM_REQUEST_BURST = max(float(os.getenv("INSTAGRAM_REQUEST_BURST", "3")), 1.0)
+REQUEST_BUDGET_FILE = os.getenv(
+    "REQUEST_BUDGET_FILE",
+    os.path.join(os.getenv("RATE_STATE_DIR", os.path.join(BASE_DIR, ".rate_state")), "request_budget"),
+)
+
+
+class RequestBudget:
+    """Token bucket shared by all processes that use the same ``path``.
+
+    The bucket level and its timestamp live in a small file guarded by an
+    exclusive ``flock``, so ``update_followers_db.py``, ``update_one.py`` and
+    ``update_followers.py`` running side by side stay under one combined
+    ``rate`` (tokens per second). A caller that finds the bucket empty takes
+    its token anyway, leaving the level negative, and sleeps until that debt
+    would have refilled; later callers queue up behind it in arrival order.
+    """
+
+    def __init__(self, path: str, rate: float, burst: float) -> None:
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 and fcntl is not None
+
+    def acquire(self) -> float:
+        """Take one request token, sleeping as needed; returns seconds waited."""
+        if not self.enabled:
+            return 0.0
+        wait = self._update(take=True)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def wait_time(self) -> float:
+        """Seconds until a token would be available, without taking one."""
+        if not self.enabled:
+            return 0.0
+        return self._update(take=False)
+
+    def _update(self, *, take: bool) -> float:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._lock, open(self.path, "a+", encoding="utf-8") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    handle.seek(0)
+                    now = time.time()
+                    level = self._refill(handle.read(), now)
+                    if take:
+                        level -= 1
+                        handle.seek(0)
+                        handle.truncate()
+                        handle.write(f"{level:.6f} {now:.6f}\n")
+                        handle.flush()
+                        return max(0.0, -level / self.rate)
+                    return max(0.0, (1 - level) / self.rate)
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+        except OSError as exc:
+            print(f"WARNING: Shared request budget unavailable ({self.path}): {exc}")
+            return 0.0
+
+    def _refill(self, content: str, now: float) -> float:
+        try:
+            level, updated = (float(value) for value in content.split())
+        except ValueError:
+            return self.burst
+        # Clock steps backwards must not mint tokens or stall callers forever.
+        elapsed = max(0.0, now - updated)
+        return min(self.burst, level + elapsed * self.rate)
+
+
+_budget: RequestBudget | None = None
+_budget_lock = threading.Lock()
+
+
+def shared_budget() -> RequestBudget:
+    """The process-wide handle on the host's shared request budget."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = RequestBudget(
+                REQUEST_BUDGET_FILE,
+                INSTAGRAM_REQUESTS_PER_MINUTE / 60.0,
+                INSTAGRAM_REQUEST_BURST,
+            )
+        return _budget
+
+
+__all__ = [
+    "INSTAGRAM_REQUESTS_PER_MINUTE",
+    "INSTAGRAM_REQUEST_BURST",
+    "REQUEST_BUDGET_FILE",
+    "RequestBudget",
+    "shared_budget",
+]
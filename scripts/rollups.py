@@ -0,0 +1,140 @@
+"""Precomputed follower growth per account and day.
+
+``follower_rollups`` mirrors ``follower_history`` with the day-over-day,
+7-day and 30-day deltas, 7- and 30-day moving averages and growth rates,
+computed with window functions. Weekly and monthly figures compare against
+the earliest snapshot inside the window, so gaps in the history shorten the
+window instead of producing holes.
+
+Only the affected range is recomputed: for every account whose history has
+rows that are missing from, or differ from, the rollups, everything from the
+earliest such date onwards is rebuilt, reading 30 extra days of history for
+the windows.
+
+Usage::
+
+    python scripts/rollups.py [username ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Sequence
+
+# Longest window in days; history this far before a dirty date feeds its rows.
+ROLLUP_LOOKBACK_DAYS = 30
+
+REFRESH_ROLLUPS_SQL = """
+WITH dirty AS (
+  SELECT h.account_id, MIN(h.date) AS since
+  FROM follower_history h
+  LEFT JOIN follower_rollups r
+    ON r.account_id = h.account_id AND r.date = h.date
+  WHERE (%(account_ids)s::int[] IS NULL OR h.account_id = ANY(%(account_ids)s::int[]))
+    AND (
+      r.account_id IS NULL
+      OR r.followers <> h.followers
+      OR r.following IS DISTINCT FROM h.following
+    )
+  GROUP BY h.account_id
+),
+computed AS (
+  SELECT
+    h.account_id,
+    h.date,
+    h.followers,
+    h.following,
+    d.since,
+    h.followers - LAG(h.followers) OVER by_date AS delta_1d,
+    h.followers - FIRST_VALUE(h.followers) OVER w7 AS delta_7d,
+    h.followers - FIRST_VALUE(h.followers) OVER w30 AS delta_30d,
+    FIRST_VALUE(h.followers) OVER w7 AS base_7d,
+    FIRST_VALUE(h.followers) OVER w30 AS base_30d,
+    AVG(h.followers) OVER last_7 AS ma_7,
+    AVG(h.followers) OVER last_30 AS ma_30
+  FROM follower_history h
+  JOIN dirty d ON d.account_id = h.account_id
+  WHERE h.date >= d.since - %(lookback)s::int
+  WINDOW by_date AS (PARTITION BY h.account_id ORDER BY h.date),
+         w7 AS (by_date RANGE BETWEEN INTERVAL '7 days' PRECEDING AND CURRENT ROW),
+         w30 AS (by_date RANGE BETWEEN INTERVAL '30 days' PRECEDING AND CURRENT ROW),
+         -- Moving averages span 7 and 30 calendar days including today.
+         last_7 AS (by_date RANGE BETWEEN INTERVAL '6 days' PRECEDING AND CURRENT ROW),
+         last_30 AS (by_date RANGE BETWEEN INTERVAL '29 days' PRECEDING AND CURRENT ROW)
+)
+INSERT INTO follower_rollups (
+  account_id, date, followers, following,
+  delta_1d, delta_7d, delta_30d, ma_7, ma_30,
+  growth_7d_pct, growth_30d_pct, computed_at
+)
+SELECT
+  account_id, date, followers, following,
+  delta_1d, delta_7d, delta_30d, ma_7, ma_30,
+  delta_7d * 100.0 / NULLIF(base_7d, 0),
+  delta_30d * 100.0 / NULLIF(base_30d, 0),
+  NOW()
+FROM computed
+WHERE date >= since
+ON CONFLICT (account_id, date)
+DO UPDATE SET followers = EXCLUDED.followers,
+              following = EXCLUDED.following,
+              delta_1d = EXCLUDED.delta_1d,
+              delta_7d = EXCLUDED.delta_7d,
+              delta_30d = EXCLUDED.delta_30d,
+              ma_7 = EXCLUDED.ma_7,
+              ma_30 = EXCLUDED.ma_30,
+              growth_7d_pct = EXCLUDED.growth_7d_pct,
+              growth_30d_pct = EXCLUDED.growth_30d_pct,
+              computed_at = EXCLUDED.computed_at
+"""
+
+
+def refresh_rollups(cursor, account_ids: Sequence[int] | None = None) -> int:
+    """Bring ``follower_rollups`` up to date; returns the number of rows written.
+
+    ``account_ids`` limits the dirty check to those accounts (the ones a run
+    touched), which keeps it an index lookup; ``None`` checks every account.
+    """
+    if account_ids is not None and not account_ids:
+        return 0
+    cursor.execute(
+        REFRESH_ROLLUPS_SQL,
+        {
+            "account_ids": list(account_ids) if account_ids is not None else None,
+            "lookback": ROLLUP_LOOKBACK_DAYS,
+        },
+    )
+    return cursor.rowcount
+
+
+__all__ = ["ROLLUP_LOOKBACK_DAYS", "refresh_rollups"]
+
+
+def main() -> None:
+    from db_connection import close_pool, connection
+    from migrations import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Recompute stale follower growth rollups.")
+    parser.add_argument("usernames", nargs="*", help="defaults to every account")
+    args = parser.parse_args()
+
+    try:
+        with connection() as conn:
+            ensure_schema(conn)
+            with conn.cursor() as cur:
+                account_ids = None
+                if args.usernames:
+                    cur.execute(
+                        "SELECT id FROM accounts WHERE username = ANY(%s)",
+                        ([name.strip().lower() for name in args.usernames],),
+                    )
+                    account_ids = [row[0] for row in cur.fetchall()]
+                written = refresh_rollups(cur, account_ids)
+            conn.commit()
+    finally:
+        close_pool()
+    print(f"Recomputed {written} rollup rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Per-account timings and request counters for updater runs.
+
+``update_followers_db.py`` wraps every account in :meth:`RunMetrics.account`
+and its steps in :meth:`RunMetrics.phase`:
+
+* ``profile``: fetching the profile and its counts
+* ``followers``: paging through the follower list
+* ``db_write``: history upserts, staged chunks, publishing and snapshots
+* ``throttle``: rate controller sleeps and shared request budget waits
+* ``cooldown``: the pause before the next account
+* ``backoff``: sleeps after connection errors
+
+Phases nest, and each one is charged only its own (exclusive) time. A
+staged chunk written while paging therefore counts as ``db_write``, and a
+throttle sleep between pages counts as ``throttle``, not ``followers``. Time
+inside an account but outside any phase is reported as ``other``.
+
+The rate controllers count every request and every 401/403/429 per
+``query_type``, both per account and for the whole run. At the end of a run,
+:meth:`RunMetrics.write` appends one JSON line per account plus a run summary
+to ``RUN_METRICS_DIR/runs.jsonl``. It also replaces
+``RUN_METRICS_DIR/insta_followers.prom`` with Prometheus text-format gauges
+for node_exporter's textfile collector.
+
+Recording is thread-safe, and a thread that is not inside an account (e.g.
+``update_one.py``) records only the run-wide counters.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_METRICS_DIR = os.getenv("RUN_METRICS_DIR", os.path.join(BASE_DIR, ".run_metrics"))
+RUN_METRICS_LOG = "runs.jsonl"
+RUN_METRICS_TEXTFILE = "insta_followers.prom"
+
+PHASES = ("profile", "followers", "db_write", "throttle", "cooldown", "backoff")
+
+
+class AccountMetrics:
+    """Timings, request counters and results of one account in one run."""
+
+    def __init__(self, username: str, worker: str) -> None:
+        self.username = username
+        self.worker = worker
+        self.started_at = time.time()
+        self.seconds = 0.0
+        self.phases: Counter[str] = Counter()
+        self.requests: Counter[str] = Counter()
+        self.failures: Counter[tuple[str, int]] = Counter()
+        self.fields: dict[str, Any] = {}
+
+    def to_json(self) -> dict[str, Any]:
+        phases = {name: round(self.phases.get(name, 0.0), 3) for name in PHASES}
+        phases.update({name: round(value, 3) for name, value in self.phases.items() if name not in phases})
+        phases["other"] = round(max(self.seconds - sum(self.phases.values()), 0.0), 3)
+        return {
+            "type": "account",
+            "username": self.username,
+            "worker": self.worker,
+            "started_at": _isoformat(self.started_at),
+            "seconds": round(self.seconds, 3),
+            "phases": phases,
+            "requests": dict(sorted(self.requests.items())),
+            "failures": _failures_json(self.failures),
+            **self.fields,
+        }
+
+
+class RunMetrics:
+    def __init__(self, directory: str = RUN_METRICS_DIR) -> None:
+        self.directory = directory
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.accounts: list[AccountMetrics] = []
+        self.requests: Counter[str] = Counter()
+        self.failures: Counter[tuple[str, int]] = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def current(self) -> AccountMetrics | None:
+        return getattr(self._local, "account", None)
+
+    @contextmanager
+    def account(self, username: str) -> Iterator[AccountMetrics]:
+        metrics = AccountMetrics(username, threading.current_thread().name)
+        with self._lock:
+            self.accounts.append(metrics)
+        self._local.account = metrics
+        self._local.stack = []
+        started = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics.seconds = time.perf_counter() - started
+            self._local.account = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        account = self.current()
+        if account is None:
+            yield
+            return
+        stack: list[list[float]] = self._local.stack
+        # [start, time spent in nested phases]
+        frame = [time.perf_counter(), 0.0]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            account.phases[name] += elapsed - frame[1]
+            if stack:
+                stack[-1][1] += elapsed
+
+    def note(self, **fields: Any) -> None:
+        """Attach result fields (follower counts, outcome, ...) to the current account."""
+        account = self.current()
+        if account is not None:
+            account.fields.update(fields)
+
+    def record_request(self, query_type: str) -> None:
+        with self._lock:
+            self.requests[query_type] += 1
+        account = self.current()
+        if account is not None:
+            account.requests[query_type] += 1
+
+    def record_failure(self, query_type: str, status: int) -> None:
+        with self._lock:
+            self.failures[(query_type, status)] += 1
+        account = self.current()
+        if account is not None:
+            account.failures[(query_type, status)] += 1
+
+    def summary(self) -> dict[str, Any]:
+        with self._lock:
+            accounts = list(self.accounts)
+            requests = Counter(self.requests)
+            failures = Counter(self.failures)
+        phases: Counter[str] = Counter()
+        for account in accounts:
+            phases.update(account.to_json()["phases"])
+        return {
+            "type": "run",
+            "started_at": _isoformat(self.started_at),
+            "seconds": round(time.perf_counter() - self._started, 3),
+            "accounts": len(accounts),
+            "phases": {name: round(value, 3) for name, value in phases.items()},
+            "requests": dict(sorted(requests.items())),
+            "failures": _failures_json(failures),
+        }
+
+    def write(self) -> None:
+        """Append the JSON lines and replace the Prometheus textfile; never raises on I/O errors."""
+        summary = self.summary()
+        accounts = [account.to_json() for account in self.accounts]
+        run_id = summary["started_at"]
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, RUN_METRICS_LOG), "a", encoding="utf-8") as handle:
+                for record in (*accounts, summary):
+                    handle.write(json.dumps({"run": run_id, **record}, ensure_ascii=False) + "\n")
+            path = os.path.join(self.directory, RUN_METRICS_TEXTFILE)
+            # node_exporter may read at any moment, so replace the file atomically.
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                handle.write(_prometheus(summary, accounts))
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            print(f"WARNING: Could not write run metrics to {self.directory}: {exc}")
+
+    def log_summary(self) -> None:
+        summary = self.summary()
+        # Shares of the time summed over accounts, which exceeds the wall
+        # time when several workers run in parallel.
+        total = sum(summary["phases"].values()) or 1.0
+        print(
+            "Run time {seconds:.0f}s; account time by phase: ".format(**summary)
+            + ", ".join(
+                f"{name} {seconds:.0f}s ({seconds / total:.0%})"
+                for name, seconds in sorted(summary["phases"].items(), key=lambda item: -item[1])
+                if seconds
+            )
+        )
+        slowest = sorted(self.accounts, key=lambda account: -account.seconds)[:5]
+        if slowest:
+            print("Slowest accounts: " + ", ".join(f"{a.username} {a.seconds:.0f}s" for a in slowest))
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+def _failures_json(failures: Counter[tuple[str, int]]) -> dict[str, dict[str, int]]:
+    result: dict[str, dict[str, int]] = {}
+    for (query_type, status), count in sorted(failures.items()):
+        result.setdefault(query_type, {})[str(status)] = count
+    return result
+
+
+def _label(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _by_username(accounts: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    """Sum the records of accounts refreshed more than once in a run (retries, daemon jobs)."""
+    merged: dict[str, dict[str, Any]] = {}
+    for account in accounts:
+        total = merged.setdefault(account["username"], {"seconds": 0.0, "phases": Counter(), "requests": Counter()})
+        total["seconds"] += account["seconds"]
+        total["phases"].update(account["phases"])
+        total["requests"].update(account["requests"])
+    return merged
+
+
+def _prometheus(summary: dict[str, Any], accounts: list[dict[str, Any]]) -> str:
+    lines: list[str] = []
+    # node_exporter rejects a textfile with duplicate series, so label by account once.
+    per_account = _by_username(accounts)
+
+    def gauge(name: str, help_text: str, samples: list[tuple[dict[str, object], float]]) -> None:
+        lines.append(f"# HELP insta_followers_{name} {help_text}")
+        lines.append(f"# TYPE insta_followers_{name} gauge")
+        for labels, value in samples:
+            rendered = ",".join(f'{key}="{_label(val)}"' for key, val in labels.items())
+            lines.append(f"insta_followers_{name}{{{rendered}}} {value}" if rendered else f"insta_followers_{name} {value}")
+
+    started = datetime.datetime.fromisoformat(summary["started_at"]).timestamp()
+    gauge("run_start_timestamp_seconds", "Start of the last updater run.", [({}, started)])
+    gauge("run_duration_seconds", "Wall time of the last updater run.", [({}, summary["seconds"])])
+    gauge("run_accounts", "Accounts processed in the last run.", [({}, summary["accounts"])])
+    gauge(
+        "run_phase_seconds",
+        "Seconds spent per phase in the last run, summed over accounts.",
+        [({"phase": name}, value) for name, value in sorted(summary["phases"].items())],
+    )
+    gauge(
+        "run_requests",
+        "Instagram requests per query type in the last run.",
+        [({"query_type": name}, value) for name, value in summary["requests"].items()],
+    )
+    gauge(
+        "run_request_failures",
+        "401/403/429 responses per query type and status in the last run.",
+        [
+            ({"query_type": name, "status": status}, value)
+            for name, statuses in summary["failures"].items()
+            for status, value in statuses.items()
+        ],
+    )
+    gauge(
+        "account_seconds",
+        "Wall time per account in the last run, summed over its refreshes.",
+        [({"account": username}, round(account["seconds"], 3)) for username, account in per_account.items()],
+    )
+    gauge(
+        "account_phase_seconds",
+        "Seconds per account and phase in the last run.",
+        [
+            ({"account": username, "phase": name}, round(value, 3))
+            for username, account in per_account.items()
+            for name, value in sorted(account["phases"].items())
+            if value
+        ],
+    )
+    gauge(
+        "account_requests",
+        "Instagram requests per account and query type in the last run.",
+        [
+            ({"account": username, "query_type": name}, value)
+            for username, account in per_account.items()
+            for name, value in sorted(account["requests"].items())
+        ],
+    )
+    return "\n".join(lines) + "\n"
+
+
+_metrics: RunMetrics | None = None
+_metrics_lock = threading.Lock()
+
+
+def run_metrics() -> RunMetrics:
+    """The process-wide metrics recorder of the current run."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = RunMetrics()
+        return _metrics
+
+
+def start_run() -> RunMetrics:
+    """Start recording a new run, e.g. for every batch of a long-lived daemon."""
+    global _metrics
+    with _metrics_lock:
+        _metrics = RunMetrics()
+        return _metrics
+
+
+__all__ = [
+    "PHASES",
+    "RUN_METRICS_DIR",
+    "AccountMetrics",
+    "RunMetrics",
+    "run_metrics",
+    "start_run",
+]
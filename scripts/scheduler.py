@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import datetime
+import math
+import os
+
+from psycopg.rows import dict_row
+
+from follower_store import FOLLOWER_FULL_SYNC_DAYS, FOLLOWER_KNOWN_STOP_RUN
+
+# Instagram requests one updater run may spend; 0 means no budget.
+RUN_REQUEST_BUDGET = max(int(os.getenv("RUN_REQUEST_BUDGET", "0")), 0)
+DELETED_REFRESH_DAYS = max(float(os.getenv("DELETED_REFRESH_DAYS", "7")), 0.0)
+VOLATILITY_WINDOW_DAYS = max(int(os.getenv("VOLATILITY_WINDOW_DAYS", "30")), 2)
+VOLATILITY_WEIGHT = float(os.getenv("VOLATILITY_WEIGHT", "1"))
+
+# Followers returned per GraphQL page by Instaloader's NodeIterator.
+FOLLOWER_PAGE_SIZE = 12
+# Daily follower-count swings beyond this share of the audience (in percent)
+# do not raise the priority any further.
+MAX_VOLATILITY_PCT = 5.0
+
+
+def fetch_candidates(conn) -> list[dict[str, object]]:  # noqa: ANN001
+    """Accounts with the history statistics the scheduler scores them by."""
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(
+            """
+            SELECT a.id, a.username, a.is_deleted, a.deleted_at,
+                   latest.date AS last_refreshed,
+                   latest.followers,
+                   COALESCE(vol.delta_stddev, 0) AS delta_stddev,
+                   a.followers_full_sync_at IS NULL
+                     OR a.followers_full_sync_at < NOW() - make_interval(secs => %s)
+                     AS full_sync_due
+            FROM accounts a
+            LEFT JOIN LATERAL (
+              SELECT date, followers
+              FROM follower_history
+              WHERE account_id = a.id
+              ORDER BY date DESC
+              LIMIT 1
+            ) latest ON TRUE
+            LEFT JOIN LATERAL (
+              SELECT STDDEV_POP(delta)::float AS delta_stddev
+              FROM (
+                SELECT followers - LAG(followers) OVER (ORDER BY date) AS delta
+                FROM follower_history
+                WHERE account_id = a.id
+                  AND date >= CURRENT_DATE - %s
+              ) deltas
+            ) vol ON TRUE
+            ORDER BY a.username ASC
+            """,
+            (max(FOLLOWER_FULL_SYNC_DAYS, 0) * 86400, VOLATILITY_WINDOW_DAYS),
+        )
+        return cur.fetchall()
+
+
+def staleness_days(account: dict[str, object], today: datetime.date) -> float | None:
+    """Days since the last ``follower_history`` row, or ``None`` if there is none."""
+    last_refreshed = account.get("last_refreshed")
+    if last_refreshed is None:
+        return None
+    return float((today - last_refreshed).days)
+
+
+def volatility_pct(account: dict[str, object]) -> float:
+    """Standard deviation of daily follower changes, as a percentage of the audience."""
+    followers = account.get("followers") or 0
+    if followers <= 0:
+        return 0.0
+    return min(MAX_VOLATILITY_PCT, float(account.get("delta_stddev") or 0) * 100 / followers)
+
+
+def account_priority(account: dict[str, object], today: datetime.date) -> float:
+    """Higher is more urgent.
+
+    Staleness is the base score. Volatile accounts drift from their stored
+    numbers faster, so recent volatility multiplies it, and larger audiences
+    get a logarithmic boost. Accounts never refreshed come first.
+    """
+    stale = staleness_days(account, today)
+    if stale is None:
+        return math.inf
+    size_boost = 1 + math.log10(1 + (account.get("followers") or 0)) / 6
+    # Accounts already refreshed today keep a small score so they still sort.
+    return (stale + 0.1) * (1 + VOLATILITY_WEIGHT * volatility_pct(account)) * size_boost
+
+
+def estimate_requests(account: dict[str, object]) -> int:
+    """Instagram requests a refresh of ``account`` is expected to cost.
+
+    One profile lookup plus the follower pages: the whole list when a full
+    sync is due, otherwise enough pages to cover the typical daily churn and
+    the run of known followers that ends an incremental fetch.
+    """
+    followers = account.get("followers") or 0
+    if account.get("full_sync_due") or FOLLOWER_FULL_SYNC_DAYS <= 0:
+        pages = math.ceil(followers / FOLLOWER_PAGE_SIZE)
+    else:
+        churn = float(account.get("delta_stddev") or 0) * 2
+        pages = math.ceil((churn + FOLLOWER_KNOWN_STOP_RUN) / FOLLOWER_PAGE_SIZE)
+    return 1 + max(pages, 1)
+
+
+def deleted_due(account: dict[str, object], today: datetime.date) -> bool:
+    stale = staleness_days(account, today)
+    return stale is None or stale >= DELETED_REFRESH_DAYS
+
+
+def plan_run(
+    accounts: list[dict[str, object]],
+    *,
+    budget: int = RUN_REQUEST_BUDGET,
+    limit: int | None = None,
+    today: datetime.date | None = None,
+) -> tuple[list[dict[str, object]], list[dict[str, object]]]:
+    """Pick the accounts for this run, most urgent first.
+
+    Active accounts are taken in priority order while their estimated cost
+    fits into ``budget`` (a ``budget`` of 0 is unlimited); the most urgent
+    account is always taken so that an expensive one cannot starve. Soft
+    deleted accounts form a separate lane: they are only due every
+    ``DELETED_REFRESH_DAYS`` and are scheduled after all active accounts.
+    ``limit`` caps the number of accounts. Returns ``(selected, deferred)``.
+    """
+    today = today or datetime.date.today()
+    for account in accounts:
+        account["priority"] = account_priority(account, today)
+        account["estimated_requests"] = estimate_requests(account)
+
+    def by_priority(account: dict[str, object]) -> tuple[float, str]:
+        return (-account["priority"], account["username"])
+
+    active = sorted((acc for acc in accounts if not acc.get("is_deleted")), key=by_priority)
+    deleted = sorted(
+        (acc for acc in accounts if acc.get("is_deleted") and deleted_due(acc, today)),
+        key=by_priority,
+    )
+
+    selected: list[dict[str, object]] = []
+    deferred: list[dict[str, object]] = []
+    spent = 0
+    for account in active + deleted:
+        cost = account["estimated_requests"]
+        within_limit = limit is None or len(selected) < limit
+        within_budget = not budget or not selected or spent + cost <= budget
+        if within_limit and within_budget:
+            selected.append(account)
+            spent += cost
+        else:
+            deferred.append(account)
+    return selected, deferred
+
+
+__all__ = [
+    "DELETED_REFRESH_DAYS",
+    "RUN_REQUEST_BUDGET",
+    "account_priority",
+    "estimate_requests",
+    "fetch_candidates",
+    "plan_run",
+]
@@ -0,0 +1,268 @@
+"""Compressed daily follower-set snapshots.
+
+Every follower sync records the account's follower set for the day in
+``follower_snapshots`` as interned follower IDs (``followers.id``). A row is
+either a keyframe holding the complete sorted ID array, or a diff holding the
+IDs added and removed since the previous snapshot; a keyframe is written
+whenever the last one is ``SNAPSHOT_KEYFRAME_DAYS`` or more days old. ID
+arrays are delta-encoded (small gaps instead of large IDs) and zlib
+compressed, so a day costs roughly its churn rather than its audience.
+
+:func:`followers_on` rebuilds any past day from the nearest keyframe plus at
+most ``SNAPSHOT_KEYFRAME_DAYS - 1`` diffs.
+
+Usage::
+
+    python scripts/snapshots.py <username> [YYYY-MM-DD]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Sequence
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - the pure Python path is used instead
+    np = None
+
+SNAPSHOT_KEYFRAME_DAYS = max(int(os.getenv("SNAPSHOT_KEYFRAME_DAYS", "7")), 1)
+
+ID_TYPECODE = "q"
+DIFF_HEADER = struct.Struct("<QQ")
+
+
+def _pack(ids: Sequence[int]) -> bytes:
+    """Delta-encode a sorted ID sequence as little-endian int64."""
+    if np is not None:
+        values = np.asarray(ids, dtype="<i8")
+        return np.diff(values, prepend=0).astype("<i8").tobytes() if values.size else b""
+    deltas = array(ID_TYPECODE, (b - a for a, b in zip((0, *ids), ids)))
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    return deltas.tobytes()
+
+
+def _unpack(data: bytes) -> Sequence[int]:
+    if np is not None:
+        return np.cumsum(np.frombuffer(data, dtype="<i8"), dtype=np.int64)
+    deltas = array(ID_TYPECODE)
+    deltas.frombytes(data)
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    return array(ID_TYPECODE, accumulate(deltas))
+
+
+def encode_keyframe(ids: Sequence[int]) -> bytes:
+    return zlib.compress(_pack(ids))
+
+
+def decode_keyframe(payload: bytes) -> Sequence[int]:
+    return _unpack(zlib.decompress(payload))
+
+
+def encode_diff(added: Sequence[int], removed: Sequence[int]) -> bytes:
+    return zlib.compress(DIFF_HEADER.pack(len(added), len(removed)) + _pack(added) + _pack(removed))
+
+
+def decode_diff(payload: bytes) -> tuple[Sequence[int], Sequence[int]]:
+    data = zlib.decompress(payload)
+    added_count, _ = DIFF_HEADER.unpack_from(data)
+    split = DIFF_HEADER.size + added_count * 8
+    return _unpack(data[DIFF_HEADER.size:split]), _unpack(data[split:])
+
+
+def contains_sorted(haystack: "np.ndarray", needles: "np.ndarray") -> "np.ndarray":
+    """Mask of ``needles`` present in the sorted ``haystack`` (binary search, no re-sort)."""
+    positions = np.searchsorted(haystack, needles)
+    found = positions < haystack.size
+    found[found] = haystack[positions[found]] == needles[found]
+    return found
+
+
+def sorted_difference(left: Sequence[int], right: Sequence[int]) -> Sequence[int]:
+    """IDs in ``left`` but not in ``right``; both sorted and unique."""
+    if np is not None:
+        left = np.asarray(left, dtype=np.int64)
+        return left[~contains_sorted(np.asarray(right, dtype=np.int64), left)]
+    exclude = set(right)
+    return array(ID_TYPECODE, (value for value in left if value not in exclude))
+
+
+def diff_sorted(previous: Sequence[int], current: Sequence[int]) -> tuple[Sequence[int], Sequence[int]]:
+    """``(added, removed)`` between two sorted, unique ID arrays in one merge pass."""
+    if np is None:
+        return sorted_difference(current, previous), sorted_difference(previous, current)
+    previous = np.asarray(previous, dtype=np.int64)
+    merged = np.concatenate([previous, np.asarray(current, dtype=np.int64)])
+    # A stable sort of two sorted runs is a linear merge; shared IDs end up adjacent.
+    order = np.argsort(merged, kind="stable")
+    values = merged[order]
+    shared = np.zeros(values.size, dtype=bool)
+    equal = values[1:] == values[:-1]
+    shared[1:] |= equal
+    shared[:-1] |= equal
+    single = order[~shared]
+    return merged[single[single >= previous.size]], merged[single[single < previous.size]]
+
+
+def apply_diff(ids: Sequence[int], added: Sequence[int], removed: Sequence[int]) -> Sequence[int]:
+    if np is not None:
+        ids = np.asarray(ids, dtype=np.int64)
+        added = np.asarray(added, dtype=np.int64)
+        removed = np.asarray(removed, dtype=np.int64)
+        kept = np.delete(ids, np.searchsorted(ids, removed[contains_sorted(ids, removed)])) if removed.size else ids
+        return np.insert(kept, np.searchsorted(kept, added), added) if added.size else kept
+    return array(ID_TYPECODE, sorted(set(ids).difference(removed).union(added)))
+
+
+def current_follower_ids(cursor, account_id: int) -> Sequence[int]:
+    """Sorted ``followers.id`` values currently linked to ``account_id``."""
+    cursor.execute(
+        "SELECT follower_id FROM account_followers WHERE account_id = %s ORDER BY follower_id",
+        (account_id,),
+    )
+    return array(ID_TYPECODE, (row[0] for row in cursor.fetchall()))
+
+
+def followers_on(cursor, account_id: int, date: datetime.date) -> Sequence[int] | None:
+    """Sorted follower IDs of ``account_id`` on ``date``, or ``None`` before the first snapshot.
+
+    Days between snapshots resolve to the latest snapshot on or before them.
+    """
+    cursor.execute(
+        """
+        SELECT is_keyframe, payload
+        FROM follower_snapshots
+        WHERE account_id = %s
+          AND date <= %s
+          AND date >= (
+            SELECT MAX(date) FROM follower_snapshots
+            WHERE account_id = %s AND date <= %s AND is_keyframe
+          )
+        ORDER BY date
+        """,
+        (account_id, date, account_id, date),
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    ids = decode_keyframe(rows[0][1])
+    for _, payload in rows[1:]:
+        ids = apply_diff(ids, *decode_diff(payload))
+    return ids
+
+
+def record_snapshot(cursor, account_id: int, date: datetime.date | None = None) -> tuple[int, int, int]:
+    """Store the current follower set as ``date``'s snapshot (default: today).
+
+    Returns ``(followers, added, removed)`` relative to the previous snapshot.
+    Re-running on the same day replaces that day's row.
+    """
+    date = date or datetime.date.today()
+    ids = current_follower_ids(cursor, account_id)
+
+    cursor.execute(
+        """
+        SELECT MAX(date) FILTER (WHERE is_keyframe), MAX(date)
+        FROM follower_snapshots
+        WHERE account_id = %s AND date < %s
+        """,
+        (account_id, date),
+    )
+    last_keyframe, previous_date = cursor.fetchone()
+
+    if previous_date is None:
+        previous = None
+    else:
+        previous = followers_on(cursor, account_id, previous_date)
+
+    keyframe = (
+        previous is None
+        or last_keyframe is None
+        or (date - last_keyframe).days >= SNAPSHOT_KEYFRAME_DAYS
+    )
+    if previous is None:
+        added, removed = ids, array(ID_TYPECODE)
+    else:
+        added, removed = diff_sorted(previous, ids)
+    payload = encode_keyframe(ids) if keyframe else encode_diff(added, removed)
+
+    cursor.execute(
+        """
+        INSERT INTO follower_snapshots (
+          account_id, date, is_keyframe, follower_count, added_count, removed_count, payload
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (account_id, date)
+        DO UPDATE SET is_keyframe = EXCLUDED.is_keyframe,
+                      follower_count = EXCLUDED.follower_count,
+                      added_count = EXCLUDED.added_count,
+                      removed_count = EXCLUDED.removed_count,
+                      payload = EXCLUDED.payload,
+                      created_at = NOW()
+        """,
+        (account_id, date, keyframe, len(ids), len(added), len(removed), payload),
+    )
+    return len(ids), len(added), len(removed)
+
+
+def usernames_for(cursor, ids: Sequence[int]) -> list[str]:
+    cursor.execute(
+        "SELECT username FROM followers WHERE id = ANY(%s) AND username IS NOT NULL ORDER BY username",
+        ([int(value) for value in ids],),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+__all__ = [
+    "SNAPSHOT_KEYFRAME_DAYS",
+    "apply_diff",
+    "contains_sorted",
+    "decode_diff",
+    "decode_keyframe",
+    "diff_sorted",
+    "encode_diff",
+    "encode_keyframe",
+    "followers_on",
+    "record_snapshot",
+    "sorted_difference",
+    "usernames_for",
+]
+
+
+def main() -> None:
+    from db_connection import close_pool, connection
+    from migrations import ensure_schema
+
+    parser = argparse.ArgumentParser(description="Print an account's followers on a past date.")
+    parser.add_argument("username")
+    parser.add_argument("date", nargs="?", type=datetime.date.fromisoformat, default=datetime.date.today())
+    args = parser.parse_args()
+
+    try:
+        with connection() as conn:
+            ensure_schema(conn)
+            with conn.cursor() as cur:
+                cur.execute("SELECT id FROM accounts WHERE username = %s", (args.username.strip().lower(),))
+                row = cur.fetchone()
+                if row is None:
+                    raise SystemExit(f"Unknown account {args.username}")
+                ids = followers_on(cur, row[0], args.date)
+                if ids is None:
+                    raise SystemExit(f"No follower snapshot for {args.username} on or before {args.date}")
+                for username in usernames_for(cur, ids):
+                    print(username)
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
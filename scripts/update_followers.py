@@ -9,10 +9,13 @@ from typing import Iterable
 import instaloader
 from instaloader import exceptions as insta_exc
 
-from rate_limiter import GentleRateController
+from history_log import HISTORY_FORMAT, logged_usernames, upsert_entry
+from instagram_session import rate_controller
+from rate_limiter import AdaptiveRateController, report_failure
+from request_budget import shared_budget
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = BASE_DIR / "public" / "data"
+DATA_DIR = Path(os.getenv("DATA_DIR", str(BASE_DIR / "public" / "data")))
 ACCOUNTS_FILE = DATA_DIR / "accounts.json"
 INSTAGRAM_USERNAME = os.getenv("INSTAGRAM_USERNAME", "cristianofagundes")
 SESSION_FILE = os.getenv(
@@ -53,6 +56,9 @@ def load_accounts() -> list[str]:
             except (json.JSONDecodeError, OSError) as exc:
                 print(f"WARNING: Could not parse {path}: {exc}")
 
+    if not usernames and HISTORY_FORMAT == "jsonl":
+        usernames.extend(logged_usernames())
+
     unique_usernames = sorted(set(filter(None, usernames)))
 
     if not unique_usernames:
@@ -113,6 +119,13 @@ def append_history(username: str, followers: int, following: int | None) -> None
     user_file = DATA_DIR / f"{username}.json"
     today = datetime.date.today().isoformat()
 
+    if HISTORY_FORMAT == "jsonl":
+        upsert_entry(username, today, followers, following, seed_from=user_file)
+        print(
+            f"Stored {followers} followers and {following} following for {username} on {today} (log)."
+        )
+        return
+
     if user_file.exists():
         try:
             with user_file.open("r", encoding="utf-8") as handle:
@@ -163,7 +176,7 @@ def process_accounts(usernames: Iterable[str]) -> None:
         compress_json=False,
         post_metadata_txt_pattern=None,
         max_connection_attempts=1,
-        rate_controller=GentleRateController,
+        rate_controller=lambda ctx: AdaptiveRateController(ctx, state_key=INSTAGRAM_USERNAME),
     )
 
     if not load_session(loader):
@@ -176,7 +189,7 @@ def process_accounts(usernames: Iterable[str]) -> None:
         print(f"\n--- Processing {username} ---")
 
         if last_processed:
-            cooldown = random.uniform(20, 45)
+            cooldown = max(random.uniform(20, 45), shared_budget().wait_time())
             print(
                 f"Cooling down for {cooldown:.2f} seconds after {last_processed}"
             )
@@ -191,6 +204,7 @@ def process_accounts(usernames: Iterable[str]) -> None:
             )
             append_history(username, followers, following)
         except insta_exc.ConnectionException as exc:
+            report_failure(rate_controller(loader), exc)
             print(
                 f"ERROR: Connection issue while updating {username}: {exc}. Skipping."
             )
@@ -203,6 +217,7 @@ def process_accounts(usernames: Iterable[str]) -> None:
 
         last_processed = username
 
+    rate_controller(loader).save_state()
     print("\n--- Script finished ---")
 
 
@@ -1,180 +1,39 @@
+import argparse
 import datetime
-import json
 import os
 import random
 import sys
+import threading
 import time
+from collections.abc import Iterable
 
 import instaloader
 from instaloader.exceptions import ConnectionException, InstaloaderException
 import psycopg
-from psycopg.rows import dict_row
-
-from db_utils import execute_values
+from psycopg_pool import PoolTimeout
+
+from db_connection import checkout_stats, close_pool, connection, reserve_connections
+from migrations import ensure_schema
+from follower_store import SyncResult, refresh_followers
+from instagram_session import SessionConfig, configured_sessions, create_loader, rate_controller
+from planner import COUNTS, FOLLOWERS, RUN_DEADLINE, CostModel, RunPlanner, parse_deadline
+from rate_limiter import report_failure
+from refresh_jobs import enqueue_jobs
+from rollups import refresh_rollups
+from scheduler import DELETED_REFRESH_DAYS, RUN_REQUEST_BUDGET, fetch_candidates, plan_run
+from request_budget import shared_budget
+from run_metrics import run_metrics
 
 # --- Setup Paths ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "public", "data")
-INSTAGRAM_USERNAME = os.getenv("INSTAGRAM_USERNAME", "cristianofagundes")
-SESSION_FILE = os.getenv(
-    "INSTAGRAM_SESSION_FILE",
-    os.path.join(BASE_DIR, "instagram.session"),
-)
-SESSION_ID = os.getenv("INSTAGRAM_SESSION_ID")
-print(f"Base directory: {BASE_DIR}")
-print(f"Data directory: {DATA_DIR}")
-
-DB_CONFIG = {
-    "host": os.getenv("POSTGRES_HOST", "postgres"),
-    "port": int(os.getenv("POSTGRES_PORT", "5432")),
-    "user": os.getenv("POSTGRES_USER", "devuser"),
-    "password": os.getenv("POSTGRES_PASSWORD", "devpass"),
-    "dbname": os.getenv("POSTGRES_DB", "insta-followers"),
-}
-
-SCHEMA_STATEMENTS = (
-    """
-    CREATE TABLE IF NOT EXISTS accounts (
-      id SERIAL PRIMARY KEY,
-      username TEXT NOT NULL UNIQUE,
-      created_at TIMESTAMPTZ DEFAULT NOW(),
-      is_deleted BOOLEAN NOT NULL DEFAULT FALSE,
-      deleted_at TIMESTAMPTZ
-    )
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS follower_history (
-      id BIGSERIAL PRIMARY KEY,
-      account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
-      date DATE NOT NULL,
-      followers INTEGER NOT NULL,
-      following INTEGER,
-      created_at TIMESTAMPTZ DEFAULT NOW(),
-      CONSTRAINT follower_history_unique UNIQUE(account_id, date)
-    )
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS account_followers (
-      id BIGSERIAL PRIMARY KEY,
-      account_id INTEGER NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
-      follower_username TEXT NOT NULL,
-      full_name TEXT,
-      profile_pic_url TEXT,
-      is_private BOOLEAN,
-      is_verified BOOLEAN,
-      fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-      CONSTRAINT account_followers_unique UNIQUE(account_id, follower_username)
-    )
-    """,
-    """
-    CREATE INDEX IF NOT EXISTS account_followers_account_id_idx
-      ON account_followers (account_id)
-    """,
-    """
-    ALTER TABLE accounts
-    ADD COLUMN IF NOT EXISTS is_deleted BOOLEAN NOT NULL DEFAULT FALSE
-    """,
-    """
-    ALTER TABLE accounts
-    ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ
-    """,
-    """
-    CREATE INDEX IF NOT EXISTS accounts_is_deleted_idx
-    ON accounts (is_deleted, COALESCE(deleted_at, '1970-01-01'::timestamptz), username)
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS admin_devices (
-      id SERIAL PRIMARY KEY,
-      device_uuid TEXT NOT NULL UNIQUE,
-      label TEXT,
-      created_at TIMESTAMPTZ DEFAULT NOW()
-    )
-    """,
-)
-
-
-def get_db_connection():
-    print(
-        "Connecting to Postgres with host={host} port={port} db={dbname}".format(
-            **DB_CONFIG
-        )
-    )
-    return psycopg.connect(**DB_CONFIG)
-
-
-def ensure_schema(conn: psycopg.Connection):
-    with conn.cursor() as cur:
-        for statement in SCHEMA_STATEMENTS:
-            cur.execute(statement)
-    conn.commit()
-
-
-def fetch_accounts(conn: psycopg.Connection):
-    with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(
-            """
-            SELECT id, username, is_deleted, deleted_at
-            FROM accounts
-            ORDER BY is_deleted ASC,
-                     COALESCE(deleted_at, to_timestamp(0)) ASC,
-                     username ASC
-            """
-        )
-        return cur.fetchall()
-
-
-def load_session(loader: instaloader.Instaloader) -> bool:
-    if SESSION_ID:
-        loader.context.session.cookies.set(
-            "sessionid",
-            SESSION_ID,
-            domain=".instagram.com",
-            path="/",
-        )
-        print("Session loaded from INSTAGRAM_SESSION_ID environment variable.")
-        return True
-
-    if not SESSION_FILE:
-        return False
-
-    if not os.path.exists(SESSION_FILE):
-        return False
-
-    try:
-        loader.load_session_from_file(INSTAGRAM_USERNAME, SESSION_FILE)
-        print("Session loaded successfully from session file.")
-        return True
-    except FileNotFoundError:
-        return False
-    except Exception as exc:  # noqa: BLE001
-        print(f"WARNING: Failed to load session file as Instaloader session: {exc}")
-
-    # Try reading as JSON with a sessionid field
-    try:
-        with open(SESSION_FILE, "r", encoding="utf-8") as file:
-            content = file.read().strip()
-            try:
-                data = json.loads(content)
-                session_value = data.get("sessionid")
-            except json.JSONDecodeError:
-                session_value = content if content else None
-        if session_value:
-            loader.context.session.cookies.set(
-                "sessionid",
-                session_value,
-                domain=".instagram.com",
-                path="/",
-            )
-            print("Session loaded from session file using raw sessionid.")
-            return True
-    except OSError as exc:
-        print(f"WARNING: Could not read session file: {exc}")
-
-    return False
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, "public", "data"))
+UPDATER_WORKERS = os.getenv("UPDATER_WORKERS", "").strip()
+# Seconds to pause between two accounts on the same session.
+COOLDOWN_RANGE = (90, 180)
 
 
 def upsert_history(account_id: int, target_date: datetime.date, followers: int, following: int | None):
-    with get_db_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -189,229 +48,404 @@ def upsert_history(account_id: int, target_date: datetime.date, followers: int,
         conn.commit()
 
 
-def replace_followers(account_id: int, followers: list[dict[str, object]]):
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "DELETE FROM account_followers WHERE account_id = %s",
-                (account_id,),
-            )
+def replace_followers(account_id: int, username: str, followers: Iterable) -> tuple[int, SyncResult]:
+    """Stage ``followers`` chunk by chunk and publish them once complete.
 
-            if followers:
-                execute_values(
-                    cur,
-                    """
-                    INSERT INTO account_followers (
-                        account_id,
-                        follower_username,
-                        full_name,
-                        profile_pic_url,
-                        is_private,
-                        is_verified
-                    )
-                    VALUES %s
-                    """,
-                    [
-                        (
-                            account_id,
-                            follower["username"],
-                            follower.get("full_name"),
-                            follower.get("profile_pic_url"),
-                            follower.get("is_private"),
-                            follower.get("is_verified"),
-                        )
-                        for follower in followers
-                    ],
-                    page_size=1000,
-                )
-        conn.commit()
+    A fetch interrupted by rate limiting keeps its staged chunks and pagination
+    checkpoint, so the next run for this account resumes where it stopped.
+    Between periodic full passes only the newest followers are fetched.
+    """
+    with connection() as conn:
+        return refresh_followers(conn, account_id, username, followers)
 
 
-# --- Initialize Instaloader ---
-loader = instaloader.Instaloader(
-    quiet=False,
-    user_agent=None,
-    dirname_pattern=None,
-    filename_pattern=None,
-    download_video_thumbnails=False,
-    download_geotags=False,
-    download_comments=False,
-    save_metadata=False,
-    compress_json=False,
-    post_metadata_txt_pattern=None,
-    max_connection_attempts=1,
-)
-
-# Try to load a session file
-if not load_session(loader):
-    print("Session credentials not provided. Using anonymous access.")
-    print("WARNING: Anonymous access has much stricter rate limits.")
-
-accounts: list[dict[str, object]] = []
-
-try:
-    with get_db_connection() as conn:
-        ensure_schema(conn)
-        accounts = fetch_accounts(conn)
-except psycopg.OperationalError as exc:
-    print(f"ERROR: Could not connect to database: {exc}")
-    sys.exit(1)
-
-if not accounts:
-    print("No accounts found in the database. Exiting.")
-    sys.exit(0)
-
-active_accounts = [acc for acc in accounts if not acc.get("is_deleted")]
-deleted_accounts = [acc for acc in accounts if acc.get("is_deleted")]
-ordered_accounts = active_accounts + deleted_accounts
-
-print(
-    "Found {total} accounts to update ({active} active, {deleted} deleted).".format(
-        total=len(ordered_accounts),
-        active=len(active_accounts),
-        deleted=len(deleted_accounts),
-    )
-)
-if active_accounts:
-    print(
-        "Active queue: " + ", ".join(acc["username"] for acc in active_accounts)
-    )
-if deleted_accounts:
-    print(
-        "Soft-deleted queue: "
-        + ", ".join(acc["username"] for acc in deleted_accounts)
-    )
+def log(message: str) -> None:
+    """Print ``message``, tagged with the worker name when running in a worker thread."""
+    name = threading.current_thread().name
+    if name == "MainThread":
+        print(message)
+    else:
+        stripped = message.lstrip("\n")
+        print(message[: len(message) - len(stripped)] + f"[{name}] {stripped}")
 
-# --- Update Followers ---
-account_limit_env = os.getenv("MAX_ACCOUNTS_PER_RUN", "").strip()
-account_limit: int | None = None
 
-if account_limit_env:
-    try:
-        parsed_limit = int(account_limit_env)
-        if parsed_limit > 0:
-            account_limit = parsed_limit
-    except ValueError:
-        print(
-            f"WARNING: Ignoring invalid MAX_ACCOUNTS_PER_RUN value '{account_limit_env}'."
-        )
+def pause(seconds: float, stop: threading.Event | None = None) -> None:
+    """Sleep ``seconds``, or until ``stop`` is set when one is given (the daemon's shutdown)."""
+    if stop is None:
+        time.sleep(seconds)
+    else:
+        stop.wait(seconds)
 
-if account_limit is None:
-    accounts_to_process = ordered_accounts
-    print(
-        f"Processing all {len(accounts_to_process)} accounts: "
-        + ", ".join(
-            f"{acc['username']}{' (deleted)' if acc.get('is_deleted') else ''}"
-            for acc in accounts_to_process
-        )
-    )
-else:
-    accounts_to_process = ordered_accounts[:account_limit]
-    print(
-        f"Processing {len(accounts_to_process)} of {len(ordered_accounts)} accounts"
-        f" due to MAX_ACCOUNTS_PER_RUN={account_limit}."
-    )
-    print(
-        "Accounts to process: "
-        + ", ".join(
-            f"{acc['username']}{' (deleted)' if acc.get('is_deleted') else ''}"
-            for acc in accounts_to_process
-        )
-    )
-    if len(ordered_accounts) > account_limit:
-        remaining = ordered_accounts[account_limit:]
-        skipped_deleted = [acc for acc in remaining if acc.get("is_deleted")]
-        skipped_active = [acc for acc in remaining if not acc.get("is_deleted")]
-        if skipped_active:
-            print(
-                "WARNING: Reached account limit while still having active accounts pending: "
-                + ", ".join(acc["username"] for acc in skipped_active)
-            )
-        if skipped_deleted:
-            print(
-                "Skipped soft-deleted accounts this run due to limit: "
-                + ", ".join(acc["username"] for acc in skipped_deleted)
-            )
 
-for account in accounts_to_process:
+def process_account(
+    loader: instaloader.Instaloader,
+    account: dict[str, object],
+    mode: str = FOLLOWERS,
+    *,
+    stop: threading.Event | None = None,
+) -> str:
+    """Refresh one account; returns ``ok``, ``followers_failed`` (counts only) or ``error``."""
     username = account["username"]
     is_deleted = bool(account.get("is_deleted"))
-    label = f"{username} ({'deleted' if is_deleted else 'active'})"
-    print(f"\n--- Processing {label} ---")
+    label = f"{username} ({'deleted' if is_deleted else 'active'}"
+    label += ", count-only)" if mode == COUNTS else ")"
+    log(f"\n--- Processing {label} ---")
+    metrics = run_metrics()
+    metrics.note(is_deleted=is_deleted, mode=mode)
+    outcome = "error"
     try:
-        print(f"Fetching profile for {username}...")
-        profile = instaloader.Profile.from_username(loader.context, username)
-        followers = profile.followers
-        following = profile.followees
+        log(f"Fetching profile for {username}...")
+        with metrics.phase("profile"):
+            profile = instaloader.Profile.from_username(loader.context, username)
+            followers = profile.followers
+            following = profile.followees
         today = datetime.date.today()
-        print(
+        metrics.note(followers=followers, following=following)
+        log(
             f"Successfully fetched data for {username}: {followers} followers, {following} following."
         )
 
-        upsert_history(account["id"], today, followers, following)
-        print(f"Successfully wrote updates for {username} to the database.")
+        with metrics.phase("db_write"):
+            upsert_history(account["id"], today, followers, following)
+        log(f"Successfully wrote updates for {username} to the database.")
+        if mode == COUNTS:
+            outcome = "ok"
+            log(f"Skipping followers list for {username} (count-only refresh).")
+            return outcome
+        outcome = "followers_failed"
 
-        follower_records: list[dict[str, object]] = []
-        print(f"Fetching followers list for {username}...")
+        log(f"Fetching followers list for {username}...")
         try:
-            for idx, follower in enumerate(profile.get_followers(), start=1):
-                follower_records.append(
-                    {
-                        "username": follower.username,
-                        "full_name": follower.full_name,
-                        "profile_pic_url": follower.profile_pic_url,
-                        "is_private": follower.is_private,
-                        "is_verified": follower.is_verified,
-                    }
+            with metrics.phase("followers"):
+                stored, sync_result = replace_followers(
+                    account["id"], username, profile.get_followers()
                 )
-
-                if idx % 200 == 0:
-                    print(
-                        f"Fetched {idx} followers so far for {username}"
-                    )
-
-            replace_followers(account["id"], follower_records)
-            print(
-                f"Stored {len(follower_records)} followers for {username} in the database."
+            outcome = "ok"
+            metrics.note(
+                stored=stored,
+                sync_mode=sync_result.mode,
+                gained=sync_result.gained,
+                lost=sync_result.lost,
+            )
+            log(
+                f"Stored {stored} followers for {username} in the database"
+                f" ({sync_result.mode}: +{sync_result.gained} -{sync_result.lost}"
+                f" ~{sync_result.changed})."
             )
         except InstaloaderException as follower_error:
-            print(
+            report_failure(rate_controller(loader), follower_error)
+            log(
                 f"WARNING: Could not fetch followers list for {username}: {follower_error}"
             )
         except Exception as follower_error:  # noqa: BLE001
-            print(
+            log(
                 f"WARNING: Unexpected error while fetching followers for {username}: {follower_error}"
             )
 
     except ConnectionException as e:
-        print(f"ERROR: A connection error occurred for {username}: {e}")
-        print("This is likely due to Instagram rate-limiting or blocking the request.")
-        print("Implementing exponential backoff...")
+        report_failure(rate_controller(loader), e)
+        log(f"ERROR: A connection error occurred for {username}: {e}")
+        log("This is likely due to Instagram rate-limiting or blocking the request.")
+        log("Implementing exponential backoff...")
         if is_deleted:
             backoff_range = (900, 1800)
         else:
             backoff_range = (120, 360)
         backoff_time = random.uniform(*backoff_range)
-        print(
+        log(
             "Waiting {seconds:.2f} seconds before continuing (".format(seconds=backoff_time)
             + ("soft-deleted account" if is_deleted else "active account quick retry")
             + ")..."
         )
-        time.sleep(backoff_time)
-        print("The script will continue with the next user.")
+        with metrics.phase("backoff"):
+            pause(backoff_time, stop)
+        log("The script will continue with the next user.")
     except Exception as e:  # noqa: BLE001
-        print(f"An unexpected error occurred while processing {username}: {e}")
+        log(f"An unexpected error occurred while processing {username}: {e}")
+    finally:
+        metrics.note(outcome=outcome)
+    return outcome
 
-    if is_deleted:
-        sleep_range = (300, 900)
-    else:
-        sleep_range = (90, 180)
-    sleep_time = random.uniform(*sleep_range)
-    print(
+
+def cool_down(account: dict[str, object], *, idle: float = 0.0, stop: threading.Event | None = None) -> None:
+    """Pause before the next account, less the ``idle`` seconds the session already rested."""
+    # Soft-deleted accounts only come up every DELETED_REFRESH_DAYS, so they
+    # no longer get a longer pause than active ones.
+    is_deleted = bool(account.get("is_deleted"))
+    # Never sleep less than the shared request budget needs to refill, so a
+    # concurrent update_one.py run does not push the next account into a 429.
+    sleep_time = max(random.uniform(*COOLDOWN_RANGE) - idle, shared_budget().wait_time())
+    if sleep_time <= 0:
+        return
+    log(
         f"Waiting for {sleep_time:.2f} seconds before next account"
         + (" (soft-deleted)" if is_deleted else "")
         + "..."
     )
-    time.sleep(sleep_time)
+    with run_metrics().phase("cooldown"):
+        pause(sleep_time, stop)
+
+
+def run_worker(session: SessionConfig, planner: RunPlanner) -> None:
+    """Take accounts from ``planner`` with a loader, session and rate controller of our own."""
+    loader = create_loader(session)
+    try:
+        while (planned := planner.next()) is not None:
+            account, mode = planned
+            # The cooldown is charged to the account that precedes it, but is
+            # not part of the refresh time the planner learns from.
+            with run_metrics().account(str(account["username"])):
+                try:
+                    process_account(loader, account, mode)
+                finally:
+                    planner.finish(account, mode)
+                if planner.has_pending():
+                    cool_down(account)
+    finally:
+        rate_controller(loader).save_state()
+
+
+def resolve_sessions() -> list[SessionConfig]:
+    sessions = configured_sessions()
+    if not UPDATER_WORKERS:
+        return sessions
+    try:
+        workers = int(UPDATER_WORKERS)
+    except ValueError:
+        print(f"WARNING: Ignoring invalid UPDATER_WORKERS value '{UPDATER_WORKERS}'.")
+        return sessions
+    if workers > len(sessions):
+        print(
+            f"WARNING: UPDATER_WORKERS={workers} but only {len(sessions)} session(s) configured;"
+            " each worker needs its own session."
+        )
+    return sessions[: max(workers, 1)]
+
+
+def select_accounts(accounts: list[dict[str, object]]) -> list[dict[str, object]]:
+    active_count = sum(1 for acc in accounts if not acc.get("is_deleted"))
+    print(
+        "Found {total} accounts to update ({active} active, {deleted} deleted).".format(
+            total=len(accounts),
+            active=active_count,
+            deleted=len(accounts) - active_count,
+        )
+    )
+
+    account_limit_env = os.getenv("MAX_ACCOUNTS_PER_RUN", "").strip()
+    account_limit: int | None = None
+
+    if account_limit_env:
+        try:
+            parsed_limit = int(account_limit_env)
+            if parsed_limit > 0:
+                account_limit = parsed_limit
+        except ValueError:
+            print(
+                f"WARNING: Ignoring invalid MAX_ACCOUNTS_PER_RUN value '{account_limit_env}'."
+            )
+
+    accounts_to_process, deferred = plan_run(accounts, limit=account_limit)
+    planned_requests = sum(acc["estimated_requests"] for acc in accounts_to_process)
+    print(
+        f"Processing {len(accounts_to_process)} of {len(accounts)} accounts"
+        f" (~{planned_requests} requests"
+        + (f" of RUN_REQUEST_BUDGET={RUN_REQUEST_BUDGET}" if RUN_REQUEST_BUDGET else "")
+        + (f", MAX_ACCOUNTS_PER_RUN={account_limit}" if account_limit else "")
+        + ")."
+    )
+    if accounts_to_process:
+        print(
+            "Accounts to process: "
+            + ", ".join(
+                f"{acc['username']}{' (deleted)' if acc.get('is_deleted') else ''}"
+                f" [priority {acc['priority']:.1f}, ~{acc['estimated_requests']} requests]"
+                for acc in accounts_to_process
+            )
+        )
+
+    deferred_active = [acc for acc in deferred if not acc.get("is_deleted")]
+    deferred_deleted = [acc for acc in deferred if acc.get("is_deleted")]
+    if deferred_active:
+        print(
+            "WARNING: Deferred active accounts to a later run: "
+            + ", ".join(acc["username"] for acc in deferred_active)
+        )
+    if deferred_deleted:
+        print(
+            "Deferred soft-deleted accounts to a later run: "
+            + ", ".join(acc["username"] for acc in deferred_deleted)
+        )
+    resting = len(accounts) - len(accounts_to_process) - len(deferred)
+    if resting:
+        print(
+            f"{resting} soft-deleted accounts are not due yet"
+            f" (refreshed every {DELETED_REFRESH_DAYS:g} days)."
+        )
+    return accounts_to_process
+
+
+def refresh_growth_rollups(account_ids: list[int]) -> None:
+    try:
+        with connection() as conn:
+            with conn.cursor() as cur:
+                written = refresh_rollups(cur, account_ids)
+            conn.commit()
+        print(f"Recomputed {written} growth rollup rows.")
+    except psycopg.Error as exc:
+        print(f"WARNING: Could not refresh growth rollups: {exc}")
+
+
+def refresh_follower_churn(accounts: list[dict[str, object]]) -> None:
+    try:
+        from churn import refresh_churn
+    except ImportError as exc:
+        print(f"WARNING: Skipping follower churn refresh (NumPy unavailable): {exc}")
+        return
+    with connection() as conn:
+        for account in accounts:
+            try:
+                with conn.cursor() as cur:
+                    report = refresh_churn(cur, account["id"])
+                conn.commit()
+            except (ValueError, psycopg.Error) as exc:
+                conn.rollback()
+                print(f"WARNING: Could not refresh follower churn for {account['username']}: {exc}")
+                continue
+            if report.daily:
+                print(
+                    f"Follower churn for {account['username']}: {len(report.daily)} days,"
+                    f" {len(report.retention)} retention points."
+                )
+
+
+def refresh_history_matrix() -> None:
+    try:
+        from history_matrix import HISTORY_MATRIX_DIR, refresh
+    except ImportError as exc:
+        print(f"WARNING: Skipping history matrix refresh (NumPy unavailable): {exc}")
+        return
+    try:
+        with connection() as conn:
+            applied, full = refresh(conn)
+        print(
+            f"History matrix {'rebuilt' if full else 'refreshed'} with {applied} rows"
+            f" in {HISTORY_MATRIX_DIR}."
+        )
+    except (OSError, ValueError, psycopg.Error) as exc:
+        print(f"WARNING: Could not refresh history matrix: {exc}")
+
+
+def enqueue_sweep(accounts: list[dict[str, object]], workers: int) -> None:
+    """Queue the selected accounts as refresh jobs for ``updater_daemon.py``."""
+    planner = RunPlanner(accounts, deadline=parse_deadline(RUN_DEADLINE), workers=workers, costs=CostModel.load())
+    planned, deferred = planner.plan()
+    if deferred:
+        print(
+            "WARNING: Not queued, to meet RUN_DEADLINE: "
+            + ", ".join(str(account["username"]) for account in deferred)
+        )
+    try:
+        with connection() as conn:
+            with conn.cursor() as cur:
+                queued = enqueue_jobs(
+                    cur,
+                    ((account["id"], mode, account["priority"]) for account, mode in planned),
+                    reason="sweep",
+                )
+            conn.commit()
+    except psycopg.Error as exc:
+        print(f"ERROR: Could not enqueue refresh jobs: {exc}")
+        sys.exit(1)
+    counts = sum(1 for _, mode in planned if mode == COUNTS)
+    print(f"Queued {queued} refresh jobs ({counts} count-only) for the updater daemon.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Refresh the follower counts and lists of tracked accounts.")
+    parser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="queue refresh jobs for updater_daemon.py instead of refreshing here",
+    )
+    args = parser.parse_args()
+
+    print(f"Base directory: {BASE_DIR}")
+    print(f"Data directory: {DATA_DIR}")
+
+    accounts: list[dict[str, object]] = []
+
+    try:
+        with connection() as conn:
+            ensure_schema(conn)
+            accounts = fetch_candidates(conn)
+    except (psycopg.OperationalError, PoolTimeout) as exc:
+        print(f"ERROR: Could not connect to database: {exc}")
+        sys.exit(1)
+
+    if not accounts:
+        print("No accounts found in the database. Exiting.")
+        sys.exit(0)
+
+    accounts_to_process = select_accounts(accounts)
+    sessions = resolve_sessions()
+
+    if args.enqueue:
+        enqueue_sweep(accounts_to_process, len(sessions))
+        close_pool()
+        return
+
+    planner = RunPlanner(
+        accounts_to_process,
+        deadline=parse_deadline(RUN_DEADLINE),
+        workers=len(sessions),
+        costs=CostModel.load(),
+    )
+    if planner.deadline is not None:
+        print(f"Run plan: {planner.describe()}.")
+
+    if len(sessions) == 1:
+        run_worker(sessions[0], planner)
+    else:
+        print(f"Starting {len(sessions)} workers: " + ", ".join(s.username for s in sessions))
+        # Each worker holds a connection while paging through followers.
+        reserve_connections(len(sessions) + 1)
+        workers = [
+            threading.Thread(
+                target=run_worker,
+                args=(session, planner),
+                name=f"worker-{idx}:{session.username}",
+            )
+            for idx, session in enumerate(sessions, start=1)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    left_over = planner.deferred()
+    if left_over:
+        print(
+            "WARNING: Deferred to a later run to meet RUN_DEADLINE: "
+            + ", ".join(str(account["username"]) for account in left_over)
+        )
+    processed = [account for account, _ in planner.done]
+    refresh_growth_rollups([account["id"] for account in processed])
+    refresh_follower_churn(processed)
+    refresh_history_matrix()
+
+    metrics = run_metrics()
+    metrics.log_summary()
+    metrics.write()
+
+    print(
+        "Database pool: {checkouts} checkouts, avg wait {checkout_wait_avg_ms:.1f} ms,"
+        " max wait {checkout_wait_max_ms:.1f} ms.".format(**checkout_stats())
+    )
+    close_pool()
+
+    print("\n--- Script finished ---")
+
 
-print("\n--- Script finished ---")
+if __name__ == "__main__":
+    main()
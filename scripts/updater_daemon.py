@@ -0,0 +1,251 @@
+"""Long-running updater that works through the ``refresh_jobs`` queue.
+
+One worker thread per configured Instagram session keeps its Instaloader
+instance, session and rate controller across jobs. All workers share one
+connection pool, and the schema is checked once at startup. A dedicated
+connection ``LISTEN``s on ``refresh_jobs``, so a job queued by
+``/api/accounts/add``, ``update_followers_db.py --enqueue`` or
+``refresh_jobs.py enqueue`` is claimed within moments. Without a
+notification the workers poll every ``JOB_POLL_SECONDS``.
+
+Between two jobs a worker keeps the usual 90-180 s cooldown, minus the time
+it sat idle. A job whose refresh fails is retried after ``JOB_RETRY_MINUTES``
+until it has been attempted ``JOB_MAX_ATTEMPTS`` times. One daemon owns the
+queue, so every job still marked running at startup was left by a crashed
+predecessor and is released. Growth rollups and churn are refreshed after
+every job. The history matrix and the run metrics are written each time the
+queue drains, when jobs running longer than ``JOB_STALE_HOURS`` are released
+as well.
+
+SIGTERM or SIGINT cuts short any cooldown or backoff, lets the current jobs
+finish, then the daemon exits.
+
+Usage::
+
+    python scripts/updater_daemon.py
+"""
+
+from __future__ import annotations
+
+import os
+import signal
+import sys
+import threading
+import time
+
+import psycopg
+from psycopg_pool import PoolTimeout
+
+from db_connection import DB_CONFIG, close_pool, connection, reserve_connections
+from instagram_session import SessionConfig, create_loader, rate_controller
+from migrations import ensure_schema
+from refresh_jobs import CHANNEL, Job, claim_job, finish_job, prune_jobs, queue_counts, requeue_stale
+from run_metrics import run_metrics, start_run
+from update_followers_db import (
+    cool_down,
+    log,
+    process_account,
+    refresh_follower_churn,
+    refresh_growth_rollups,
+    refresh_history_matrix,
+    resolve_sessions,
+)
+
+JOB_POLL_SECONDS = max(float(os.getenv("JOB_POLL_SECONDS", "60")), 1.0)
+JOB_MAX_ATTEMPTS = max(int(os.getenv("JOB_MAX_ATTEMPTS", "3")), 1)
+JOB_RETRY_MINUTES = max(float(os.getenv("JOB_RETRY_MINUTES", "30")), 0.0)
+# With the queue drained, a job running longer than this belongs to no live worker.
+JOB_STALE_HOURS = max(float(os.getenv("JOB_STALE_HOURS", "12")), 0.1)
+
+
+class UpdaterDaemon:
+    def __init__(self, sessions: list[SessionConfig]) -> None:
+        self.sessions = sessions
+        self.stopping = threading.Event()
+        self._wakeup = threading.Condition()
+        self._lock = threading.Lock()
+        self._busy = 0
+
+    def stop(self, *_: object) -> None:
+        if not self.stopping.is_set():
+            print("Stopping after the jobs in progress...")
+        self.stopping.set()
+        self.wake()
+
+    def wake(self) -> None:
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def wait_for_jobs(self) -> None:
+        with self._wakeup:
+            if not self.stopping.is_set():
+                self._wakeup.wait(JOB_POLL_SECONDS)
+
+    def listen(self) -> None:
+        """Wake the workers on every ``NOTIFY refresh_jobs``; polling covers outages."""
+        while not self.stopping.is_set():
+            try:
+                with psycopg.connect(**DB_CONFIG, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {CHANNEL}")
+                    while not self.stopping.is_set():
+                        # Returns after the timeout so the stop flag is seen.
+                        if any(True for _ in conn.notifies(timeout=1.0, stop_after=1)):
+                            self.wake()
+            except psycopg.Error as exc:
+                print(f"WARNING: Lost the {CHANNEL} listener, polling every {JOB_POLL_SECONDS:g}s: {exc}")
+                self.stopping.wait(JOB_POLL_SECONDS)
+
+    def claim(self, worker: str) -> Job | None:
+        try:
+            with connection() as conn:
+                with conn.cursor() as cur:
+                    job = claim_job(cur, worker)
+                conn.commit()
+        except (psycopg.Error, PoolTimeout) as exc:
+            log(f"WARNING: Could not claim a refresh job: {exc}")
+            return None
+        if job is not None:
+            with self._lock:
+                self._busy += 1
+        return job
+
+    def finish(self, job: Job, outcome: str) -> None:
+        error = None if outcome == "ok" else outcome
+        retry = error is not None and outcome != "followers_failed" and job.attempts < JOB_MAX_ATTEMPTS
+        try:
+            with connection() as conn:
+                with conn.cursor() as cur:
+                    status = finish_job(cur, job.id, error=error, retry_after=JOB_RETRY_MINUTES * 60 if retry else None)
+                conn.commit()
+            log(f"Job {job.id} for {job.account['username']}: {status} ({outcome}, attempt {job.attempts}).")
+        except (psycopg.Error, PoolTimeout) as exc:
+            # The job stays running until requeue_stale picks it up.
+            log(f"WARNING: Could not close refresh job {job.id}: {exc}")
+        if outcome != "error":
+            refresh_growth_rollups([job.account["id"]])
+            refresh_follower_churn([job.account])
+        with self._lock:
+            self._busy -= 1
+
+    def drained(self) -> None:
+        """Queue empty and no job in progress: publish this batch's derived data and metrics."""
+        with self._lock:
+            if self._busy:
+                return
+            metrics = run_metrics()
+            if not metrics.accounts:
+                return
+            start_run()
+        refresh_history_matrix()
+        metrics.log_summary()
+        metrics.write()
+        try:
+            with connection() as conn:
+                with conn.cursor() as cur:
+                    released = requeue_stale(cur, JOB_STALE_HOURS * 3600)
+                    pruned = prune_jobs(cur)
+                    counts = queue_counts(cur)
+                conn.commit()
+            print(
+                f"Queue drained ({', '.join(f'{status} {count}' for status, count in sorted(counts.items()))}"
+                f"{f', released {released} stale jobs' if released else ''}"
+                f"{f', pruned {pruned} old jobs' if pruned else ''})."
+            )
+        except (psycopg.Error, PoolTimeout) as exc:
+            print(f"WARNING: Could not prune refresh jobs: {exc}")
+
+    def pace(self, job: Job, idle_since: float | None) -> None:
+        """Sleep what is left of the cooldown after the previous job on this session."""
+        if idle_since is not None:
+            cool_down(job.account, idle=time.monotonic() - idle_since, stop=self.stopping)
+
+    def run_worker(self, session: SessionConfig) -> None:
+        loader = create_loader(session)
+        name = threading.current_thread().name
+        idle_since: float | None = None
+        try:
+            while not self.stopping.is_set():
+                job = self.claim(name)
+                if job is None:
+                    self.drained()
+                    self.wait_for_jobs()
+                    continue
+                self.pace(job, idle_since)
+                if self.stopping.is_set():
+                    self.release(job)
+                    break
+                with run_metrics().account(str(job.account["username"])):
+                    run_metrics().note(job_id=job.id, job_reason=job.reason)
+                    outcome = process_account(loader, job.account, job.mode, stop=self.stopping)
+                self.finish(job, outcome)
+                idle_since = time.monotonic()
+                rate_controller(loader).save_state()
+        finally:
+            rate_controller(loader).save_state()
+
+    def release(self, job: Job) -> None:
+        """Hand a claimed but unstarted job back to the queue."""
+        try:
+            with connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE refresh_jobs SET status = 'queued', attempts = attempts - 1 WHERE id = %s",
+                        (job.id,),
+                    )
+                conn.commit()
+        except (psycopg.Error, PoolTimeout) as exc:
+            print(f"WARNING: Could not release refresh job {job.id}: {exc}")
+        with self._lock:
+            self._busy -= 1
+
+    def run(self) -> None:
+        listener = threading.Thread(target=self.listen, name="listener", daemon=True)
+        listener.start()
+        # Each worker holds a connection while paging through followers.
+        reserve_connections(len(self.sessions) + 1)
+        workers = [
+            threading.Thread(
+                target=self.run_worker,
+                args=(session,),
+                name=f"worker-{idx}:{session.username}",
+            )
+            for idx, session in enumerate(self.sessions, start=1)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        # Publish whatever the last batch produced.
+        self.drained()
+
+
+def main() -> None:
+    try:
+        with connection() as conn:
+            ensure_schema(conn)
+            with conn.cursor() as cur:
+                released = requeue_stale(cur)
+            conn.commit()
+    except (psycopg.OperationalError, PoolTimeout) as exc:
+        print(f"ERROR: Could not connect to database: {exc}")
+        sys.exit(1)
+    if released:
+        print(f"Released {released} refresh jobs left running by a previous daemon.")
+
+    sessions = resolve_sessions()
+    daemon = UpdaterDaemon(sessions)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    print(
+        f"Updater daemon started with {len(sessions)} worker(s): "
+        + ", ".join(session.username for session in sessions)
+    )
+    try:
+        daemon.run()
+    finally:
+        close_pool()
+    print("Updater daemon stopped.")
+
+
+if __name__ == "__main__":
+    main()